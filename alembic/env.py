@@ -5,10 +5,9 @@ from sqlalchemy import pool
 
 from alembic import context
 
-from app import models
-from app.models import Base
-from app.database import Base
-from app import models
+# モデルを import してテーブルを Base.metadata に登録する（Base はアプリと同じ app.database.Base）
+from app import models  # noqa: F401
+from app.database import Base, SQLALCHEMY_DATABASE_URL, sync_database_url
 
 
 # this is the Alembic Config object, which provides
@@ -20,11 +19,14 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# alembic.ini の固定URLではなく、アプリと同じ DATABASE_URL（postgres:// や +asyncpg も同じく変換）へ適用する
+# （configparser が % を展開するので %% にしておく）
+config.set_main_option("sqlalchemy.url", sync_database_url(SQLALCHEMY_DATABASE_URL).replace("%", "%%"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-Base = models.Base 
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,53 @@
+"""Add sales rollup tables
+
+Revision ID: 0a7c3e9f5d21
+Revises: f2b6d8e1a907
+Create Date: 2026-10-18 19:52:13.640275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7c3e9f5d21'
+down_revision: Union[str, Sequence[str], None] = 'f2b6d8e1a907'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'daily_revenue',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day'),
+    )
+    op.create_table(
+        'product_daily_sales',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.String(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'product_id'),
+    )
+    op.create_table(
+        'payment_method_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('payment_method', sa.String(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'payment_method'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('payment_method_daily')
+    op.drop_table('product_daily_sales')
+    op.drop_table('daily_revenue')
@@ -0,0 +1,27 @@
+"""Add orders created_at index
+
+Revision ID: 9d3f6b2a8c15
+Revises: b7d2e4f9a1c6
+Create Date: 2026-10-18 21:37:15.846203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f6b2a8c15'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e4f9a1c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_created_at', 'orders', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_created_at', table_name='orders')
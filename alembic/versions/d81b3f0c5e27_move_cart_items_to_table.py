@@ -0,0 +1,102 @@
+"""Move cart items from JSON to cart_items table
+
+Revision ID: d81b3f0c5e27
+Revises: c4e8a2f61d93
+Create Date: 2026-10-18 10:41:52.117630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81b3f0c5e27'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a2f61d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+carts = sa.table(
+    'carts',
+    sa.column('id', sa.Integer),
+    sa.column('items', sa.JSON),
+)
+
+cart_items = sa.table(
+    'cart_items',
+    sa.column('cart_id', sa.Integer),
+    sa.column('product_id', sa.String),
+    sa.column('name', sa.String),
+    sa.column('price', sa.Integer),
+    sa.column('quantity', sa.Integer),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    # 既存のJSONカートを読み出しておく（同じ商品が複数行あれば数量を合算）
+    rows = []
+    for cart_id, items in conn.execute(sa.select(carts.c.id, carts.c['items'])).all():
+        merged = {}
+        for item in items or []:
+            product_id = item.get("id")
+            if product_id is None:
+                continue
+            if product_id in merged:
+                merged[product_id]["quantity"] += item.get("quantity") or 0
+            else:
+                merged[product_id] = {
+                    "cart_id": cart_id,
+                    "product_id": product_id,
+                    "name": item.get("name"),
+                    "price": item.get("price"),
+                    "quantity": item.get("quantity") or 0,
+                }
+        rows.extend(merged.values())
+
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.drop_column('items')
+
+    op.create_table(
+        'cart_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cart_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('price', sa.Integer(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['cart_id'], ['carts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cart_id', 'product_id', name='uq_cart_items_cart_id_product_id'),
+    )
+    if rows:
+        op.bulk_insert(cart_items, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+
+    carts_items = {}
+    query = sa.select(
+        cart_items.c.cart_id, cart_items.c.product_id, cart_items.c.name,
+        cart_items.c.price, cart_items.c.quantity,
+    ).order_by(sa.text('id'))
+    for cart_id, product_id, name, price, quantity in conn.execute(query).all():
+        carts_items.setdefault(cart_id, []).append(
+            {"id": product_id, "name": name, "price": price, "quantity": quantity}
+        )
+
+    op.drop_table('cart_items')
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('items', sa.JSON(), nullable=True))
+
+    for cart_id, in conn.execute(sa.select(carts.c.id)).all():
+        conn.execute(
+            carts.update().where(carts.c.id == cart_id).values(items=carts_items.get(cart_id, []))
+        )
@@ -0,0 +1,30 @@
+"""Add version column to carts
+
+Revision ID: e5a9c7d3b412
+Revises: d81b3f0c5e27
+Create Date: 2026-10-18 11:20:08.554913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c7d3b412'
+down_revision: Union[str, Sequence[str], None] = 'd81b3f0c5e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.drop_column('version')
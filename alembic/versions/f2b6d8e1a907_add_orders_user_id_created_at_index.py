@@ -0,0 +1,28 @@
+"""Add orders (user_id, created_at DESC, id DESC) index
+
+Revision ID: f2b6d8e1a907
+Revises: e5a9c7d3b412
+Create Date: 2026-10-18 19:24:41.302118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8e1a907'
+down_revision: Union[str, Sequence[str], None] = 'e5a9c7d3b412'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
@@ -0,0 +1,356 @@
+# app/admission.py
+"""アドミッション制御（混雑時に優先度の低いリクエストから断る）
+
+リクエストをパスで優先度クラスに分け、クラスごとの同時実行数と待ち行列の上限を守る。
+
+- checkout > cart > browse > auth > admin の順に優先する
+  - 全体の同時実行数（ADMISSION_MAX_CONCURRENCY）のうち、各クラスが使えるのは share の割合まで
+    （低いクラスが埋め尽くしても、上のクラス用の枠が残る）
+  - 空きができたら優先度の高いクラスの待ちから通す
+- 待ち行列がいっぱい、または ADMISSION_QUEUE_TIMEOUT 秒待っても通れなければ、すぐに 503 + Retry-After
+- auth（ログイン・登録）はクライアントごとのトークンバケットで制限し、超えたら 429 + Retry-After
+  （プロキシの後ろでは TRUSTED_PROXY_HOPS で X-Forwarded-For のどの値を接続元とみなすか決める）
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "1") == "1"
+# 1ワーカーあたり。DBの接続プール（DB_POOL_SIZE + DB_MAX_OVERFLOW）より大きくしても、接続待ちになるだけ
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+AUTH_RATE_LIMIT_ENABLED = os.getenv("AUTH_RATE_LIMIT_ENABLED", "1") == "1"
+# ログイン・登録のクライアントごとの上限（AUTH_RATE_BURST 回まで連続で、その後は毎秒 AUTH_RATE_PER_SECOND 回）
+AUTH_RATE_PER_SECOND = float(os.getenv("AUTH_RATE_PER_SECOND", "0.2"))
+AUTH_RATE_BURST = float(os.getenv("AUTH_RATE_BURST", "5"))
+AUTH_RATE_MAX_CLIENTS = int(os.getenv("AUTH_RATE_MAX_CLIENTS", "10000"))
+# 前段にあるプロキシの段数（Render などでは 1）。0 なら接続元（scope["client"]）をそのまま使う
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+BUSY_MESSAGE = "混み合っています。しばらくしてから再度お試しください"
+RATE_LIMIT_MESSAGE = "リクエストが多すぎます。しばらくしてから再度お試しください"
+
+
+class PriorityClass(NamedTuple):
+    name: str
+    limit: int  # このクラスの同時実行数
+    queue_size: int  # このクラスの待ち行列
+    share: float  # 全体の同時実行数のうち使える割合
+
+
+def _priority_class(name: str, limit: int, queue_size: int, share: float) -> PriorityClass:
+    # ADMISSION_CART_LIMIT=16 ADMISSION_CART_QUEUE=32 のように環境変数で変更できる
+    prefix = f"ADMISSION_{name.upper()}"
+    return PriorityClass(
+        name,
+        int(os.getenv(f"{prefix}_LIMIT", str(limit))),
+        int(os.getenv(f"{prefix}_QUEUE", str(queue_size))),
+        share,
+    )
+
+
+# 優先度の高い順
+PRIORITY_CLASSES = [
+    _priority_class("checkout", 16, 64, 1.0),
+    _priority_class("cart", 16, 64, 0.9),
+    _priority_class("browse", 12, 64, 0.6),
+    _priority_class("auth", 4, 16, 0.25),  # bcrypt はハッシュ用プロセスプール（HASH_POOL_WORKERS）で動くので多くしても速くならない
+    _priority_class("admin", 1, 4, 0.125),
+]
+
+# (メソッド（None は全て）, パス, クラス) 上から順に見て、最初に一致したもの。どれにも一致しなければ browse
+ROUTE_CLASSES: List[Tuple[Optional[str], str, str]] = [
+    ("POST", "/purchase/purchase", "checkout"),
+    (None, "/purchase/cart", "cart"),
+    (None, "/purchase/orders", "cart"),
+    ("POST", "/auth/refresh", "cart"),  # 購入の途中でアクセストークンが切れても続けられるように
+    ("POST", "/auth/login", "auth"),
+    ("POST", "/auth/signup", "auth"),
+    (None, "/products/import", "admin"),
+    (None, "/products/register_bulk", "admin"),
+    (None, "/purchase/products/register_bulk", "admin"),
+    ("POST", "/gift/create", "admin"),
+    ("DELETE", "/gift/gift", "admin"),
+    (None, "/analytics", "admin"),
+]
+# 制限しないパス（死活監視・メトリクス）
+EXEMPT_PATHS = {"/", "/ready", "/metrics"}
+
+
+def _path_matches(path: str, prefix: str) -> bool:
+    return path == prefix or path.startswith(prefix + "/")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """リクエストの優先度クラス（制限しないものは None）"""
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    for rule_method, prefix, name in ROUTE_CLASSES:
+        if (rule_method is None or rule_method == method) and _path_matches(path, prefix):
+            return name
+    return "browse"
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # queue_full / timeout
+
+
+class _ClassState:
+    def __init__(self, spec: PriorityClass, max_concurrency: int):
+        self.spec = spec
+        self.cap = max(1, math.floor(max_concurrency * spec.share))
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "timeout": 0}
+        self.queue_wait_seconds = 0.0
+
+
+class AdmissionController:
+    """イベントループ上で動く（ロック不要）。クラスごとの同時実行数と、優先度つきの全体の枠を管理する"""
+
+    def __init__(
+        self,
+        classes: Iterable[PriorityClass] = PRIORITY_CLASSES,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        enabled: bool = ADMISSION_CONTROL_ENABLED,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self._classes: Dict[str, _ClassState] = {spec.name: _ClassState(spec, max_concurrency) for spec in classes}
+        self._order = list(self._classes.values())  # 優先度の高い順
+        self.in_flight = 0
+
+    def _can_admit(self, state: _ClassState) -> bool:
+        return state.in_flight < state.spec.limit and self.in_flight < state.cap
+
+    def _higher_waiting(self, state: _ClassState) -> bool:
+        # 同じか上のクラスに待っている人がいれば、横入りせずに並ぶ
+        for other in self._order:
+            if other.waiters:
+                return True
+            if other is state:
+                return False
+        return False
+
+    def _admit(self, state: _ClassState):
+        state.in_flight += 1
+        state.admitted += 1
+        self.in_flight += 1
+
+    async def acquire(self, name: str):
+        state = self._classes[name]
+        if self._can_admit(state) and not self._higher_waiting(state):
+            self._admit(state)
+            return
+        if len(state.waiters) >= state.spec.queue_size:
+            state.shed["queue_full"] += 1
+            raise Rejected("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        state.queued += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done():  # タイムアウトと同時に通された
+                state.queue_wait_seconds += time.perf_counter() - started
+                return
+            future.cancel()
+            self._discard(state, future)
+            state.shed["timeout"] += 1
+            raise Rejected("timeout")
+        except asyncio.CancelledError:
+            # 待っている間に切断された。通された後なら枠を返す
+            if future.done() and not future.cancelled():
+                self.release(name)
+            else:
+                future.cancel()
+                self._discard(state, future)
+            raise
+        state.queue_wait_seconds += time.perf_counter() - started
+
+    @staticmethod
+    def _discard(state: _ClassState, future: asyncio.Future):
+        try:
+            state.waiters.remove(future)
+        except ValueError:
+            pass
+
+    def release(self, name: str):
+        state = self._classes[name]
+        state.in_flight -= 1
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        # 優先度の高いクラスの待ちから順に通す
+        for state in self._order:
+            while state.waiters and self._can_admit(state):
+                future = state.waiters.popleft()
+                if future.done():
+                    continue
+                self._admit(state)
+                future.set_result(None)
+            if state.waiters:
+                # このクラスが全体の枠で止まっているなら、下のクラスも通さない
+                if self.in_flight >= state.cap:
+                    return
+
+    def counters(self) -> Iterable[tuple]:
+        for state in self._order:
+            labels = {"class": state.spec.name}
+            yield "admission_admitted_total", "Requests admitted (immediately or after queueing).", labels, state.admitted
+            yield "admission_queued_total", "Requests that had to wait in the admission queue.", labels, state.queued
+            for reason, count in state.shed.items():
+                yield "admission_shed_total", "Requests rejected with 503.", {**labels, "reason": reason}, count
+            yield "admission_queue_wait_seconds_total", "Time spent waiting in the admission queue.", labels, state.queue_wait_seconds
+
+    def gauges(self) -> Iterable[tuple]:
+        for state in self._order:
+            labels = {"class": state.spec.name}
+            yield "admission_in_flight", "Requests currently running.", labels, state.in_flight
+            yield "admission_queue_depth", "Requests currently waiting.", labels, len(state.waiters)
+            yield "admission_limit", "Concurrency limit of the class.", labels, state.spec.limit
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "classes": {
+                state.spec.name: {
+                    "limit": state.spec.limit,
+                    "cap": state.cap,
+                    "queue_size": state.spec.queue_size,
+                    "in_flight": state.in_flight,
+                    "queued_now": len(state.waiters),
+                    "admitted": state.admitted,
+                    "queued": state.queued,
+                    "shed": dict(state.shed),
+                }
+                for state in self._order
+            },
+        }
+
+
+class TokenBucketLimiter:
+    """クライアントごとのトークンバケット（件数上限つきLRUで古いクライアントから忘れる）"""
+
+    def __init__(self, rate: float = AUTH_RATE_PER_SECOND, burst: float = AUTH_RATE_BURST, max_clients: int = AUTH_RATE_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # クライアント → [トークン, 最終更新]
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def take(self, client: str) -> float:
+        """1回分を取る。取れたら 0、取れなければ次に取れるまでの秒数"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [self.burst, now]
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            self.limited += 1
+            return (1 - bucket[0]) / self.rate if self.rate > 0 else float(ADMISSION_RETRY_AFTER)
+
+    def counters(self) -> Iterable[tuple]:
+        yield "auth_rate_limited_total", "Auth requests rejected with 429 by the per-client token bucket.", {}, self.limited
+
+
+def client_address(scope, trusted_proxy_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """レート制限のキーにする接続元
+
+    プロキシは X-Forwarded-For の右端に自分が見た接続元を付け足すので、右から trusted_proxy_hops 番目を使う。
+    それより左はクライアントが好きに書けるので使わない（書き換えるたびに新しいバケットになってしまう）。
+    uvicorn --forwarded-allow-ips="*" は左端を scope["client"] にするので、そちらも使わない。
+    """
+    peer = (scope.get("client") or ("unknown", 0))[0]
+    if trusted_proxy_hops <= 0:
+        return peer
+    hops: List[str] = []
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            hops += [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+    return hops[-trusted_proxy_hops] if len(hops) >= trusted_proxy_hops else peer
+
+
+admission_controller = AdmissionController()
+auth_rate_limiter = TokenBucketLimiter()
+
+
+async def _send_error(send, status: int, detail: str, retry_after: int):
+    body = ('{"detail":"' + detail + '"}').encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """優先度クラスごとに同時実行数を制限し、あふれたら 503、auth の連打は 429 で断るASGIミドルウェア"""
+
+    def __init__(
+        self,
+        app,
+        controller: AdmissionController = admission_controller,
+        limiter: TokenBucketLimiter = auth_rate_limiter,
+        trusted_proxy_hops: int = TRUSTED_PROXY_HOPS,
+    ):
+        self.app = app
+        self.controller = controller
+        self.limiter = limiter
+        self.trusted_proxy_hops = trusted_proxy_hops
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        if name == "auth" and AUTH_RATE_LIMIT_ENABLED:
+            wait = self.limiter.take(client_address(scope, self.trusted_proxy_hops))
+            if wait > 0:
+                await _send_error(send, 429, RATE_LIMIT_MESSAGE, max(1, math.ceil(wait)))
+                return
+
+        try:
+            await self.controller.acquire(name)
+        except Rejected:
+            await _send_error(send, 503, BUSY_MESSAGE, ADMISSION_RETRY_AFTER)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
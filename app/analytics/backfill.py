@@ -0,0 +1,20 @@
+# app/analytics/backfill.py
+# 売上の集計テーブルを orders の履歴から作り直すスクリプト
+#   python -m app.analytics.backfill
+import json
+
+from app.analytics.rollups import rebuild_rollups
+from app.database import SessionLocal
+
+
+def main():
+    db = SessionLocal()
+    try:
+        report = rebuild_rollups(db)
+    finally:
+        db.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# app/analytics/rollups.py
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import DailyRevenue, Order, PaymentMethodDaily, ProductDailySales
+
+BACKFILL_BATCH_SIZE = 1000
+BACKFILL_DAYS_PER_BATCH = 1
+
+
+def _insert(dialect_name: str, table):
+    return (postgresql if dialect_name == "postgresql" else sqlite).insert(table)
+
+
+def _upsert_add(dialect_name: str, table, keys: List, values):
+    """キーの行がなければ作り、あれば数値列に加算する（values に dict のリストを渡すと複数行を1文で処理する）"""
+    rows = values if isinstance(values, list) else [values]
+    stmt = _insert(dialect_name, table).values(rows)
+    counters = [name for name in rows[0] if name not in {column.key for column in keys}]
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: getattr(table, name) + getattr(stmt.excluded, name) for name in counters},
+    )
+
+
+def order_day(created_at: datetime) -> date:
+    # 集計日は注文の created_at（UTC）の日付
+    return created_at.date()
+
+
+def rollup_statements(dialect_name: str, day: date, items: List[dict], total_price: int, payment_method: str) -> list:
+    """1件の注文を集計テーブルに加算する文を返す（注文と同じトランザクションで実行する）"""
+    units = sum(item["quantity"] for item in items)
+    statements = [
+        _upsert_add(dialect_name, DailyRevenue, [DailyRevenue.day], {
+            "day": day, "order_count": 1, "units": units, "revenue": total_price,
+        }),
+        _upsert_add(dialect_name, PaymentMethodDaily, [PaymentMethodDaily.day, PaymentMethodDaily.payment_method], {
+            "day": day, "payment_method": payment_method, "order_count": 1, "revenue": total_price,
+        }),
+    ]
+    # 商品ごとに1文ずつ出すと注文の明細数だけSQLが増える（N+1）ので、複数行のVALUESで1文にまとめる
+    # （同じ商品が複数行あると ON CONFLICT が同じ行を2回更新してしまうので先に合算する）
+    per_product: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for item in items:
+        per_product[item["id"]][0] += item["quantity"]
+        per_product[item["id"]][1] += item["price"] * item["quantity"]
+    if per_product:
+        statements.append(_upsert_add(dialect_name, ProductDailySales, [ProductDailySales.day, ProductDailySales.product_id], [
+            {"day": day, "product_id": product_id, "units": product_units, "revenue": revenue}
+            for product_id, (product_units, revenue) in per_product.items()
+        ]))
+    return statements
+
+
+def _day_range(db: Session) -> Optional[Tuple[date, date]]:
+    """作り直す日の範囲（注文のある日と、集計行のある日の両方を含む）"""
+    first, last = db.query(func.min(Order.created_at), func.max(Order.created_at)).one()
+    days = [order_day(first), order_day(last)] if first is not None else []
+    for table in (DailyRevenue, ProductDailySales, PaymentMethodDaily):
+        days += [day for day in db.query(func.min(table.day), func.max(table.day)).one() if day is not None]
+    return (min(days), max(days)) if days else None
+
+
+def _rebuild_days(db: Session, start: date, end: date) -> dict:
+    """start 以上 end 未満の日の集計を orders から作り直してコミットする"""
+    # 先に書き込みロックを取り、読み取り中に増えた注文を取りこぼさないようにする
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        db.execute(text("LOCK TABLE orders IN SHARE MODE"))
+    elif dialect_name == "sqlite":
+        # pysqlite は最初の書き込みまで BEGIN を出さないので、自分で書き込みトランザクションを始める
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+    for table in (DailyRevenue, ProductDailySales, PaymentMethodDaily):
+        db.execute(delete(table).where(table.day >= start, table.day < end))
+
+    daily: Dict[date, List[int]] = defaultdict(lambda: [0, 0, 0])
+    products: Dict[Tuple[date, str], List[int]] = defaultdict(lambda: [0, 0])
+    methods: Dict[Tuple[date, str], List[int]] = defaultdict(lambda: [0, 0])
+
+    rows = (
+        db.query(Order.created_at, Order.items, Order.total_price, Order.payment_method)
+        .filter(Order.created_at >= datetime.combine(start, time.min), Order.created_at < datetime.combine(end, time.min))
+        .yield_per(BACKFILL_BATCH_SIZE)
+    )
+    orders = 0
+    for created_at, items, total_price, payment_method in rows:
+        day = order_day(created_at)
+        items = items or []
+        total_price = total_price or 0
+        orders += 1
+        daily[day][0] += 1
+        daily[day][2] += total_price
+        methods[day, payment_method or ""][0] += 1
+        methods[day, payment_method or ""][1] += total_price
+        for item in items:
+            daily[day][1] += item["quantity"]
+            products[day, item["id"]][0] += item["quantity"]
+            products[day, item["id"]][1] += item["price"] * item["quantity"]
+
+    if daily:
+        db.execute(insert(DailyRevenue), [
+            {"day": day, "order_count": c, "units": u, "revenue": r} for day, (c, u, r) in daily.items()
+        ])
+    if products:
+        db.execute(insert(ProductDailySales), [
+            {"day": day, "product_id": product_id, "units": u, "revenue": r}
+            for (day, product_id), (u, r) in products.items()
+        ])
+    if methods:
+        db.execute(insert(PaymentMethodDaily), [
+            {"day": day, "payment_method": method, "order_count": c, "revenue": r}
+            for (day, method), (c, r) in methods.items()
+        ])
+    db.commit()
+    return {
+        "orders": orders,
+        "days": len(daily),
+        "product_days": len(products),
+        "payment_method_days": len(methods),
+    }
+
+
+def rebuild_rollups(db: Session, days_per_batch: int = BACKFILL_DAYS_PER_BATCH) -> dict:
+    """orders の履歴から集計テーブルを作り直す
+
+    days_per_batch 日ずつ別のトランザクションでコミットするので、書き込みロック（SQLite ではDB全体）を
+    持つのは1バッチの間だけで、実行中の注文は全体の完了まで待たされない。
+    作り直し中に入った注文は、いつものように注文と同じトランザクションで集計に加算される
+    （まだ作り直していない日の分は、その日のバッチで orders から数え直される）。
+    """
+    report = {"orders": 0, "days": 0, "product_days": 0, "payment_method_days": 0, "batches": 0}
+    day_range = _day_range(db)
+    db.commit()
+    if day_range is None:
+        return report
+    first, last = day_range
+    step = timedelta(days=max(days_per_batch, 1))
+    start = first
+    while start <= last:
+        batch = _rebuild_days(db, start, min(start + step, last + timedelta(days=1)))
+        for key, value in batch.items():
+            report[key] += value
+        report["batches"] += 1
+        start += step
+    return report
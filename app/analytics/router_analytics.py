@@ -0,0 +1,115 @@
+# app/analytics/router_analytics.py
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.auth.utils import get_current_admin
+from app.database import get_read_db
+from app.models import DailyRevenue, PaymentMethodDaily, Product, ProductDailySales
+from app.query_diagnostics import query_budget
+
+# 売上は管理者（ADMIN_EMAILS）だけが見られる
+router = APIRouter(tags=["analytics"], dependencies=[Depends(get_current_admin)])
+
+DEFAULT_RANGE_DAYS = 7
+MAX_RANGE_DAYS = 366
+
+
+def _date_range(start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+    # 省略時は今日（UTC）までの7日間
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start は end 以前の日付を指定してください")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"期間は{MAX_RANGE_DAYS}日以内で指定してください")
+    return start, end
+
+
+# 日別の売上（注文のない日は0で埋める）
+@router.get("/revenue/daily")
+@query_budget(2)
+def daily_revenue(start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_read_db)):
+    start, end = _date_range(start, end)
+    rows = {
+        row.day: row
+        for row in db.query(DailyRevenue).filter(DailyRevenue.day.between(start, end))
+    }
+    days = []
+    for n in range((end - start).days + 1):
+        day = start + timedelta(days=n)
+        row = rows.get(day)
+        days.append({
+            "day": day,
+            "order_count": row.order_count if row else 0,
+            "units": row.units if row else 0,
+            "revenue": row.revenue if row else 0,
+        })
+    return {
+        "start": start,
+        "end": end,
+        "total_revenue": sum(d["revenue"] for d in days),
+        "total_orders": sum(d["order_count"] for d in days),
+        "days": days,
+    }
+
+
+# 期間内の売れ筋商品
+@router.get("/products/top")
+@query_budget(2)
+def top_products(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    order_by: str = Query("units", pattern="^(units|revenue)$"),
+    db: Session = Depends(get_read_db),
+):
+    start, end = _date_range(start, end)
+    units = func.sum(ProductDailySales.units).label("units")
+    revenue = func.sum(ProductDailySales.revenue).label("revenue")
+    rows = (
+        db.query(ProductDailySales.product_id, Product.name, units, revenue)
+        .outerjoin(Product, Product.id == ProductDailySales.product_id)
+        .filter(ProductDailySales.day.between(start, end))
+        .group_by(ProductDailySales.product_id, Product.name)
+        .order_by((units if order_by == "units" else revenue).desc(), ProductDailySales.product_id)
+        .limit(limit)
+        .all()
+    )
+    return {
+        "start": start,
+        "end": end,
+        "products": [
+            {"product_id": r.product_id, "name": r.name, "units": r.units, "revenue": r.revenue}
+            for r in rows
+        ],
+    }
+
+
+# 支払い方法ごとの内訳
+@router.get("/payment-methods")
+@query_budget(2)
+def payment_methods(start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_read_db)):
+    start, end = _date_range(start, end)
+    rows = (
+        db.query(
+            PaymentMethodDaily.payment_method,
+            func.sum(PaymentMethodDaily.order_count).label("order_count"),
+            func.sum(PaymentMethodDaily.revenue).label("revenue"),
+        )
+        .filter(PaymentMethodDaily.day.between(start, end))
+        .group_by(PaymentMethodDaily.payment_method)
+        .order_by(func.sum(PaymentMethodDaily.revenue).desc())
+        .all()
+    )
+    return {
+        "start": start,
+        "end": end,
+        "payment_methods": [
+            {"payment_method": r.payment_method, "order_count": r.order_count, "revenue": r.revenue}
+            for r in rows
+        ],
+    }
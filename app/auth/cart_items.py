@@ -0,0 +1,92 @@
+# app/auth/cart_items.py
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import Cart, CartItem, Product
+
+
+def _insert(db: AsyncSession, table):
+    # ON CONFLICT はDBごとに方言のinsertを使う
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def cart_item_to_dict(line: CartItem) -> dict:
+    # 以前の Cart.items(JSON) と同じ形
+    return {"id": line.product_id, "name": line.name, "price": line.price, "quantity": line.quantity}
+
+
+async def get_cart_id(db: AsyncSession, user_id: int):
+    return (await db.execute(select(Cart.id).where(Cart.user_id == user_id))).scalar()
+
+
+async def get_cart_lines(db: AsyncSession, cart_id: int) -> List[CartItem]:
+    result = await db.execute(select(CartItem).where(CartItem.cart_id == cart_id).order_by(CartItem.id))
+    return list(result.scalars())
+
+
+async def get_cart_items(db: AsyncSession, cart_id: int) -> List[dict]:
+    return [cart_item_to_dict(line) for line in await get_cart_lines(db, cart_id)]
+
+
+def load_cart_items(db: Session, user_id: int) -> List[dict]:
+    """カートの中身を読む（await db.run_sync(load_cart_items, user_id) で、2本のSQLをまとめて実行する）"""
+    cart_id = db.execute(select(Cart.id).where(Cart.user_id == user_id)).scalar()
+    if cart_id is None:
+        return []
+    lines = db.execute(select(CartItem).where(CartItem.cart_id == cart_id).order_by(CartItem.id)).scalars()
+    return [cart_item_to_dict(line) for line in lines]
+
+
+async def get_or_create_cart_id(db: AsyncSession, user_id: int) -> int:
+    stmt = _insert(db, Cart).values(user_id=user_id, created_at=datetime.utcnow())
+    await db.execute(stmt.on_conflict_do_nothing(index_elements=[Cart.user_id]))
+    return (await db.execute(select(Cart.id).where(Cart.user_id == user_id))).scalar_one()
+
+
+async def add_cart_item(db: AsyncSession, cart_id: int, product: Product, quantity: int):
+    """同じ商品が既にあれば数量を加算する（1文で完結するので同時追加でも失われない）"""
+    stmt = _insert(db, CartItem).values(
+        cart_id=cart_id,
+        product_id=product.id,
+        name=product.name,
+        price=product.price,
+        quantity=quantity,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItem.cart_id, CartItem.product_id],
+        set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+    )
+    await db.execute(stmt)
+
+
+async def set_cart_item(db: AsyncSession, cart_id: int, product: Product, quantity: int):
+    """数量を指定値にする（0なら削除）"""
+    if quantity <= 0:
+        await remove_cart_item(db, cart_id, product.id)
+        return
+    stmt = _insert(db, CartItem).values(
+        cart_id=cart_id,
+        product_id=product.id,
+        name=product.name,
+        price=product.price,
+        quantity=quantity,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItem.cart_id, CartItem.product_id],
+        set_={"quantity": stmt.excluded.quantity},
+    )
+    await db.execute(stmt)
+
+
+async def remove_cart_item(db: AsyncSession, cart_id: int, product_id: str) -> int:
+    result = await db.execute(
+        delete(CartItem).where(CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+    )
+    return result.rowcount
@@ -0,0 +1,88 @@
+# app/auth/checkout.py
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analytics.rollups import order_day, rollup_statements
+from app.auth.cart_items import get_cart_lines
+from app.auth.utils_email import enqueue_order_confirmation_email
+from app.models import Cart, CartItem, Order, Product, User
+
+SHIPPING_FEE = 185  # 送料
+
+
+async def checkout_cart(db: AsyncSession, user: User, payment_method: str, address: str) -> Order:
+    """カートを1トランザクションで注文に変えてコミットする"""
+    try:
+        order = await place_order(db, user, payment_method, address)
+    except HTTPException:
+        await db.rollback()
+        raise
+    await db.commit()
+    return order
+
+
+async def place_order(db: AsyncSession, user: User, payment_method: str, address: str) -> Order:
+    """注文を作成する（コミットは呼び出し側。まとめ書き込みからも使う）
+
+    1. カートの version を条件付きUPDATEで進めて「確保」する（二重送信は409）
+    2. 明細の価格を products から1回の IN クエリで取り直す
+    3. 注文の作成・カートの削除・確認メールの積み込み・売上集計の加算を同じトランザクションで行う
+    """
+    cart = (await db.execute(select(Cart.id, Cart.version).where(Cart.user_id == user.id))).first()
+    if not cart:
+        raise HTTPException(status_code=400, detail="カートが空です")
+
+    claimed = (await db.execute(
+        update(Cart)
+        .where(Cart.id == cart.id, Cart.version == cart.version)
+        .values(version=Cart.version + 1)
+    )).rowcount
+    if claimed != 1:
+        raise HTTPException(status_code=409, detail="この注文はすでに処理中です")
+
+    lines = await get_cart_lines(db, cart.id)
+    if not lines:
+        raise HTTPException(status_code=400, detail="カートが空です")
+
+    # カートに入れた時点の価格ではなく、現在の商品価格で計算する
+    product_ids = [line.product_id for line in lines]
+    result = await db.execute(select(Product.id, Product.name, Product.price).where(Product.id.in_(product_ids)))
+    products = {p.id: p for p in result.all()}
+    missing = [product_id for product_id in product_ids if product_id not in products]
+    if missing:
+        raise HTTPException(status_code=409, detail=f"購入できない商品がカートに含まれています: {', '.join(missing)}")
+
+    items = [
+        {
+            "id": line.product_id,
+            "name": products[line.product_id].name,
+            "price": products[line.product_id].price,
+            "quantity": line.quantity,
+        }
+        for line in lines
+    ]
+    total_price = sum(item["price"] * item["quantity"] for item in items) + SHIPPING_FEE
+
+    order = Order(
+        user_id=user.id,
+        items=items,
+        total_price=total_price,
+        payment_method=payment_method,
+        address=address,
+        created_at=datetime.utcnow()
+    )
+    db.add(order)
+
+    # 読み取った明細だけを消す（確保後に追加された商品は次の注文に残る）
+    await db.execute(delete(CartItem).where(CartItem.id.in_([line.id for line in lines])))
+
+    # ✅ 確認メールは注文と同じトランザクションで送信待ちに積む（送信はバックグラウンド）
+    enqueue_order_confirmation_email(db, user.email, user.username)
+
+    # 売上の集計テーブルも同じトランザクションで加算する
+    for stmt in rollup_statements(db.bind.dialect.name, order_day(order.created_at), items, total_price, payment_method):
+        await db.execute(stmt)
+    return order
@@ -0,0 +1,141 @@
+# app/auth/email_outbox.py
+import logging
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.auth import utils_email
+from app.database import SessionLocal
+from app.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKER_ENABLED = os.getenv("OUTBOX_WORKER_ENABLED", "1") == "1"
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "30"))  # 秒（失敗ごとに2倍）
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))  # 送信中のまま落ちた場合の再送までの時間
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(OUTBOX_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), OUTBOX_BACKOFF_MAX))
+
+
+# email_outbox を読み出して送信するワーカー（SMTP接続はバッチをまたいで使い回す）
+class OutboxWorker:
+    def __init__(self, session_factory=SessionLocal, smtp_factory=utils_email.open_smtp_session):
+        self.session_factory = session_factory
+        self.smtp_factory = smtp_factory
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _get_smtp(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp()
+        self._smtp = self.smtp_factory()
+        return self._smtp
+
+    def _close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+            self._smtp = None
+
+    def _claim(self, db: Session, mail: EmailOutbox, now: datetime) -> bool:
+        # attempts を楽観ロック代わりにして、他のワーカーと二重送信しないようにする
+        result = db.execute(
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.id == mail.id,
+                EmailOutbox.status == mail.status,
+                EmailOutbox.attempts == mail.attempts,
+            )
+            .values(
+                status="sending",
+                attempts=EmailOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+            )
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def drain_once(self) -> int:
+        """期限の来たメールを1バッチ送信し、処理した件数を返す"""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            due = (
+                db.query(EmailOutbox)
+                .filter(EmailOutbox.status.in_(("pending", "sending")), EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.id)
+                .limit(OUTBOX_BATCH_SIZE)
+                .all()
+            )
+            processed = 0
+            for mail in due:
+                if not self._claim(db, mail, now):
+                    continue
+                db.refresh(mail)
+                try:
+                    smtp = self._get_smtp()
+                    smtp.send_message(utils_email.build_message(mail.to_email, mail.subject, mail.body))
+                except Exception as e:
+                    logger.warning(f"メール送信エラー (id={mail.id}, attempts={mail.attempts}): {e}")
+                    self._close_smtp()
+                    mail.last_error = str(e)[:500]
+                    if mail.attempts >= OUTBOX_MAX_ATTEMPTS:
+                        mail.status = "failed"
+                    else:
+                        mail.status = "pending"
+                        mail.next_attempt_at = datetime.utcnow() + backoff_delay(mail.attempts)
+                else:
+                    mail.status = "sent"
+                    mail.sent_at = datetime.utcnow()
+                    mail.last_error = None
+                db.commit()
+                processed += 1
+            return processed
+        finally:
+            db.close()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.drain_once()
+            except Exception as e:
+                logger.error(f"メール送信ワーカーのエラー: {e}")
+                processed = 0
+            if not processed:
+                self._stop.wait(OUTBOX_POLL_INTERVAL)
+        self._close_smtp()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+outbox_worker = OutboxWorker()
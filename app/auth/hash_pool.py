@@ -0,0 +1,129 @@
+# app/auth/hash_pool.py
+import asyncio
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+# bcrypt専用のプロセスプール設定（環境変数で変更可能）
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", "2"))
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", "16"))
+HASH_POOL_RETRY_AFTER = int(os.getenv("HASH_POOL_RETRY_AFTER", "1"))
+
+
+def _run_in_worker(func_name: str, *args):
+    # ワーカープロセス側で実行される（待ち時間と処理時間を測るため時刻も返す）
+    from app.auth import utils
+
+    started = time.time()
+    result = getattr(utils, func_name)(*args)
+    return result, started, time.time()
+
+
+def _warm_worker():
+    # ワーカープロセスを起動し、bcrypt などの import を済ませておく（使うためではなく読み込むための import）
+    importlib.import_module("app.auth.utils")
+    return os.getpid()
+
+
+class HashPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "errors": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "hash_seconds_total": 0.0,
+            "hash_seconds_max": 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    async def _submit(self, func_name: str, *args):
+        executor = self._get_executor()
+        with self._lock:
+            # 実行中 + 待ち行列が上限なら、並ばせずにすぐ503を返す
+            if self._in_flight >= self.workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="混み合っています。しばらくしてから再度お試しください",
+                    headers={"Retry-After": str(HASH_POOL_RETRY_AFTER)},
+                )
+            self._in_flight += 1
+            self._stats["submitted"] += 1
+
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(executor, _run_in_worker, func_name, *args)
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+                # ワーカーが落ちたプールは使えないので、次回作り直す
+                if isinstance(e, BrokenProcessPool) and self._executor is executor:
+                    self._executor = None
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        queue_wait = max(started - submitted_at, 0.0)
+        hash_time = finished - started
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["queue_wait_seconds_total"] += queue_wait
+            self._stats["queue_wait_seconds_max"] = max(self._stats["queue_wait_seconds_max"], queue_wait)
+            self._stats["hash_seconds_total"] += hash_time
+            self._stats["hash_seconds_max"] = max(self._stats["hash_seconds_max"], hash_time)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("get_password_hash", password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit("verify_password", plain_password, hashed_password)
+
+    async def warm_up(self):
+        """ワーカープロセスを先に起動しておく（spawn なので初回のログインが1秒近く待たされるのを防ぐ）"""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        # ワーカーがまだ暇でないうちに送るので、1件ごとに新しいプロセスが起動する
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm_worker) for _ in range(self.workers)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                **self._stats,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+hash_pool = HashPool(HASH_POOL_WORKERS, HASH_POOL_MAX_QUEUE)
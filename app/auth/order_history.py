@@ -0,0 +1,49 @@
+# app/auth/order_history.py
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Order
+
+# 一覧では items(JSON) を読まない（明細が必要なときだけ details=true で取得する）
+SUMMARY_COLUMNS = (Order.id, Order.created_at, Order.total_price, Order.payment_method, Order.address)
+
+
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    return f"{created_at.isoformat()}_{order_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, order_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor の形式が正しくありません")
+
+
+async def list_orders(
+    db: AsyncSession, user_id: int, cursor: Optional[str], limit: int, details: bool = False
+) -> dict:
+    """ユーザーの注文を新しい順に返す（(created_at, id) のキーセットページング）"""
+    columns = SUMMARY_COLUMNS + ((Order.items,) if details else ())
+    stmt = select(*columns).where(Order.user_id == user_id)
+    if cursor is not None:
+        created_at, order_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            Order.created_at < created_at,
+            and_(Order.created_at == created_at, Order.id < order_id),
+        ))
+
+    # 1件多く取って次ページの有無を判定する
+    rows = (await db.execute(
+        stmt.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
+    )).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "orders": [row._asdict() for row in rows],
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_next else None,
+    }
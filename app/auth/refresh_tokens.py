@@ -0,0 +1,150 @@
+# app/auth/refresh_tokens.py
+"""リフレッシュトークン（アクセストークンの期限が切れるたびにパスワードを送らせない＝bcryptを回さない）
+
+- ログインで family（系列）を作り、長めの期限のリフレッシュトークンを発行する
+- POST /auth/refresh で使うたびに、同じ family の新しいトークンへ交換する（使ったトークンは used_at を記録）
+- 1つのトークンから発行する後継は1つだけ。交換済みのトークンがまた使われたら:
+  - REFRESH_TOKEN_REUSE_GRACE_SECONDS 以内（複数タブの同時更新・通信のやり直し）は 409 で断るだけにする
+    （新しいトークンは出さない。クライアントは先に成功した側が保存したトークンを使う）
+  - それより後は盗まれたトークンの再利用とみなし、その family をまるごと無効にして 401
+- トークンは推測できない乱数なので、保存するのは SHA-256（bcrypt は不要）。token_hash の一意インデックスで引く
+- ログアウトは family、全端末ログアウトはユーザーのトークンをすべて無効にする
+  （発行済みのアクセストークンは期限（ACCESS_TOKEN_EXPIRE_MINUTES）まで使える）
+
+期限切れの行は python -m app.auth.refresh_tokens で削除する。
+"""
+import hashlib
+import json
+import logging
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_TTL_DAYS = float(os.getenv("REFRESH_TOKEN_TTL_DAYS", "14"))
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = float(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", "10"))
+
+INVALID_REFRESH_TOKEN = "リフレッシュトークンが無効です。再度ログインしてください"
+ALREADY_ROTATED = "このリフレッシュトークンは更新済みです。新しいリフレッシュトークンを使ってください"
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _new_token(user_id: int, family_id: str, now: datetime) -> Tuple[RefreshToken, str]:
+    token = secrets.token_urlsafe(32)
+    row = RefreshToken(
+        token_hash=hash_token(token),
+        family_id=family_id,
+        user_id=user_id,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_TTL_DAYS),
+        created_at=now,
+    )
+    return row, token
+
+
+def issue_refresh_token(db: AsyncSession, user_id: int) -> str:
+    """ログイン時: 新しい family を作ってトークンを発行する（commit は呼び出し側）"""
+    row, token = _new_token(user_id, uuid.uuid4().hex, datetime.utcnow())
+    db.add(row)
+    return token
+
+
+async def _revoke(db: AsyncSession, *criteria, now: datetime) -> int:
+    result = await db.execute(
+        update(RefreshToken)
+        .where(*criteria, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Tuple[int, str]:
+    """トークンを交換して (ユーザーID, 新しいリフレッシュトークン) を返す。無効・再利用なら 401、猶予内の再送なら 409"""
+    now = datetime.utcnow()
+    row = (await db.execute(select(RefreshToken).where(RefreshToken.token_hash == hash_token(token)))).scalar_one_or_none()
+    if row is None or row.revoked_at is not None or row.expires_at <= now:
+        raise HTTPException(status_code=401, detail=INVALID_REFRESH_TOKEN)
+
+    if row.used_at is None:
+        # 同じトークンの同時リクエストのうち1つだけが「初回」になる
+        claimed = await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.id == row.id, RefreshToken.used_at.is_(None))
+            .values(used_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount == 1:
+            new_row, new_token = _new_token(row.user_id, row.family_id, now)
+            db.add(new_row)
+            await db.commit()
+            return row.user_id, new_token
+        # 負けた側は直前に使われたことになる
+        await db.rollback()
+        used_at = now
+    else:
+        used_at = row.used_at
+
+    if now - used_at <= timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+        # 猶予内の再送: 後継はもう発行済みなので、2つ目は出さない（family も無効にしない）
+        raise HTTPException(status_code=409, detail=ALREADY_ROTATED)
+
+    revoked = await _revoke(db, RefreshToken.family_id == row.family_id, now=now)
+    await db.commit()
+    logger.warning(
+        "リフレッシュトークンの再利用を検知しました: user_id=%s family=%s（%d 件を無効化）",
+        row.user_id, row.family_id, revoked,
+    )
+    raise HTTPException(status_code=401, detail=INVALID_REFRESH_TOKEN)
+
+
+async def revoke_family(db: AsyncSession, token: str) -> bool:
+    """ログアウト: トークンの family を無効にする（知らないトークンなら False）"""
+    family_id = (
+        await db.execute(select(RefreshToken.family_id).where(RefreshToken.token_hash == hash_token(token)))
+    ).scalar_one_or_none()
+    if family_id is None:
+        return False
+    await _revoke(db, RefreshToken.family_id == family_id, now=datetime.utcnow())
+    await db.commit()
+    return True
+
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int) -> int:
+    """全端末ログアウト: ユーザーのリフレッシュトークンをすべて無効にする"""
+    revoked = await _revoke(db, RefreshToken.user_id == user_id, now=datetime.utcnow())
+    await db.commit()
+    return revoked
+
+
+def purge_expired(db: Session, now: Optional[datetime] = None) -> int:
+    """期限切れの行を消す（期限内の交換済み・無効化済みの行は再利用の検知に使うので残す）"""
+    result = db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= (now or datetime.utcnow())))
+    db.commit()
+    return result.rowcount
+
+
+def main():
+    db = SessionLocal()
+    try:
+        deleted = purge_expired(db)
+    finally:
+        db.close()
+    print(json.dumps({"deleted": deleted}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer
-from app.auth.utils_email import send_order_confirmation_email
-from app.schemas import PurchaseRequest, UserCreate, UserLogin, CustomerUpdate, UserUpdate, UserResponse
-from app.models import Cart, User, Product, Gift, Customer, Order
-from app.database import get_db
-from app.auth.utils import verify_password, get_password_hash, create_access_token, get_current_user
-from datetime import datetime, timedelta
+from app.auth.checkout import place_order
+from app.auth.order_history import list_orders
+from app.auth.write_coalescer import write_coalescer
+from app.query_diagnostics import query_budget
+from app.schemas import CartPatch, ProductResponse, PurchaseRequest, UserCreate, UserLogin, CustomerUpdate, UserUpdate, UserResponse
+from app.models import User, Product, Gift, Customer
+from app.database import get_db, get_async_db, get_async_read_db
+from app.auth.utils import verify_password, get_password_hash, create_access_token, get_current_user_async
+from app.products.catalog_cache import catalog_cache, cached_json_response
+from app.products.importer import SEED_PRODUCTS_PATH, import_ndjson_file
 from pydantic import BaseModel
-from typing import List
-from sqlalchemy.orm.attributes import flag_modified
+from typing import List, Optional
+from app.auth.cart_items import add_cart_item, get_cart_id, get_cart_items, get_or_create_cart_id, load_cart_items, remove_cart_item, set_cart_item
 
 router = APIRouter(tags=["purchase"])
 
@@ -24,155 +30,127 @@ async def options_signup():
 
 # auth/router_cart.py
 @router.get("/cart")
-def get_cart(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    cart = db.query(Cart).filter(Cart.user_id == current_user.id).first()
-    if not cart:
-        cart = Cart(user_id=current_user.id, items=[])
-        db.add(cart)
-        db.commit()
-        db.refresh(cart)
-    return {"items": cart.items}
+@query_budget(3)
+async def get_cart(db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user_async)):
+    # カートが無ければ空として返す（作成は追加時に行う）
+    return {"items": await db.run_sync(load_cart_items, current_user.id)}
+
+# 書き込み操作（セッションとコミットは write_coalescer が持つ。無効時はその場でコミット）
+async def _add_to_cart(db: AsyncSession, user_id: int, item_id: str, quantity: int):
+    product = await db.get(Product, item_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="商品が見つかりません")
+
+    cart_id = await get_or_create_cart_id(db, user_id)
+    await add_cart_item(db, cart_id, product, quantity)
+
+
+async def _delete_cart_item(db: AsyncSession, user_id: int, item_id: str):
+    cart_id = await get_cart_id(db, user_id)
+    if cart_id is None:
+        raise HTTPException(status_code=404, detail="カートが見つかりません")
+
+    await remove_cart_item(db, cart_id, item_id)
+
 
 @router.post("/cart")
-def add_to_cart(
+@query_budget(5)
+async def add_to_cart(
     item: dict,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_async)
 ):
-    product = db.query(Product).filter(Product.id == item["itemId"]).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="商品が見つかりません")
+    await write_coalescer.submit(_add_to_cart, current_user.id, item["itemId"], item["quantity"])
+    return {"message": "商品をカートに入れました"}
 
-    cart = db.query(Cart).filter(Cart.user_id == current_user.id).first()
-    if not cart:
-        cart = Cart(user_id=current_user.id, items=[])
-        db.add(cart)
-        db.commit()
-        db.refresh(cart)
-
-    for existing in cart.items:
-        if existing["id"] == product.id:
-            existing["quantity"] += item["quantity"]
-            break
+# 複数の追加・数量変更・削除を1トランザクションでまとめて行う
+@router.patch("/cart")
+async def patch_cart(
+    patch: CartPatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    for operation in patch.operations:
+        if operation.op == "add" and operation.quantity < 1:
+            raise HTTPException(status_code=400, detail="数量は1以上で指定してください")
+
+    product_ids = {o.itemId for o in patch.operations if o.op != "remove"}
+    products = {}
+    if product_ids:
+        result = await db.execute(select(Product).where(Product.id.in_(product_ids)))
+        products = {p.id: p for p in result.scalars()}
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise HTTPException(status_code=404, detail=f"商品が見つかりません: {', '.join(missing)}")
+
+    if product_ids:
+        cart_id = await get_or_create_cart_id(db, current_user.id)
     else:
-        cart.items.append({
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "quantity": item["quantity"]
-        })
-
-    flag_modified(cart, "items") 
-    db.commit()
-    return {"message": "商品をカートに入れました"}
+        cart_id = await get_cart_id(db, current_user.id)
+        if cart_id is None:
+            return {"items": []}
+
+    for operation in patch.operations:
+        if operation.op == "add":
+            await add_cart_item(db, cart_id, products[operation.itemId], operation.quantity)
+        elif operation.op == "set":
+            await set_cart_item(db, cart_id, products[operation.itemId], operation.quantity)
+        else:
+            await remove_cart_item(db, cart_id, operation.itemId)
+
+    items = await get_cart_items(db, cart_id)
+    await db.commit()
+    return {"items": items}
 
 @router.delete("/cart/{item_id}")
-def delete_cart_item(item_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    cart = db.query(Cart).filter(Cart.user_id == current_user.id).first()
-    if not cart:
-        raise HTTPException(status_code=404, detail="カートが見つかりません")
-
-    cart.items = [item for item in cart.items if item["id"] != item_id]
-    flag_modified(cart, "items")
-    db.commit()
+@query_budget(3)
+async def delete_cart_item(item_id: str, current_user: User = Depends(get_current_user_async)):
+    await write_coalescer.submit(_delete_cart_item, current_user.id, item_id)
     return {"message": "商品を削除しました"}
 
 #商品登録
 
 @router.post("/products/register_bulk")
 def register_products_bulk(db: Session = Depends(get_db)):
-    products = [
-        Product(
-            id="product1",
-            name="澄み切ったスカイブルーとクリスタルハート",
-            category="水色 / ピアス / イヤリング",
-            price=3300,
-            image="/images/product1.jpg"
-        ),
-        Product(
-            id="product2",
-            name="気品を纏うラベンダーハート",
-            category="紫 / ピアス / イヤリング",
-            price=3300,
-            image="/images/product2.jpg"
-        ),
-        Product(
-            id="product3",
-            name="純真無垢なベビーピンクハート",
-            category="ピンク / ピアス / イヤリング",
-            price=3300,
-            image="/images/product3.jpg"
-        ),
-        Product(
-            id="product4",
-            name="安らぎ与えるミントグリーンハート",
-            category="緑 / ピアス / イヤリング",
-            price=3300,
-            image="/images/product4.jpg"
-        ),
-        Product(
-            id="product5",
-            name="雨空を彩る紫陽花",
-            category="水色 / イヤーカフ / ピアス / イヤリング",
-            price=2500,
-            image="/images/product5.jpg"
-        ),
-        Product(
-            id="product6",
-            name="季節を運ぶ桜リング-雪月花の冬桜-",
-            category="水色 / リング",
-            price=2200,
-            image="/images/product6.jpg"
-        ),
-    ]
-
-    db.add_all(products)
-    db.commit()
-    return {"message": f"{len(products)} 件の商品を登録しました"}
-
-@router.get("/products")
-def get_products(db: Session = Depends(get_db)):
-    return db.query(Product).all()
+    # 初期商品は app/products/seed_products.ndjson から一括登録する
+    report = import_ndjson_file(db, SEED_PRODUCTS_PATH)
+    return {"message": report["message"], "registered_ids": report["inserted_ids"]}
+
+@router.get("/products", response_model=List[ProductResponse])
+@query_budget(1)
+async def get_products(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    return cached_json_response(request, await catalog_cache.get_list_async(db))
 
 
 
 #購入ページ
 @router.post("/purchase")
-def purchase(
+@query_budget(11)
+async def purchase(
     request: PurchaseRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_async)
 ):
-    cart = db.query(Cart).filter(Cart.user_id == current_user.id).first()
-    if not cart or not cart.items:
-        raise HTTPException(status_code=400, detail="カートが空です")
-
-    total_price = sum(item["price"] * item["quantity"] for item in cart.items) + 185
-
-    order = Order(
-        user=current_user,
-        items=cart.items,
-        total_price=total_price,
-        payment_method=request.payment_method,
-        address=request.address,
-        created_at=datetime.utcnow()
-    )
-
-    db.add(order)
-    cart.items = []
-    flag_modified(cart, "items")
-    db.commit()
+    await write_coalescer.submit(place_order, current_user, request.payment_method, request.address)
+    return {"message": "注文が完了しました"}
 
-    # ✅ メール送信
-    send_order_confirmation_email(current_user.email, current_user.username)
 
-    return {"message": "注文が完了しました"}
+#注文履歴
+@router.get("/orders")
+@query_budget(2)
+async def get_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    details: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    return await list_orders(db, current_user.id, cursor, limit, details)
 
 
 #追加情報
-@router.get("/products/{product_id}")
-def get_product(product_id: str, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+@router.get("/products/{product_id}", response_model=ProductResponse)
+@query_budget(1)
+async def get_product(product_id: str, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    product = await catalog_cache.get_item_async(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="商品が見つかりません")
-    return product
+    return cached_json_response(request, product)
@@ -1,10 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends, Response, logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer
-from app.schemas import UserCreate, UserLogin, CustomerUpdate, UserUpdate, UserResponse
+from app.schemas import UserCreate, UserLogin, CustomerUpdate, UserUpdate, UserResponse, RefreshRequest
 from app.models import Cart, User, Product, Gift, Customer, Order
-from app.database import get_db
-from app.auth.utils import ALGORITHM, SECRET_KEY, verify_password, get_password_hash, create_access_token, get_current_user
+from app.database import get_db, get_async_db
+from app.auth.utils import ALGORITHM, SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, verify_password, get_password_hash, create_access_token, get_current_user, user_id_from_token
+from app.auth.refresh_tokens import issue_refresh_token, revoke_family, revoke_user_tokens, rotate_refresh_token
+from app.auth.hash_pool import hash_pool
+from app.auth.token_cache import claims_cache, user_cache
+from app.auth.write_coalescer import write_coalescer
+from app.query_diagnostics import query_budget
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import List
@@ -35,35 +42,45 @@ async def options_signup():
 # トークンを取得するためのエンドポイントのURL
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def safe_get_password_hash(password: str) -> str:
+async def safe_get_password_hash(password: str) -> str:
     if not password or not isinstance(password, str):
         raise ValueError("パスワードが空か文字列ではありません")
     byte_password = password.encode("utf-8")
     if len(byte_password) > 72:
         raise ValueError("パスワードは72バイト以内で入力してください")
-    return get_password_hash(password)
+    # bcryptは専用のプロセスプールで実行する（共有スレッドプールを占有しない）
+    return await hash_pool.hash(password)
+
+
+async def _find_duplicate_user(db: AsyncSession, username: str, email: str):
+    if (await db.execute(select(User.id).where(User.username == username))).first():
+        return "Username already exists"
+    if (await db.execute(select(User.id).where(User.email == email))).first():
+        return "Email already exists"
+    return None
 
 
 # ユーザー登録エンドポイント
 @router.post("/signup")
-def signup(user: UserCreate, db: Session = Depends(get_db)):
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     logger.info(f"受け取ったbirthdate型: {type(user.birthdate)} 値: {user.birthdate}")
     logger.info(f"受け取ったパスワード: {user.password}")
     """
     新しいユーザーを登録する
     """
     # ユーザー名またはメールアドレスが既に存在するか確認
-    if db.query(User).filter(User.username == user.username).first():
-        raise HTTPException(status_code=400, detail="Username already exists")
-    if db.query(User).filter(User.email == user.email).first():
-        raise HTTPException(status_code=400, detail="Email already exists")
+    duplicate = await _find_duplicate_user(db, user.username, user.email)
+    if duplicate:
+        raise HTTPException(status_code=400, detail=duplicate)
     
     if not user.password or len(user.password.encode("utf-8")) > 72:
         logger.warning("パスワードが空か、72バイトを超えています")
         raise HTTPException(status_code=400, detail="パスワードは72バイト以内で入力してください")
 
     try:
-        hashed_password = safe_get_password_hash(user.password)
+        hashed_password = await safe_get_password_hash(user.password)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"パスワードハッシュ化失敗: {e}")
         raise HTTPException(status_code=400, detail="パスワード形式に問題があります")
@@ -76,45 +93,68 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         address=user.address
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return {"message": "アカウントが作成されました"}
 
 # ログインエンドポイント
 @router.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
     ログインしてアクセストークンを取得する
     """
     # ユーザーをデータベースから取得
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalar_one_or_none()
+    if not db_user or not await hash_pool.verify(user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # JWTトークンを生成して返す
-    access_token = create_access_token(user_id=db_user.id, expires_delta=timedelta(minutes=30))
-    return {"token": access_token}
+    # JWTトークンとリフレッシュトークンを生成して返す
+    refresh_token = issue_refresh_token(db, db_user.id)
+    await db.commit()
+    return _token_response(db_user.id, refresh_token)
+
+
+def _token_response(user_id: int, refresh_token: str) -> dict:
+    access_token = create_access_token(user_id=user_id, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return {"token": access_token, "refresh_token": refresh_token, "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60}
+
+
+# アクセストークンの再発行（パスワードを使わないので bcrypt を回さない）
+@router.post("/refresh")
+@query_budget(3)
+async def refresh(body: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    リフレッシュトークンを新しいものに交換し、アクセストークンを再発行する
+    （交換済みのトークンは、猶予内の再送なら 409、それより後なら family ごと無効にして 401）
+    """
+    user_id, refresh_token = await rotate_refresh_token(db, body.refresh_token)
+    return _token_response(user_id, refresh_token)
+
+
+# ログアウト（この端末のリフレッシュトークンを無効にする）
+@router.post("/logout")
+@query_budget(2)
+async def logout(body: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    await revoke_family(db, body.refresh_token)
+    return {"message": "ログアウトしました"}
 
-# 現在のユーザーを取得するヘルパー関数
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]) # type: ignore
-        user_id: str = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="トークンにユーザー情報が含まれていません")
-        
-        user = db.query(User).filter(User.id == int(user_id)).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
-        
-        return user
 
-    except ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="トークンの有効期限が切れています")
-    except JWTError:
-        raise HTTPException(status_code=403, detail="トークンの検証に失敗しました")
+# すべての端末からログアウト
+@router.post("/logout_all")
+@query_budget(1)
+async def logout_all(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    revoked = await revoke_user_tokens(db, user_id_from_token(token))
+    return {"message": "すべての端末からログアウトしました", "revoked": revoked}
 
 
+# bcryptプール・トークンキャッシュ・まとめ書き込みの状態
+@router.get("/metrics")
+def auth_metrics():
+    return {
+        "hash_pool": hash_pool.stats(),
+        "token_cache": claims_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "write_coalescer": write_coalescer.stats(),
+    }
 
 #マイページ
 
@@ -130,6 +170,7 @@ def update_me(update_data: UserUpdate, db: Session = Depends(get_db), current_us
 
     db.commit()
     db.refresh(current_user)
+    user_cache.invalidate(current_user.id)
     return current_user
 
 @router.put("/customers/{customer_id}", response_model=CustomerUpdate)
@@ -1,17 +1,23 @@
+import os
 from jose import JWTError, jwt,  ExpiredSignatureError # type: ignore # JWTトークンの生成と検証
 from passlib.context import CryptContext  # type: ignore # パスワードのハッシュ化
 from datetime import datetime, timedelta
 from typing import List
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from app.models import User
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_read_db
+from app.auth.token_cache import claims_cache, user_cache
 
 # 秘密鍵とアルゴリズムの設定
 SECRET_KEY = "your_secret_key"  # 実際のプロジェクトでは環境変数で管理
 ALGORITHM = "HS256"  # ハッシュアルゴリズム
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))  # 期限切れ後は /auth/refresh で取り直す
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# 管理者（売上分析など）として扱うメールアドレス（カンマ区切り。未設定なら誰も使えない）
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -73,16 +79,74 @@ def authenticate_user(db: Session, email: str, password: str):
 #def create_access_token(data: dict):
     #return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# 検証済みトークンのクレームをキャッシュして、毎回の jwt.decode を省く
+def decode_token_cached(token: str) -> dict:
+    payload = claims_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="トークンの有効期限が切れています")
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        raise HTTPException(status_code=401, detail="トークンの検証に失敗しました")
+    # 有効期限(exp)を過ぎたキャッシュは使わない
+    claims_cache.set(token, payload, expires_at=payload.get("exp"))
+    return payload
+
+
+def _detached_copy(user: User) -> User:
+    # セッションに属さないスナップショットを作る（リクエスト間で共有するため）
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs})
+    make_transient_to_detached(copy)
+    return copy
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+
+def user_id_from_token(token: str) -> int:
+    payload = decode_token_cached(token)
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="トークンにユーザー情報が含まれていません")
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="トークンの検証に失敗しました")
+
+
+# 現在のユーザーを取得する（マイページなど同期ルート用）
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user_id = user_id_from_token(token)
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        # SELECTせずにこのリクエストのセッションへ載せる
+        return db.merge(cached, load=False)
+
+    user = db.query(User).filter(User.id == user_id).first()
     if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
+    user_cache.set(user_id, _detached_copy(user))
+    return user
+
+
+# 非同期版（カート・購入など async def のルート用）
+# ユーザーの読み出しだけなので読み取り用セッションを使う（呼び出し側で変更しないこと）
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_read_db)):
+    user_id = user_id_from_token(token)
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+
+    user = await db.get(User, user_id)
+    # 接続をすぐプールへ返す（同じリクエストの書き込み用セッションと同じプールを使う場合があるため）
+    await db.commit()
+    if user is None:
+        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
+    user_cache.set(user_id, _detached_copy(user))
+    return user
+
+
+# 管理者だけが使えるルート用
+def get_current_admin(current_user: User = Depends(get_current_user)):
+    if (current_user.email or "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="管理者のみ利用できます")
+    return current_user
@@ -1,10 +1,27 @@
+import os
 import smtplib
 from email.mime.text import MIMEText
 from email.utils import formataddr
+from typing import Union
 
-def send_order_confirmation_email(to_email: str, username: str):
-    sender_email = "amaironohi@example.com"
-    sender_name = "天色の日-AmaironoHi-"
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import EmailOutbox
+
+# SMTP設定（ローカルでは SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=0 などで検証用サーバーに向ける）
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.example.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "amaironohi@example.com")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "yourpassword")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+
+SENDER_EMAIL = "amaironohi@example.com"
+SENDER_NAME = "天色の日-AmaironoHi-"
+
+
+def build_order_confirmation(username: str):
     subject = "ご注文いただきありがとうございました!"
     body = f"""
 {username} 様
@@ -16,16 +33,42 @@ def send_order_confirmation_email(to_email: str, username: str):
 
 天色の日-AmaironoHi-
 """
+    return subject, body
+
 
+def build_message(to_email: str, subject: str, body: str) -> MIMEText:
     msg = MIMEText(body, "plain", "utf-8")
     msg["Subject"] = subject
-    msg["From"] = formataddr((sender_name, sender_email))
+    msg["From"] = formataddr((SENDER_NAME, SENDER_EMAIL))
     msg["To"] = to_email
+    return msg
 
+
+def open_smtp_session() -> smtplib.SMTP:
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
     try:
-        with smtplib.SMTP("smtp.example.com", 587) as server:
+        if SMTP_STARTTLS:
             server.starttls()
-            server.login("amaironohi@example.com", "yourpassword")
-            server.send_message(msg)
+        if SMTP_USER and SMTP_PASSWORD:
+            server.login(SMTP_USER, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+# 注文確認メールを送信待ちに積む（コミットは呼び出し側の注文と一緒に行う）
+def enqueue_order_confirmation_email(db: Union[Session, AsyncSession], to_email: str, username: str) -> EmailOutbox:
+    subject, body = build_order_confirmation(username)
+    mail = EmailOutbox(to_email=to_email, subject=subject, body=body)
+    db.add(mail)
+    return mail
+
+
+def send_order_confirmation_email(to_email: str, username: str):
+    subject, body = build_order_confirmation(username)
+    try:
+        with open_smtp_session() as server:
+            server.send_message(build_message(to_email, subject, body))
     except Exception as e:
         print("メール送信エラー:", e)
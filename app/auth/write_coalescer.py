@@ -0,0 +1,192 @@
+# app/auth/write_coalescer.py
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from app.database import AsyncSessionLocal, WriterSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# カート・購入の書き込みをまとめてコミットする（グループコミット）
+WRITE_COALESCER_ENABLED = os.getenv("WRITE_COALESCER_ENABLED", "0") == "1"
+WRITE_BATCH_MAX_OPS = int(os.getenv("WRITE_BATCH_MAX_OPS", "64"))
+WRITE_BATCH_MAX_DELAY_MS = float(os.getenv("WRITE_BATCH_MAX_DELAY_MS", "2"))
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "1024"))
+# commit: バッチのコミット後に応答する（従来と同じ耐久性）
+# apply : 自分の操作を適用した時点で応答する（速いが、直後のコミット失敗・クラッシュで失われうる）
+WRITE_ACK = os.getenv("WRITE_ACK", "commit")
+
+WriteOp = Callable[..., Awaitable]
+
+
+class WriteCoalescer:
+    """書き込み操作をキューに積み、1つのタスクが数件ずつ1トランザクションで適用する
+
+    各操作は SAVEPOINT の中で実行するので、1件の失敗（HTTPExceptionなど）は
+    その操作だけを取り消し、同じバッチの他の操作には影響しない。
+
+    session_factory はライター専用（既定は接続1本の WriterSessionLocal）、
+    inline_session_factory はライターが動いていないときにその場で実行するためのセッション。
+    """
+
+    def __init__(
+        self,
+        session_factory=WriterSessionLocal,
+        max_ops: int = WRITE_BATCH_MAX_OPS,
+        max_delay_ms: float = WRITE_BATCH_MAX_DELAY_MS,
+        ack: str = WRITE_ACK,
+        queue_size: int = WRITE_QUEUE_SIZE,
+        inline_session_factory=AsyncSessionLocal,
+    ):
+        if ack not in ("commit", "apply"):
+            raise ValueError(f"WRITE_ACK は commit か apply を指定してください: {ack}")
+        self.session_factory = session_factory
+        self.inline_session_factory = inline_session_factory
+        self.max_ops = max_ops
+        self.max_delay = max_delay_ms / 1000
+        self.ack = ack
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._batches = 0
+        self._ops = 0
+        self._failed_ops = 0
+        self._failed_commits = 0
+        self._max_batch = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def submit(self, op: WriteOp, *args):
+        """op(db, *args) を実行して結果を返す
+
+        ライターが動いていればキューに積んで結果を待つ。待っている間、呼び出し側は接続を持たない
+        （書き込み用のセッションを開かないので、プールが埋まってもライターの接続と取り合わない）。
+        ライターが動いていなければ、その場でセッションを開いて実行し、すぐコミットする。
+        """
+        if not self.running:
+            async with self.inline_session_factory() as db:
+                try:
+                    result = await op(db, *args)
+                except Exception:
+                    await db.rollback()
+                    raise
+                await db.commit()
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, args, future))
+        return await future
+
+    async def _next_batch(self) -> list:
+        batch = []
+        loop = asyncio.get_running_loop()
+        deadline = None
+        while len(batch) < self.max_ops:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                if deadline is None:
+                    item = await self._queue.get()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+            if item is None:  # stop() の合図
+                self._stopping = True
+                break
+            batch.append(item)
+            if deadline is None:
+                deadline = loop.time() + self.max_delay
+        return batch
+
+    async def _apply(self, batch: list):
+        outcomes = []
+        async with self.session_factory() as db:
+            if db.bind.dialect.name == "sqlite":
+                # pysqlite は SAVEPOINT の前に BEGIN を出さないので、自分で書き込みトランザクションを始める
+                await (await db.connection()).exec_driver_sql("BEGIN IMMEDIATE")
+            for op, args, future in batch:
+                try:
+                    async with db.begin_nested():
+                        result = await op(db, *args)
+                except Exception as e:
+                    outcomes.append((future, None, e))
+                    self._failed_ops += 1
+                else:
+                    outcomes.append((future, result, None))
+                    if self.ack == "apply" and not future.done():
+                        future.set_result(result)
+                # 操作ごとに新しいセッションと同じ状態から始める
+                db.expunge_all()
+
+            try:
+                await db.commit()
+            except Exception as e:
+                logger.error(f"まとめ書き込みのコミットに失敗しました ({len(batch)}件): {e}")
+                self._failed_commits += 1
+                outcomes = [(future, None, error or e) for future, _, error in outcomes]
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def run(self):
+        while not self._stopping:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            self._batches += 1
+            self._ops += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            try:
+                await self._apply(batch)
+            except Exception as e:
+                logger.error(f"まとめ書き込みのエラー: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue(self.queue_size)
+        self._task = asyncio.get_running_loop().create_task(self.run(), name="write-coalescer")
+
+    async def stop(self):
+        if not self.running:
+            return
+        # 合図より前に積まれた操作は処理し終えてから止まる
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "ack": self.ack,
+            "max_ops": self.max_ops,
+            "max_delay_ms": self.max_delay * 1000,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self._batches,
+            "ops": self._ops,
+            "avg_batch_size": round(self._ops / self._batches, 2) if self._batches else 0.0,
+            "max_batch_size": self._max_batch,
+            "failed_ops": self._failed_ops,
+            "failed_commits": self._failed_commits,
+        }
+
+
+write_coalescer = WriteCoalescer()
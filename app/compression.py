@@ -0,0 +1,267 @@
+# app/compression.py
+"""レスポンスの圧縮（gzip / Brotli）
+
+- Accept-Encoding を見て br → gzip の順で選ぶ（brotli が入っていなければ gzip のみ）
+- COMPRESSION_MIN_SIZE バイト未満の本文は圧縮しない（小さい本文は縮まらずCPUだけ使う）
+- キャッシュする本文（商品カタログなど）は precompress() で一度だけ高圧縮し、保存したバイト列を返す
+- それ以外は CompressionMiddleware がストリーミングの圧縮器で送りながら圧縮する
+- 圧縮にかかったCPU時間と圧縮前後のバイト数を数え、/metrics で出す
+"""
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli はオプション
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# その場で圧縮するレスポンス用（速さ優先）
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# キャッシュに保存する本文用（一度だけなので圧縮率優先。brotli の 10, 11 は桁違いに遅いので 9）
+GZIP_STATIC_LEVEL = int(os.getenv("GZIP_STATIC_LEVEL", "9"))
+BROTLI_STATIC_QUALITY = int(os.getenv("BROTLI_STATIC_QUALITY", "9"))
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript", "application/xml")
+
+
+class CompressionStats:
+    """圧縮方式（encoding）× 種類（dynamic: その場で圧縮 / static: キャッシュ用に圧縮 / cached: 保存済みを送信）ごとの累計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], list] = defaultdict(lambda: [0, 0, 0, 0.0])  # 件数, 圧縮前, 圧縮後, CPU秒
+        self.skipped_small = 0
+
+    def observe(self, encoding: str, mode: str, bytes_in: int, bytes_out: int, cpu_seconds: float = 0.0, responses: int = 1):
+        with self._lock:
+            totals = self._totals[encoding, mode]
+            totals[0] += responses
+            totals[1] += bytes_in
+            totals[2] += bytes_out
+            totals[3] += cpu_seconds
+
+    def observe_skipped(self):
+        with self._lock:
+            self.skipped_small += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: tuple(values) for key, values in self._totals.items()}
+
+    def counters(self) -> Iterable[tuple]:
+        for (encoding, mode), (responses, bytes_in, bytes_out, cpu) in sorted(self.snapshot().items()):
+            labels = {"encoding": encoding, "mode": mode}
+            yield "http_compression_responses_total", "Bodies compressed or served precompressed.", labels, responses
+            yield "http_compression_bytes_in_total", "Body bytes before compression.", labels, bytes_in
+            yield "http_compression_bytes_out_total", "Body bytes after compression.", labels, bytes_out
+            yield "http_compression_cpu_seconds_total", "CPU time spent compressing.", labels, cpu
+        yield "http_compression_skipped_small_total", "Compressible responses sent as-is because they were under the size threshold.", {}, self.skipped_small
+
+    def gauges(self) -> Iterable[tuple]:
+        for (encoding, mode), (_, bytes_in, bytes_out, _) in sorted(self.snapshot().items()):
+            if bytes_in:
+                yield "http_compression_ratio", "Compressed size / original size.", {"encoding": encoding, "mode": mode}, bytes_out / bytes_in
+
+
+compression_stats = CompressionStats()
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encoding から使う圧縮方式を選ぶ（q値が同じなら br を優先、q=0 は不可）"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class _Compressor:
+    """gzip / brotli のストリーミング圧縮器（CPU時間も測る）"""
+
+    def __init__(self, encoding: str, static: bool = False):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_STATIC_QUALITY if static else BROTLI_QUALITY)
+        else:
+            # wbits=31 で gzip 形式
+            self._compressor = zlib.compressobj(GZIP_STATIC_LEVEL if static else GZIP_LEVEL, zlib.DEFLATED, 31)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def compress(self, data: bytes) -> bytes:
+        started = time.thread_time()
+        out = self._compressor.process(data) if self.encoding == "br" else self._compressor.compress(data)
+        self.cpu_seconds += time.thread_time() - started
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def finish(self) -> bytes:
+        started = time.thread_time()
+        out = self._compressor.finish() if self.encoding == "br" else self._compressor.flush()
+        self.cpu_seconds += time.thread_time() - started
+        self.bytes_out += len(out)
+        return out
+
+
+def precompress(body: bytes, stats: CompressionStats = compression_stats) -> Dict[str, bytes]:
+    """キャッシュに保存する本文を対応しているすべての方式で圧縮しておく（しきい値未満なら空）"""
+    if not COMPRESSION_ENABLED or len(body) < COMPRESSION_MIN_SIZE:
+        return {}
+    encoded = {}
+    for encoding in ENCODINGS:
+        compressor = _Compressor(encoding, static=True)
+        data = compressor.compress(body) + compressor.finish()
+        stats.observe(encoding, "static", compressor.bytes_in, compressor.bytes_out, compressor.cpu_seconds)
+        encoded[encoding] = data
+    return encoded
+
+
+def _weak_etag(etag: str) -> str:
+    # 圧縮後は別の表現になるので、強いETagは弱いETagにする
+    return etag if etag.startswith("W/") else "W/" + etag
+
+
+class CompressionMiddleware:
+    """JSON・テキストのレスポンスを Accept-Encoding に応じて圧縮するASGIミドルウェア
+
+    本文が1回で送られる（more_body=False）ときはしきい値で判定し、
+    ストリーミングのときは長さが分からないので常に圧縮する。
+    すでに Content-Encoding が付いているレスポンス（保存済みの圧縮本文）はそのまま通す。
+    """
+
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE, stats: CompressionStats = compression_stats):
+        self.app = app
+        self.min_size = min_size
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding)
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    b"content-encoding" in headers
+                    or message["status"] in (204, 304)
+                    or not is_compressible(content_type)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                # 本文の最初の部分を見るまで送らない
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start_message is not None:
+                start, start_message = start_message, None
+                headers = _without(start.get("headers", []), b"vary")
+                headers.append((b"vary", _vary(start.get("headers", []))))
+                if encoding is None or (not more_body and len(body) < self.min_size):
+                    if encoding is not None:
+                        self.stats.observe_skipped()
+                    passthrough = True
+                    await send({**start, "headers": headers})
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                headers = _without(headers, b"content-length", b"content-encoding", b"etag")
+                headers.append((b"content-encoding", encoding.encode()))
+                etag = _header(start.get("headers", []), b"etag")
+                if etag is not None:
+                    headers.append((b"etag", _weak_etag(etag.decode("latin-1")).encode("latin-1")))
+                if not more_body:
+                    data = compressor.compress(body) + compressor.finish()
+                    headers.append((b"content-length", str(len(data)).encode()))
+                    self._observe(compressor)
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send({**start, "headers": headers})
+
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+                self._observe(compressor)
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _observe(self, compressor: _Compressor):
+        self.stats.observe(compressor.encoding, "dynamic", compressor.bytes_in, compressor.bytes_out, compressor.cpu_seconds)
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers, *names: bytes) -> list:
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _vary(headers) -> bytes:
+    vary = _header(headers, b"vary")
+    if vary is None:
+        return b"Accept-Encoding"
+    if b"accept-encoding" in vary.lower():
+        return vary
+    return vary + b", Accept-Encoding"
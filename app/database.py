@@ -1,13 +1,219 @@
 # app/database.py
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import os
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./portfolio_app.db"  # SQLiteのURL
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+from app.metrics import instrument_engine
+from app.query_diagnostics import QUERY_DIAGNOSTICS, instrument_engine_diagnostics
+from app.threaded_session import threaded_sessionmaker
+
+# DATABASE_URL で接続先を切り替える（本番はPostgreSQL、ローカルはSQLite）
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./portfolio_app.db")  # SQLiteのURL
+
+# コネクションプールの設定
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# SQLiteの性能プロファイル（WAL＋読み取り専用プール＋書き込み接続は1本に直列化）
+# 読み取りは速くなるが、書き込みは1本の接続に並ぶぶん遅くなる（write p50 が数倍、全体の p99 も改善しない）ので既定は無効
+# 読み取りが大半の環境で、benchmarks.sqlite_profile で確かめてから有効にする
+SQLITE_PERFORMANCE_PROFILE = os.getenv("SQLITE_PERFORMANCE_PROFILE", "0") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # 負の値はKiB単位（64MiB）
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+# async def のルートのセッション
+# auto: PostgreSQL などは AsyncSession（asyncpg）、SQLite は同期ドライバ＋スレッドプールの ThreadedSession
+#       （aiosqlite は同期Session＋スレッドプールより遅い: benchmarks.async_sessions）
+# 1: 常に AsyncSession / 0: 常に ThreadedSession
+ASYNC_DB_DRIVER = os.getenv("ASYNC_DB_DRIVER", "auto")
+
+
+def sync_database_url(url: str) -> str:
+    # Render などが渡す postgres:// を SQLAlchemy の形式にそろえる
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url.replace("+aiosqlite", "").replace("+asyncpg", "")
+
+
+def async_database_url(url: str) -> str:
+    url = sync_database_url(url)
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+
+def _is_sqlite_file(url: str) -> bool:
+    if not url.startswith("sqlite"):
+        return False
+    database = make_url(url).database
+    return bool(database) and database != ":memory:" and "mode=memory" not in url
+
+
+def read_only_url(url: str) -> str:
+    # 同じファイルを mode=ro のURIで開く（書き込みはSQLite側で拒否される）
+    parsed = make_url(url)
+    path = os.path.abspath(parsed.database)
+    return f"{parsed.drivername}:///file:{path}?mode=ro&uri=true"
+
+
+def sqlite_pragmas(read_only: bool = False) -> list:
+    pragmas = [
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if not read_only:
+        # journal_mode=WAL はファイルに記録されるが、書き込み接続で毎回確認しておく
+        pragmas = ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"] + pragmas
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine, read_only: bool = False):
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def _engine_options(url: str, sqlite_profile: bool = False, read_only: bool = False) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        if not _is_sqlite_file(url):
+            return options
+        if sqlite_profile:
+            if read_only:
+                options.update(pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
+            else:
+                # 書き込みは1接続だけにして、ロック待ちではなくプール待ちで順番に処理する
+                options.update(pool_size=1, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
+            return options
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def use_sqlite_profile(url: str, sqlite_profile: bool = SQLITE_PERFORMANCE_PROFILE) -> bool:
+    return sqlite_profile and _is_sqlite_file(sync_database_url(url))
+
+
+def use_async_driver(url: str, setting: str = ASYNC_DB_DRIVER) -> bool:
+    if setting == "auto":
+        return not sync_database_url(url).startswith("sqlite")
+    return setting == "1"
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, sqlite_profile: bool = SQLITE_PERFORMANCE_PROFILE):
+    url = sync_database_url(url)
+    profile = use_sqlite_profile(url, sqlite_profile)
+    engine = create_engine(url, **_engine_options(url, profile))
+    return apply_sqlite_pragmas(engine) if profile else engine
+
+
+def make_async_engine(url: str = SQLALCHEMY_DATABASE_URL, sqlite_profile: bool = SQLITE_PERFORMANCE_PROFILE):
+    profile = use_sqlite_profile(url, sqlite_profile)
+    url = async_database_url(url)
+    options = _engine_options(url, profile)
+    options.pop("connect_args", None)  # aiosqlite はスレッドチェック不要
+    engine = create_async_engine(url, **options)
+    return apply_sqlite_pragmas(engine) if profile else engine
+
+
+def make_writer_engine(url: str = SQLALCHEMY_DATABASE_URL, sqlite_profile: bool = SQLITE_PERFORMANCE_PROFILE):
+    """write_coalescer 専用のエンジン（接続は1本だけ）
+
+    ライターはバッチを1つずつ順に適用するので1本で足りる。リクエストと同じプールを取り合うと、
+    プールが埋まっている間ライターが接続を待ち、その結果を待つリクエストもまとめて止まる。
+    """
+    url = sync_database_url(url)
+    profile = use_sqlite_profile(url, sqlite_profile)
+    options = _engine_options(url, profile)
+    if "pool_size" in options:
+        options.update(pool_size=1, max_overflow=0)
+    if use_async_driver(url):
+        options.pop("connect_args", None)
+        engine = create_async_engine(async_database_url(url), **options)
+    else:
+        engine = create_engine(url, **options)
+    return apply_sqlite_pragmas(engine) if profile else engine
+
+
+def make_read_engine(url: str = SQLALCHEMY_DATABASE_URL, sqlite_profile: bool = SQLITE_PERFORMANCE_PROFILE):
+    """プロファイル有効時だけ読み取り専用エンジンを作る（無効時は None）"""
+    if not use_sqlite_profile(url, sqlite_profile):
+        return None
+    url = read_only_url(sync_database_url(url))
+    return apply_sqlite_pragmas(create_engine(url, **_engine_options(url, True, read_only=True)), read_only=True)
+
+
+def make_async_read_engine(url: str = SQLALCHEMY_DATABASE_URL, sqlite_profile: bool = SQLITE_PERFORMANCE_PROFILE):
+    if not use_sqlite_profile(url, sqlite_profile):
+        return None
+    url = read_only_url(async_database_url(url))
+    options = _engine_options(url, True, read_only=True)
+    options.pop("connect_args", None)
+    return apply_sqlite_pragmas(create_async_engine(url, **options), read_only=True)
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 読み取り専用プール（プロファイル無効時は通常のセッションと同じ）
+read_engine = make_read_engine()
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine is not None else SessionLocal
+)
+
+if use_async_driver(SQLALCHEMY_DATABASE_URL):
+    async_engine = make_async_engine()
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    async_read_engine = make_async_read_engine()
+    AsyncReadSessionLocal = (
+        async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+        if async_read_engine is not None else AsyncSessionLocal
+    )
+else:
+    # 同期エンジン（と読み取り専用プール）をそのまま使う
+    async_engine = async_read_engine = None
+    AsyncSessionLocal = threaded_sessionmaker(engine, autocommit=False, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = (
+        threaded_sessionmaker(read_engine, autocommit=False, autoflush=False, expire_on_commit=False)
+        if read_engine is not None else AsyncSessionLocal
+    )
+
+# write_coalescer のライター用（接続1本をリクエストと分けて確保する）
+writer_engine = make_writer_engine()
+WriterSessionLocal = (
+    async_sessionmaker(writer_engine, autoflush=False, expire_on_commit=False)
+    if use_async_driver(SQLALCHEMY_DATABASE_URL)
+    else threaded_sessionmaker(writer_engine, autocommit=False, autoflush=False, expire_on_commit=False)
+)
+
+# SQLの件数・時間を /metrics とリクエストごとの集計に記録する
+for _engine in (engine, async_engine, read_engine, async_read_engine, writer_engine):
+    if _engine is not None:
+        instrument_engine(_engine)
+        # 診断モードでは全SQLを呼び出し元つきで記録する（N+1・遅いSQLの検出）
+        if QUERY_DIAGNOSTICS:
+            instrument_engine_diagnostics(_engine)
+
 Base = declarative_base()
 
 
@@ -19,3 +225,22 @@ def get_db():
     finally:
         db.close()
 
+
+# 非同期版（async def のルートで使う。SQLite では ThreadedSession）
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# GETなど読み取りだけのルート用
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
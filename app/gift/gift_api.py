@@ -1,45 +1,63 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db, get_async_read_db
 from app.models import Gift
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
 from fastapi import Body
-from app.auth.utils import calculate_match_score
-from app.schemas import GiftCreate
+from app.gift.tag_index import gift_tag_index
+from app.gift.scoring import gift_tag_matrix
+from app.query_diagnostics import query_budget
+from app.schemas import GiftCreate, GiftResponse
+from app.serialization import RowJSONCache, compose, json_response
 
 
 router = APIRouter(tags=["gift"])
 
+# ギフト1行ごとのJSON（おすすめで同じギフトを何度も返すので、変わっていない行は再エンコードしない）
+gift_json = RowJSONCache(Gift, GiftResponse)
+
 class TagQuery(BaseModel):
     tags: List[str]
 
-@router.post("/recommend")
-def recommend_gift(query:  TagQuery = Body(...), db: Session = Depends(get_db)):
-    all_gifts = db.query(Gift).all()
-    scored = []
-
-    for gift in all_gifts:
-        if not gift.tags:
-            continue
-        match_score = calculate_match_score(gift.tags, query.tags)
-        scored.append((gift, match_score))
-
-    # 一致度がゼロなら、タグ数が近いギフトを返す
-    if not scored or all(score == 0 for _, score in scored):
-        fallback = sorted(all_gifts, key=lambda g: abs(len(g.tags) - len(query.tags)))
-        return fallback[:2]
-
-    # スコア順に並べて上位を返す
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return [g for g, _ in scored[:2]]
-
-@router.post("/create")
+class BatchTagQuery(BaseModel):
+    queries: List[TagQuery] = Field(..., max_length=10000)
+    top_k: int = Field(2, ge=1, le=50)
+
+@router.post("/recommend", response_model=List[GiftResponse])
+@query_budget(2)
+async def recommend_gift(query:  TagQuery = Body(...), db: AsyncSession = Depends(get_async_read_db)):
+    # タグインデックスで候補ギフトだけを採点する（全件スキャンしない）
+    await gift_tag_index.ensure_built_async(db)
+    gift_ids = gift_tag_index.recommend(query.tags)
+    if not gift_ids:
+        return json_response(b"[]")
+
+    result = await db.execute(select(Gift).where(Gift.id.in_(gift_ids)))
+    gifts = {g.id: g for g in result.scalars()}
+    return json_response(gift_json.encode_many(gifts[gift_id] for gift_id in gift_ids if gift_id in gifts))
+
+# 複数のタグクエリをまとめて採点する（キャンペーンメール用など）
+@router.post("/recommend/batch", response_model=List[List[GiftResponse]])
+def recommend_gift_batch(batch: BatchTagQuery = Body(...), db: Session = Depends(get_read_db)):
+    gift_tag_index.ensure_built(db)
+    results = gift_tag_matrix.recommend_many([q.tags for q in batch.queries], batch.top_k)
+
+    gift_ids = {gift_id for ids in results for gift_id in ids}
+    gifts = {}
+    if gift_ids:
+        gifts = {g.id: gift_json.encode(g) for g in db.query(Gift).filter(Gift.id.in_(gift_ids)).all()}
+    return json_response(compose([[gifts[gift_id] for gift_id in ids if gift_id in gifts] for ids in results]))
+
+@router.post("/create", response_model=GiftResponse)
 def create_gift(gift: GiftCreate, db: Session = Depends(get_db)):
     db_gift = Gift(**gift.dict())
     db.add(db_gift)
     db.commit()
     db.refresh(db_gift)
+    gift_tag_index.add(db_gift.id, db_gift.tags)
     return db_gift
 
 @router.delete("/gift/{gift_id}", response_model=dict)
@@ -50,6 +68,8 @@ def delete_gift(gift_id: str, db: Session = Depends(get_db)):
     
     db.delete(gift)
     db.commit()
+    gift_tag_index.remove(gift_id)
+    gift_json.invalidate(gift_id)
     return {"message": f"ギフト '{gift_id}' を削除しました"}
 
 
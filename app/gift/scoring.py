@@ -0,0 +1,105 @@
+# app/gift/scoring.py
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from app.gift.tag_index import GiftTagIndex, gift_tag_index
+
+# 出現回数行列（ギフト数 × タグの種類数、int32）の要素数の上限。既定の 16M 要素で 64MiB
+# 超えるとき（タグの種類が多すぎるとき）は行列を作らず、クエリごとに GiftTagIndex.recommend で採点する
+# クエリ側は chunk_size 件ずつ処理するので、使うメモリはバッチの件数（最大10000）によらず
+# chunk_size × (タグの種類数 + ギフト数) 程度に収まる
+GIFT_MATRIX_MAX_CELLS = int(os.getenv("GIFT_MATRIX_MAX_CELLS", str(16 * 1024 * 1024)))
+
+
+# ギフト×タグの出現回数行列を使って、複数のタグクエリをまとめて採点する
+# score[クエリ, ギフト] = Σ_t クエリ側の一致数[t] × ギフト側の出現回数[t] は calculate_match_score と同値
+class GiftTagMatrix:
+    def __init__(self, index: GiftTagIndex, chunk_size: int = 256, max_cells: int = GIFT_MATRIX_MAX_CELLS):
+        self.index = index
+        self.chunk_size = chunk_size
+        self.max_cells = max_cells
+        self._lock = threading.Lock()
+        self._version = None
+        self.gift_ids: List[str] = []
+        self.tag_columns: Dict[str, int] = {}
+        self.incidence: Optional[np.ndarray] = np.zeros((0, 0), dtype=np.int32)  # ギフト × タグ（上限超えは None）
+        self.tag_counts = np.zeros(0, dtype=np.int32)
+        self.has_tags = np.zeros(0, dtype=bool)
+
+    def refresh(self):
+        """インデックスが更新されていれば行列を作り直す"""
+        with self._lock:
+            if self._version == self.index.version:
+                return
+            version, gifts = self.index.snapshot()
+
+            tag_columns: Dict[str, int] = {}
+            for _, tags in gifts:
+                for tag in tags:
+                    tag_columns.setdefault(tag, len(tag_columns))
+
+            incidence = None
+            if len(gifts) * len(tag_columns) <= self.max_cells:
+                incidence = np.zeros((len(gifts), len(tag_columns)), dtype=np.int32)
+                for row, (_, tags) in enumerate(gifts):
+                    for tag in tags:
+                        incidence[row, tag_columns[tag]] += 1
+
+            self.gift_ids = [gift_id for gift_id, _ in gifts]
+            self.tag_columns = tag_columns
+            self.incidence = incidence
+            self.tag_counts = np.array([len(tags) for _, tags in gifts], dtype=np.int32)
+            self.has_tags = self.tag_counts > 0
+            self._version = version
+
+    def recommend_many(self, queries: List[List[str]], limit: int = 2) -> List[List[str]]:
+        """各クエリについて recommend_gift と同じ順序で上位 limit 件のギフトIDを返す"""
+        self.refresh()
+        with self._lock:
+            gift_ids = self.gift_ids
+            tag_columns = self.tag_columns
+            incidence = self.incidence
+            tag_counts = self.tag_counts
+            has_tags = self.has_tags
+
+        if not gift_ids:
+            return [[] for _ in queries]
+        if incidence is None:
+            return [self.index.recommend(tags, limit) for tags in queries]
+
+        # 同じタグは何度も出てくるので、一致するタグ列はまとめて求めておく
+        matched_columns: Dict[str, List[int]] = {}
+        for tags in queries:
+            for q in tags:
+                if q not in matched_columns:
+                    matched: Set[str] = self.index.matching_tags(q)
+                    matched_columns[q] = [tag_columns[t] for t in matched if t in tag_columns]
+
+        results: List[List[str]] = []
+        any_tags = bool(has_tags.any())
+        for start in range(0, len(queries), self.chunk_size):
+            chunk = queries[start:start + self.chunk_size]
+            query_matrix = np.zeros((len(chunk), len(tag_columns)), dtype=np.int32)
+            for row, tags in enumerate(chunk):
+                for q in tags:
+                    query_matrix[row, matched_columns[q]] += 1
+
+            scores = query_matrix @ incidence.T  # クエリ × ギフト
+
+            for row, tags in enumerate(chunk):
+                row_scores = scores[row]
+                if not any_tags or not row_scores[has_tags].any():
+                    # 一致度がゼロなら、タグ数が近いギフトを返す
+                    order = np.argsort(np.abs(tag_counts - len(tags)), kind="stable")[:limit]
+                else:
+                    masked = np.where(has_tags, row_scores, -1)
+                    order = np.argsort(-masked, kind="stable")
+                    order = order[has_tags[order]][:limit]
+                results.append([gift_ids[i] for i in order])
+        return results
+
+
+gift_tag_matrix = GiftTagMatrix(gift_tag_index)
@@ -0,0 +1,180 @@
+# app/gift/tag_index.py
+import heapq
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.auth.utils import calculate_match_score
+from app.models import Gift
+
+
+# タグ文字列 → ギフトID の転置インデックス
+# calculate_match_score の「q in g or g in q」と同じ判定を、全ギフトを走査せずに行う
+class GiftTagIndex:
+    def __init__(self, gram_size: int = 2):
+        self.gram_size = gram_size
+        self.built = False
+        self.version = 0
+        self._lock = threading.RLock()
+        self._gifts: Dict[str, List[str]] = {}  # ギフトID → タグ（DBの並び順を保持）
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        self._tag_gifts: Dict[str, Set[str]] = defaultdict(set)  # タグ → ギフトID
+        self._gram_tags: Dict[str, Set[str]] = defaultdict(set)  # n-gram → タグ
+        self._max_tag_len = 0
+
+    def __len__(self) -> int:
+        return len(self._gifts)
+
+    def _grams(self, text: str) -> Set[str]:
+        # 長さ1〜gram_sizeの部分文字列をすべて登録しておくと、短いクエリも正確に引ける
+        return {
+            text[i:i + n]
+            for n in range(1, self.gram_size + 1)
+            for i in range(len(text) - n + 1)
+        }
+
+    def _rebuild(self, rows):
+        with self._lock:
+            self._gifts.clear()
+            self._seq.clear()
+            self._tag_gifts.clear()
+            self._gram_tags.clear()
+            self._next_seq = 0
+            self._max_tag_len = 0
+            for gift_id, tags in rows:
+                self._add(gift_id, tags)
+            self.built = True
+            self.version += 1
+
+    def build(self, db: Session):
+        self._rebuild(db.query(Gift.id, Gift.tags).all())
+
+    def ensure_built(self, db: Session):
+        if not self.built:
+            self.build(db)
+
+    async def ensure_built_async(self, db: AsyncSession):
+        if not self.built:
+            result = await db.execute(select(Gift.id, Gift.tags))
+            self._rebuild(result.all())
+
+    def _add(self, gift_id: str, tags: Optional[List[str]]):
+        tags = list(tags) if tags else []
+        self._gifts[gift_id] = tags
+        self._seq[gift_id] = self._next_seq
+        self._next_seq += 1
+        for tag in tags:
+            if not self._tag_gifts[tag]:
+                for gram in self._grams(tag):
+                    self._gram_tags[gram].add(tag)
+                self._max_tag_len = max(self._max_tag_len, len(tag))
+            self._tag_gifts[tag].add(gift_id)
+
+    def add(self, gift_id: str, tags: Optional[List[str]]):
+        with self._lock:
+            if gift_id in self._gifts:
+                self._remove(gift_id)
+            self._add(gift_id, tags)
+            self.version += 1
+
+    def _remove(self, gift_id: str):
+        tags = self._gifts.pop(gift_id, None)
+        self._seq.pop(gift_id, None)
+        for tag in tags or []:
+            holders = self._tag_gifts.get(tag)
+            if holders is None:
+                continue
+            holders.discard(gift_id)
+            if not holders:
+                del self._tag_gifts[tag]
+                for gram in self._grams(tag):
+                    self._gram_tags[gram].discard(tag)
+                    if not self._gram_tags[gram]:
+                        del self._gram_tags[gram]
+
+    def remove(self, gift_id: str):
+        with self._lock:
+            self._remove(gift_id)
+            self.version += 1
+
+    def snapshot(self):
+        """(version, [(ギフトID, タグ), ...]) をDBの並び順で返す"""
+        with self._lock:
+            return self.version, [(gift_id, list(tags)) for gift_id, tags in self._gifts.items()]
+
+    def matching_tags(self, query_tag: str) -> Set[str]:
+        """クエリタグと部分一致（q in g または g in q）するギフトタグの集合"""
+        with self._lock:
+            if query_tag == "":
+                return set(self._tag_gifts)
+
+            # q in g：n-gramの積集合で候補を絞ってから確認する
+            if len(query_tag) <= self.gram_size:
+                matched = set(self._gram_tags.get(query_tag, ()))
+            else:
+                grams = [query_tag[i:i + self.gram_size]
+                         for i in range(len(query_tag) - self.gram_size + 1)]
+                postings = sorted((self._gram_tags.get(g, set()) for g in grams), key=len)
+                candidates = set.intersection(*postings) if postings else set()
+                matched = {tag for tag in candidates if query_tag in tag}
+
+            # g in q：クエリの部分文字列のうち、登録済みのタグと完全一致するもの
+            if "" in self._tag_gifts:
+                matched.add("")
+            limit = min(len(query_tag), self._max_tag_len)
+            for i in range(len(query_tag)):
+                for j in range(i + 1, min(len(query_tag), i + limit) + 1):
+                    sub = query_tag[i:j]
+                    if sub in self._tag_gifts:
+                        matched.add(sub)
+            return matched
+
+    def candidates(self, query_tags: Iterable[str]) -> Set[str]:
+        with self._lock:
+            gift_ids: Set[str] = set()
+            for q in set(query_tags):
+                for tag in self.matching_tags(q):
+                    gift_ids |= self._tag_gifts[tag]
+            return gift_ids
+
+    def recommend(self, query_tags: List[str], limit: int = 2) -> List[str]:
+        """gift_api.recommend_gift の旧実装と同じ順序でギフトIDを返す"""
+        with self._lock:
+            scored = []
+            for gift_id in self.candidates(query_tags):
+                tags = self._gifts[gift_id]
+                if not tags:
+                    continue
+                score = calculate_match_score(tags, query_tags)
+                if score:
+                    scored.append((-score, self._seq[gift_id], gift_id))
+
+            # 一致度がゼロなら、タグ数が近いギフトを返す
+            if not scored:
+                fallback = heapq.nsmallest(
+                    limit,
+                    self._gifts.items(),
+                    key=lambda item: abs(len(item[1]) - len(query_tags)),
+                )
+                return [gift_id for gift_id, _ in fallback]
+
+            scored.sort()
+            result = [gift_id for _, _, gift_id in scored[:limit]]
+
+            # スコア0のギフトも旧実装ではDB順で後ろに並んでいたので、足りない分を補う
+            if len(result) < limit:
+                hit = {gift_id for _, _, gift_id in scored}
+                for gift_id, tags in self._gifts.items():
+                    if len(result) >= limit:
+                        break
+                    if tags and gift_id not in hit:
+                        result.append(gift_id)
+            return result
+
+
+gift_tag_index = GiftTagIndex()
@@ -0,0 +1,163 @@
+# app/lifecycle.py
+"""起動処理（スキーマの確認 → ウォームアップ）と /ready 用の状態
+
+- スキーマ: Alembic の alembic_version が最新（head）なら create_all を省略する
+- ウォームアップ: 商品カタログ・ギフトのインデックス・よく使うSQLのコンパイル結果・
+  bcrypt のワーカープロセスを先に用意し、最初のリクエストに負担させない
+- 各フェーズの所要時間をログに出し、/ready で返す
+"""
+import ast
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import inspect, text
+
+from app.auth.cart_items import get_cart_id, get_cart_lines
+from app.auth.hash_pool import hash_pool
+from app.auth.order_history import list_orders
+from app.database import AsyncReadSessionLocal, AsyncSessionLocal, Base, ReadSessionLocal
+from app.gift.scoring import gift_tag_matrix
+from app.gift.tag_index import gift_tag_index
+from app.models import User
+from app.products.catalog_cache import catalog_cache
+from app.products.facet_index import facet_index
+
+logger = logging.getLogger(__name__)
+
+# auto: Alembic が最新なら create_all を省略 / 1: 常に create_all / 0: 何もしない（マイグレーションに任せる）
+STARTUP_CREATE_ALL = os.getenv("STARTUP_CREATE_ALL", "auto")
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+ALEMBIC_VERSIONS_DIR = Path(__file__).resolve().parent.parent / "alembic" / "versions"
+
+
+class StartupState:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.schema: Optional[str] = None  # created / current / skipped
+        self.error: Optional[str] = None
+        self._ready_event = asyncio.Event()
+
+    def reset(self):
+        self.phases = {}
+        self.ready = False
+        self.schema = None
+        self.error = None
+        self._ready_event = asyncio.Event()
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(seconds * 1000, 1)
+        logger.info(f"起動フェーズ {name}: {seconds * 1000:.1f}ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self):
+        self.ready = True
+        self._ready_event.set()
+
+    async def wait_ready(self):
+        await self._ready_event.wait()
+
+    def report(self) -> dict:
+        return {"ready": self.ready, "schema": self.schema, "phases_ms": dict(self.phases), "error": self.error}
+
+
+startup_state = StartupState()
+
+
+def _assigned_revisions(path: Path) -> tuple:
+    # import せずに revision / down_revision の代入だけ読む（alembic 本体の import は100ms以上かかるため）
+    values = {}
+    for node in ast.parse(path.read_text(encoding="utf-8")).body:
+        if isinstance(node, ast.AnnAssign):
+            target, value = node.target, node.value
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target, value = node.targets[0], node.value
+        else:
+            continue
+        if isinstance(target, ast.Name) and target.id in ("revision", "down_revision") and value is not None:
+            values[target.id] = ast.literal_eval(value)
+    return values.get("revision"), values.get("down_revision")
+
+
+def alembic_heads(versions_dir: Path = ALEMBIC_VERSIONS_DIR) -> Set[str]:
+    """マイグレーションの head（他のどのリビジョンの down_revision にもなっていないもの）"""
+    revisions, parents = set(), set()
+    for path in versions_dir.glob("*.py"):
+        revision, down_revision = _assigned_revisions(path)
+        if revision is None:
+            continue
+        revisions.add(revision)
+        if isinstance(down_revision, str):
+            parents.add(down_revision)
+        elif down_revision:
+            parents.update(down_revision)
+    return revisions - parents
+
+
+def current_revisions(engine) -> Set[str]:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("alembic_version"):
+            return set()
+        return {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+
+
+def ensure_schema(engine) -> str:
+    if STARTUP_CREATE_ALL == "0":
+        return "skipped"
+    if STARTUP_CREATE_ALL == "auto":
+        heads = alembic_heads()
+        if heads and current_revisions(engine) == heads:
+            return "current"
+    Base.metadata.create_all(bind=engine)
+    return "created"
+
+
+def _warm_catalog():
+    with ReadSessionLocal() as db:
+        catalog_cache.get_list(db)
+        facet_index.ensure_built(db)
+        gift_tag_index.build(db)
+    gift_tag_matrix.refresh()
+
+
+async def _prime_statements():
+    # 存在しないID で主要な読み取りSQLを1回ずつ実行し、エンジンごとのコンパイル済みSQLキャッシュと接続プールを温める
+    factories = [AsyncReadSessionLocal]
+    if AsyncSessionLocal is not AsyncReadSessionLocal:
+        factories.append(AsyncSessionLocal)
+    for factory in factories:
+        async with factory() as db:
+            await db.get(User, 0)
+            await get_cart_id(db, 0)
+            await get_cart_lines(db, 0)
+            await list_orders(db, 0, None, 20, False)
+
+
+async def warm_up(state: StartupState = startup_state):
+    """キャッシュ等を読み込んでから ready にする（失敗しても各キャッシュは初回アクセス時に読み込まれるので ready にする）"""
+    started = time.perf_counter()
+    try:
+        with state.phase("warmup_catalog"):
+            await run_in_threadpool(_warm_catalog)
+        with state.phase("warmup_statements"):
+            await _prime_statements()
+        with state.phase("warmup_hash_pool"):
+            await hash_pool.warm_up()
+    except Exception as e:
+        logger.exception("ウォームアップに失敗しました")
+        state.error = str(e)
+    state.record("warmup", time.perf_counter() - started)
+    state.mark_ready()
@@ -1,22 +1,71 @@
 # app/main.py
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from . import models
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from . import crud, schemas
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from app.auth import routes, utils
-from app.database import Base, engine
+from app.database import engine, async_engine, read_engine, async_read_engine, writer_engine
+from app.metrics import MetricsMiddleware, metrics, pool_gauges
+from app.compression import CompressionMiddleware, compression_stats
+from app.admission import AdmissionMiddleware, admission_controller, auth_rate_limiter
+from app.query_diagnostics import QueryDiagnosticsMiddleware, QUERY_DIAGNOSTICS
+from app.auth.token_cache import claims_cache, user_cache
+from app.products.catalog_cache import catalog_cache, product_json
 from app.auth.routes import router as auth_router
-from fastapi.middleware.cors import CORSMiddleware
-from app.gift.gift_api import router as gift_router
+from app.gift.gift_api import gift_json, router as gift_router
+from app.gift.tag_index import gift_tag_index
+from app.auth.hash_pool import hash_pool
+from app.auth.email_outbox import outbox_worker, OUTBOX_WORKER_ENABLED
+from app.auth.write_coalescer import write_coalescer, WRITE_COALESCER_ENABLED
 from app.auth.router_cart import router as cart_router
 from app.products.router_products import router as products_router
-
-
-# データベースを作成
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
+from app.analytics.router_analytics import router as analytics_router
+from app.lifecycle import STARTUP_WARMUP, ensure_schema, startup_state, warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_state.reset()
+    startup_state.record("import", _import_ready - _import_started)
+    # データベースを作成（Alembic で最新になっていれば省略）
+    with startup_state.phase("schema"):
+        startup_state.schema = await run_in_threadpool(ensure_schema, engine)
+
+    # 送信待ちメールのワーカーと、カート・購入の書き込みをまとめてコミットするタスクを起動
+    if OUTBOX_WORKER_ENABLED:
+        outbox_worker.start()
+    if WRITE_COALESCER_ENABLED:
+        write_coalescer.start()
+
+    # キャッシュの読み込みはリクエストの受付と並行して行い、終わったら /ready を200にする
+    if STARTUP_WARMUP:
+        warmup = asyncio.get_running_loop().create_task(warm_up(startup_state), name="warm-up")
+    else:
+        warmup = None
+        startup_state.mark_ready()
+    try:
+        yield
+    finally:
+        if warmup is not None and not warmup.done():
+            warmup.cancel()
+            try:
+                await warmup
+            except asyncio.CancelledError:
+                pass
+        await write_coalescer.stop()
+        hash_pool.shutdown()
+        outbox_worker.stop()
+
+
+# レスポンスは orjson でシリアライズする（標準の json より速い）
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 class User(BaseModel):
@@ -26,6 +75,10 @@ class User(BaseModel):
     address: str
     password: str
 
+# 優先度クラスごとの同時実行数の制限（checkout > cart > browse > auth > admin）と、ログイン・登録の回数制限
+# 一番内側に置くので、503 / 429 にもCORSヘッダーが付き、MetricsMiddleware にも記録される
+app.add_middleware(AdmissionMiddleware)
+
 # CORS ミドルウェアの設定
 app.add_middleware(
     CORSMiddleware,
@@ -35,11 +88,62 @@ app.add_middleware(
     allow_headers=["*"],  # すべてのヘッダーを許可
 )
 
+# gzip / Brotli 圧縮（しきい値未満は圧縮しない。MetricsMiddleware の内側なので圧縮時間も処理時間に含まれる）
+app.add_middleware(CompressionMiddleware)
+
+# ルートごとの処理時間・ステータス・SQL件数を記録（/metrics で出力）
+app.add_middleware(MetricsMiddleware)
+
+# 診断モード: リクエストごとのSQLを記録し、N+1の疑いと @query_budget の超過をログに出す
+if QUERY_DIAGNOSTICS:
+    app.add_middleware(QueryDiagnosticsMiddleware)
+
+
+def collect_gauges():
+    for name, db_engine in (("write", engine), ("async_write", async_engine), ("read", read_engine), ("async_read", async_read_engine), ("writer", writer_engine)):
+        if db_engine is not None:
+            yield from pool_gauges(name, db_engine)
+    for name, cache in (("token", claims_cache), ("user", user_cache), ("product_json", product_json), ("gift_json", gift_json)):
+        stats = cache.stats()
+        for key in ("size", "hits", "misses"):
+            yield f"cache_{key}", f"LRU cache {key}.", {"cache": name}, stats[key]
+    yield "catalog_cache_loaded", "1 if the product catalog is cached.", {}, catalog_cache.loaded
+    yield "gift_tag_index_gifts", "Gifts in the recommend tag index.", {}, len(gift_tag_index)
+    pool = hash_pool.stats()
+    yield "hash_pool_in_flight", "Password hashes queued or running.", {}, pool["in_flight"]
+    yield "hash_pool_rejected", "Password hashes rejected with 503.", {}, pool["rejected"]
+    writer = write_coalescer.stats()
+    yield "write_coalescer_queued", "Writes waiting for the group-commit writer.", {}, writer["queued"]
+    yield "write_coalescer_batches", "Batches committed by the group-commit writer.", {}, writer["batches"]
+
+
+metrics.add_gauge_collector(collect_gauges)
+metrics.add_gauge_collector(compression_stats.gauges)
+metrics.add_counter_collector(compression_stats.counters)
+metrics.add_gauge_collector(admission_controller.gauges)
+metrics.add_counter_collector(admission_controller.counters)
+metrics.add_counter_collector(auth_rate_limiter.counters)
+
 @app.get("/")
 def read_root():
     return {"message": "AmaironoHi backend is alive"}
 
 
+# ウォームアップが終わるまでは503（ロードバランサーはこれを見て振り分けを始める）
+@app.get("/ready")
+def read_ready():
+    report = startup_state.report()
+    if not startup_state.ready:
+        return JSONResponse(status_code=503, content=report)
+    return report
+
+
+# Prometheus 形式のメトリクス
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/register")
 async def register(user: User):
     # 仮処理：登録内容を表示（実際はDB保存など）
@@ -61,3 +165,7 @@ app.include_router(gift_router, prefix="/gift")
 app.include_router(cart_router, prefix="/purchase")
 
 app.include_router(products_router)
+
+app.include_router(analytics_router, prefix="/analytics")
+
+_import_ready = time.perf_counter()
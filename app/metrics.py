@@ -0,0 +1,256 @@
+# app/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+# リクエストの処理時間（秒）とSQL件数のバケット
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    """1リクエスト中に実行したSQLの件数と時間"""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# ミドルウェアがリクエストごとに設定し、SQLのフックが加算する
+# （スレッドプール・greenlet へはコンテキストごとコピーされるので同じオブジェクトを参照できる）
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+        self.statuses: Counter = Counter()
+
+
+GaugeSample = Tuple[str, str, Dict[str, str], float]  # (名前, 説明, ラベル, 値)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], RouteStats] = {}
+        self._db_queries = 0
+        self._db_seconds = 0.0
+        self._db_queries_outside_request = 0
+        self._collectors: List[Tuple[str, Callable[[], Iterable[GaugeSample]]]] = []
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            route_stats = self._routes.get((method, route))
+            if route_stats is None:
+                route_stats = self._routes[(method, route)] = RouteStats()
+            route_stats.latency.observe(seconds)
+            route_stats.queries.observe(stats.queries)
+            route_stats.db_seconds += stats.db_seconds
+            route_stats.statuses[status] += 1
+
+    def observe_query(self, seconds: float, in_request: bool):
+        with self._lock:
+            self._db_queries += 1
+            self._db_seconds += seconds
+            if not in_request:
+                self._db_queries_outside_request += 1
+
+    def add_gauge_collector(self, collector: Callable[[], Iterable[GaugeSample]]):
+        self._collectors.append(("gauge", collector))
+
+    def add_counter_collector(self, collector: Callable[[], Iterable[GaugeSample]]):
+        """値が増えるだけのもの（各コンポーネントが自分で数えている累計）"""
+        self._collectors.append(("counter", collector))
+
+    def _histogram_lines(self, name: str, labels: Dict[str, str], histogram: Histogram) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return lines
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式（version 0.0.4）で出力する"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                "# HELP http_request_duration_seconds Request latency by route.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), stats in routes:
+                lines += self._histogram_lines("http_request_duration_seconds", {"method": method, "route": route}, stats.latency)
+
+            lines += ["# HELP http_requests_total Requests by route and status.", "# TYPE http_requests_total counter"]
+            for (method, route), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f"http_requests_total{_labels({'method': method, 'route': route, 'status': str(status)})} {count}")
+
+            lines += [
+                "# HELP http_request_db_queries SQL statements executed per request.",
+                "# TYPE http_request_db_queries histogram",
+            ]
+            for (method, route), stats in routes:
+                lines += self._histogram_lines("http_request_db_queries", {"method": method, "route": route}, stats.queries)
+
+            lines += [
+                "# HELP http_request_db_seconds_total Time spent in SQL by route.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), stats in routes:
+                lines.append(f"http_request_db_seconds_total{_labels({'method': method, 'route': route})} {_number(stats.db_seconds)}")
+
+            lines += [
+                "# HELP db_queries_total SQL statements executed (including background workers).",
+                "# TYPE db_queries_total counter",
+                f"db_queries_total {self._db_queries}",
+                "# HELP db_query_seconds_total Time spent in SQL.",
+                "# TYPE db_query_seconds_total counter",
+                f"db_query_seconds_total {_number(self._db_seconds)}",
+                "# HELP db_queries_outside_request_total SQL statements executed outside an HTTP request.",
+                "# TYPE db_queries_outside_request_total counter",
+                f"db_queries_outside_request_total {self._db_queries_outside_request}",
+            ]
+            collectors = list(self._collectors)
+
+        # ゲージ・カウンターはロックの外で集める（各コンポーネントが自分のロックを取るため）
+        # 同じ名前の行は1か所にまとめて出す（テキスト形式の決まり）
+        families: Dict[str, List[str]] = {}
+        for kind, collector in collectors:
+            for name, description, labels, value in collector():
+                if name not in families:
+                    families[name] = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+                families[name].append(f"{name}{_labels(labels)} {_number(value)}")
+        for family in families.values():
+            lines += family
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def instrument_engine(engine):
+    """SQLの実行時間を、実行中のリクエストと全体の集計に加算するフックを付ける"""
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        seconds = time.perf_counter() - started
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+        metrics.observe_query(seconds, stats is not None)
+
+    @event.listens_for(target, "handle_error")
+    def handle_error(exception_context):
+        # 失敗したSQLは after_cursor_execute が呼ばれないので積んだ開始時刻を捨てる
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+    return engine
+
+
+def pool_gauges(name: str, engine) -> Iterable[GaugeSample]:
+    pool = getattr(engine, "sync_engine", engine).pool
+    labels = {"engine": name}
+    # StaticPool などは size() を持たないので取れる値だけ出す
+    for metric, attr, description in (
+        ("db_pool_size", "size", "Configured pool size."),
+        ("db_pool_checked_out", "checkedout", "Connections currently checked out."),
+        ("db_pool_checked_in", "checkedin", "Idle connections in the pool."),
+        ("db_pool_overflow", "overflow", "Connections opened beyond pool_size."),
+    ):
+        method = getattr(pool, attr, None)
+        if method is not None:
+            yield metric, description, labels, method()
+
+
+class MetricsMiddleware:
+    """ルート（パスのテンプレート）ごとの処理時間・ステータス・SQL件数を記録するASGIミドルウェア"""
+
+    def __init__(self, app, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_stats.reset(token)
+            # FastAPI はマッチしたルートを scope["route"] に入れる（パスパラメータを含まないので件数が増えない）
+            route = scope.get("route")
+            self.registry.observe_request(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+                time.perf_counter() - started,
+                stats,
+            )
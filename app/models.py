@@ -1,14 +1,12 @@
 # app/models.py
 from datetime import datetime
 from pydantic import BaseModel
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import JSON, Column, Date, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from app.database import Base
 from sqlalchemy.orm import relationship
 from sqlalchemy import Float
 from sqlalchemy.types import TypeDecorator, TEXT
 import json
-from sqlalchemy.orm import declarative_base
-Base = declarative_base()
 
 class JsonEncodedList(TypeDecorator):
     impl = TEXT
@@ -36,12 +34,28 @@ class Cart(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
-    items = Column(JSON)  # 例：{"item_id": 2, "quantity": 3}
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # 購入時の二重処理防止
 
     user = relationship("User", back_populates="cart")
 
 
+# カートの明細（1商品1行、数量は INSERT ... ON CONFLICT で加算）
+class CartItem(Base):
+    __tablename__ = "cart_items"
+
+    id = Column(Integer, primary_key=True)
+    cart_id = Column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(String, ForeignKey("products.id"), nullable=False)
+    name = Column(String)
+    price = Column(Integer)
+    quantity = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("cart_id", "product_id", name="uq_cart_items_cart_id_product_id"),
+    )
+
+
 class Product(Base):
     __tablename__ = "products"
     id = Column(String, primary_key=True)
@@ -52,6 +66,12 @@ class Product(Base):
     image = Column(String)
     tags = Column(JSON) 
 
+    # キーセットページング用（絞り込み + id順）
+    __table_args__ = (
+        Index("ix_products_category_id", "category", "id"),
+        Index("ix_products_price_id", "price", "id"),
+    )
+
 class Gift(Base):
     __tablename__ = "gifts"
 
@@ -87,6 +107,65 @@ class Order(Base):
     address = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # 注文履歴（ユーザーごとに新しい順）のキーセットページング用
+    # created_at 単独は集計の作り直し（1日ずつ）用
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at", user_id, created_at.desc(), id.desc()),
+        Index("ix_orders_created_at", created_at),
+    )
+
+# 送信待ちメール（注文と同じトランザクションで書き込み、バックグラウンドで送信）
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / sending / sent / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+# リフレッシュトークン（トークン本体は保存せず SHA-256 だけを持つ。使うたびに同じ family の新しいトークンへ交換する）
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    family_id = Column(String(32), nullable=False, index=True)  # ログイン1回ごとの系列
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    used_at = Column(DateTime)  # 新しいトークンへ交換した時刻（交換済みのトークンがまた来たら再利用）
+    revoked_at = Column(DateTime)
+
+# 売上の集計テーブル（注文と同じトランザクションで加算し、app.analytics.backfill で作り直せる）
+class DailyRevenue(Base):
+    __tablename__ = "daily_revenue"
+    day = Column(Date, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)  # 送料込みの合計
+
+class ProductDailySales(Base):
+    __tablename__ = "product_daily_sales"
+    day = Column(Date, primary_key=True)
+    product_id = Column(String, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+
+class PaymentMethodDaily(Base):
+    __tablename__ = "payment_method_daily"
+    day = Column(Date, primary_key=True)
+    payment_method = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+
 class PurchaseRequest(BaseModel):
     payment_method: str
     address: str
@@ -0,0 +1,140 @@
+# app/products/catalog_cache.py
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.compression import choose_encoding, compression_stats, precompress
+from app.models import Product
+from app.schemas import ProductResponse
+from app.serialization import RowJSONCache, json_response
+
+# ブラウザには毎回ETagで再検証してもらう（変更がなければ304で本文なし）
+CACHE_CONTROL = "public, no-cache"
+# 別プロセス（python -m app.products.register_bulk など）の書き込みは invalidate() が届かないので、
+# この秒数が経ったら読み直す（0 なら期限なし）
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+
+
+class CachedPayload(NamedTuple):
+    body: bytes
+    etag: str
+    encoded: Dict[str, bytes]  # 圧縮方式 → 保存時に圧縮した本文（しきい値未満なら空）
+
+
+def _payload(body: bytes) -> CachedPayload:
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    return CachedPayload(body, etag, precompress(body))
+
+
+def _variant_etag(etag: str, encoding: str) -> str:
+    # 圧縮した本文は別の表現なので、ETag も方式ごとに変える
+    return f'{etag[:-1]}-{encoding}"'
+
+
+# 商品1行ごとのJSON（カタログの再読み込みや一覧・エクスポートで、変わっていない行は再エンコードしない）
+product_json = RowJSONCache(Product, ProductResponse)
+
+
+class _Snapshot(NamedTuple):
+    listing: CachedPayload
+    items: Dict[str, CachedPayload]
+    expires_at: float  # time.monotonic()
+
+
+# 商品カタログのリードスルーキャッシュ（プロセス内）
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        # 一覧と商品ごとの本文は1つのタプルで差し替える（別々に読むと invalidate() の間に食い違う）
+        self._snapshot: Optional[_Snapshot] = None
+
+    @property
+    def generation(self) -> int:
+        """invalidate() のたびに増える（facet_index などカタログから作る索引の作り直しの目安）"""
+        return self._generation
+
+    @property
+    def loaded(self) -> bool:
+        return self._current() is not None
+
+    def _current(self) -> Optional[_Snapshot]:
+        snapshot = self._snapshot
+        if snapshot is None or (self.ttl > 0 and snapshot.expires_at <= time.monotonic()):
+            return None
+        return snapshot
+
+    def _store(self, generation: int, rows) -> _Snapshot:
+        encoded = [(p.id, product_json.encode(p)) for p in rows]
+        listing = _payload(b"[" + b",".join(body for _, body in encoded) + b"]")
+        items = {product_id: _payload(body) for product_id, body in encoded}
+        snapshot = _Snapshot(listing, items, time.monotonic() + self.ttl)
+        with self._lock:
+            # 読み込み中に invalidate された場合は古いデータを保存しない
+            if generation == self._generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    def _load(self, db: Session) -> _Snapshot:
+        generation = self._generation
+        return self._store(generation, db.query(Product).all())
+
+    async def _load_async(self, db: AsyncSession) -> _Snapshot:
+        generation = self._generation
+        result = await db.execute(select(Product))
+        return self._store(generation, result.scalars().all())
+
+    def get_list(self, db: Session) -> CachedPayload:
+        return (self._current() or self._load(db)).listing
+
+    def get_item(self, db: Session, product_id: str) -> Optional[CachedPayload]:
+        return (self._current() or self._load(db)).items.get(product_id)
+
+    async def get_list_async(self, db: AsyncSession) -> CachedPayload:
+        return (self._current() or await self._load_async(db)).listing
+
+    async def get_item_async(self, db: AsyncSession, product_id: str) -> Optional[CachedPayload]:
+        return (self._current() or await self._load_async(db)).items.get(product_id)
+
+    def invalidate(self) -> int:
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+            return self._generation
+
+
+catalog_cache = CatalogCache()
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def cached_json_response(request: Request, payload: CachedPayload) -> Response:
+    encoding = choose_encoding(request.headers.get("accept-encoding")) if payload.encoded else None
+    body = payload.encoded.get(encoding) if encoding else None
+    etag = payload.etag if body is None else _variant_etag(payload.etag, encoding)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        return json_response(payload.body, headers=headers)
+    # 保存済みの圧縮本文をそのまま送る（CompressionMiddleware は Content-Encoding 付きのレスポンスを素通しする）
+    compression_stats.observe(encoding, "cached", len(payload.body), len(body))
+    return json_response(body, headers={**headers, "Content-Encoding": encoding})
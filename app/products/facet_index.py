@@ -0,0 +1,121 @@
+# app/products/facet_index.py
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import Product
+from app.products.catalog_cache import CatalogCache, catalog_cache
+
+
+def split_category(category: Optional[str]) -> List[str]:
+    """「水色 / ピアス / イヤリング」→ ["水色", "ピアス", "イヤリング"]"""
+    if not category:
+        return []
+    return [facet.strip() for facet in category.split("/") if facet.strip()]
+
+
+# カテゴリ文字列を分解したファセットごとのビットマップ（int）索引
+# catalog_cache と同じ期限（CATALOG_CACHE_TTL）で読み直し、catalog_cache の世代が変わったら作り直す
+# （別プロセスの書き込みは期限切れで、同じプロセスの書き込みは add() か世代の変化で反映される）
+class FacetIndex:
+    def __init__(self, catalog: CatalogCache = catalog_cache):
+        self.catalog = catalog
+        self.built = False
+        self._generation: Optional[int] = None
+        self._expires_at = 0.0  # time.monotonic()
+        self._lock = threading.Lock()
+        self._ids: List[str] = []  # ビット位置 → 商品ID
+        self._positions: Dict[str, int] = {}
+        self._bitmaps: Dict[str, int] = {}
+        self._all = 0
+
+    def build(self, db: Session):
+        # 読み込み中に invalidate されたら、古い世代のままにして次回作り直す
+        generation = self.catalog.generation
+        rows = db.query(Product.id, Product.category).order_by(Product.id).all()
+        with self._lock:
+            self._ids = []
+            self._positions = {}
+            self._bitmaps = {}
+            self._all = 0
+            self._add(rows)
+            self.built = True
+            self._generation = generation
+            self._expires_at = time.monotonic() + self.catalog.ttl
+
+    @property
+    def stale(self) -> bool:
+        if not self.built or self._generation != self.catalog.generation:
+            return True
+        return self.catalog.ttl > 0 and self._expires_at <= time.monotonic()
+
+    def ensure_built(self, db: Session):
+        if self.stale:
+            self.build(db)
+
+    def _add(self, rows: Iterable[Tuple[str, Optional[str]]]):
+        for product_id, category in rows:
+            position = self._positions.get(product_id)
+            if position is None:
+                position = len(self._ids)
+                self._ids.append(product_id)
+                self._positions[product_id] = position
+            else:
+                # 既存の商品はいったん全ファセットから外す
+                mask = ~(1 << position)
+                for facet in self._bitmaps:
+                    self._bitmaps[facet] &= mask
+            bit = 1 << position
+            self._all |= bit
+            for facet in split_category(category):
+                self._bitmaps[facet] = self._bitmaps.get(facet, 0) | bit
+
+    def add(self, rows: Iterable[Tuple[str, Optional[str]]], generation: Optional[int] = None):
+        """一括登録された商品をその場で索引に追加する（未構築なら何もしない）
+
+        generation はこの登録で進んだ catalog_cache の世代。索引がその1つ前の世代なら、
+        ほかの変更を取りこぼしていないので作り直さずにその世代として使い続ける。
+        """
+        with self._lock:
+            if self.built:
+                self._add(rows)
+                if generation is not None and self._generation == generation - 1:
+                    self._generation = generation
+
+    def invalidate(self):
+        with self._lock:
+            self.built = False
+
+    def search(self, all_facets: List[str], any_facets: List[str]):
+        """all_facets はすべて含む(AND)、any_facets はいずれかを含む(OR)商品を探す
+
+        戻り値は (商品IDのリスト, 該当商品内でのファセットごとの件数)
+        """
+        with self._lock:
+            matched = self._all
+            for facet in all_facets:
+                matched &= self._bitmaps.get(facet, 0)
+            if any_facets:
+                union = 0
+                for facet in any_facets:
+                    union |= self._bitmaps.get(facet, 0)
+                matched &= union
+
+            counts = {}
+            for facet, bitmap in self._bitmaps.items():
+                count = (bitmap & matched).bit_count()
+                if count:
+                    counts[facet] = count
+
+            product_ids = []
+            remaining = matched
+            while remaining:
+                low = remaining & -remaining
+                product_ids.append(self._ids[low.bit_length() - 1])
+                remaining ^= low
+        return sorted(product_ids), counts
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,142 @@
+# app/products/importer.py
+import json
+import time
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Product
+from app.products.catalog_cache import catalog_cache
+from app.products.facet_index import facet_index
+from app.schemas import ProductCreate
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+SEED_PRODUCTS_PATH = Path(__file__).with_name("seed_products.ndjson")
+
+
+def insert_products(db: Session, rows: List[dict]) -> List[str]:
+    """1回の INSERT ... ON CONFLICT DO NOTHING で登録し、実際に登録されたIDを返す"""
+    if not rows:
+        return []
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = (
+        dialect.insert(Product)
+        .on_conflict_do_nothing(index_elements=[Product.id])
+        .returning(Product.id)
+    )
+    return list(db.scalars(stmt, rows))
+
+
+def split_inserted(rows: List[dict], inserted: Iterable[str]) -> Tuple[List[dict], List[str]]:
+    """登録された行と、スキップされたID（既存のIDと、同じ依頼内で2件目以降の重複）に分ける"""
+    remaining = set(inserted)
+    new_rows, skipped_ids = [], []
+    for row in rows:
+        if row["id"] in remaining:
+            remaining.discard(row["id"])
+            new_rows.append(row)
+        else:
+            skipped_ids.append(row["id"])
+    return new_rows, skipped_ids
+
+
+def products_changed(rows: Iterable[dict]):
+    # 商品が増えたらカタログキャッシュとファセット索引を更新する
+    generation = catalog_cache.invalidate()
+    facet_index.add(((row["id"], row.get("category")) for row in rows), generation)
+
+
+# NDJSONを1行ずつ受け取り、チャンク単位で検証・登録する
+class ProductImport:
+    def __init__(self, db: Session, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.pending: List[tuple] = []  # (行番号, データ)
+        self.inserted_ids: List[str] = []
+        self.skipped_ids: List[str] = []
+        self.errors: List[dict] = []
+        self.invalid = 0
+        self.line_no = 0
+        self.started = time.perf_counter()
+
+    @property
+    def chunk_ready(self) -> bool:
+        return len(self.pending) >= self.chunk_size
+
+    def _error(self, line_no: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def add_line(self, line: Union[bytes, str]):
+        self.line_no += 1
+        if isinstance(line, bytes):
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError as e:
+                self._error(self.line_no, f"UTF-8として読めません: {e}")
+                return
+        line = line.strip()
+        if not line:
+            return
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            self._error(self.line_no, f"JSONとして読めません: {e}")
+            return
+        self.pending.append((self.line_no, data))
+
+    def flush(self):
+        """溜まった行を検証し、1チャンク分をまとめて登録・コミットする"""
+        chunk, self.pending = self.pending, []
+        rows = []
+        for line_no, data in chunk:
+            try:
+                rows.append(ProductCreate.model_validate(data).model_dump())
+            except ValidationError as e:
+                self._error(line_no, str(e.errors()[0]["msg"]) if e.errors() else str(e))
+        if not rows:
+            return
+
+        inserted = insert_products(self.db, rows)
+        self.db.commit()
+
+        new_rows, skipped_ids = split_inserted(rows, inserted)
+        self.inserted_ids += [row["id"] for row in new_rows]
+        self.skipped_ids += skipped_ids
+        if new_rows:
+            products_changed(new_rows)
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        processed = len(self.inserted_ids) + len(self.skipped_ids) + self.invalid
+        return {
+            "message": f"{len(self.inserted_ids)} 件の商品を登録しました",
+            "inserted": len(self.inserted_ids),
+            "skipped": len(self.skipped_ids),
+            "invalid": self.invalid,
+            "inserted_ids": self.inserted_ids,
+            "skipped_ids": self.skipped_ids,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 4),
+            "rows_per_second": round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def import_ndjson_lines(db: Session, lines: Iterable[Union[bytes, str]], chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    importer = ProductImport(db, chunk_size)
+    for line in lines:
+        importer.add_line(line)
+        if importer.chunk_ready:
+            importer.flush()
+    importer.flush()
+    return importer.report()
+
+
+def import_ndjson_file(db: Session, path: Union[str, Path] = SEED_PRODUCTS_PATH, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    with open(path, "rb") as f:
+        return import_ndjson_lines(db, f, chunk_size)
@@ -1,58 +1,23 @@
+# app/products/register_bulk.py
+# 商品データ(NDJSON)をDBに一括登録するスクリプト
+#   python -m app.products.register_bulk                 … 初期商品(seed_products.ndjson)を登録
+#   python -m app.products.register_bulk products.ndjson  … 任意のファイルを登録
+import json
+import sys
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.models import Product
-from app.database import get_db
+from app.database import SessionLocal
+from app.products.importer import SEED_PRODUCTS_PATH, import_ndjson_file
 
-router = APIRouter(tags=["products"])
 
-@router.post("/products/register_bulk")
-def register_products_bulk(db: Session = Depends(get_db)):
-    products = [
-        Product(
-            id="product1",
-            name="澄み切ったスカイブルーとクリスタルハート",
-            category="水色 / ピアス / イヤリング",
-            price=3300,
-            image="/images/product1.jpg"
-        ),
-        Product(
-            id="product2",
-            name="気品を纏うラベンダーハート",
-            category="紫 / ピアス / イヤリング",
-            price=3300,
-            image="/images/product2.jpg"
-        ),
-        Product(
-            id="product3",
-            name="純真無垢なベビーピンクハート",
-            category="ピンク / ピアス / イヤリング",
-            price=3300,
-            image="/images/product3.jpg"
-        ),
-        Product(
-            id="product4",
-            name="安らぎ与えるミントグリーンハート",
-            category="緑 / ピアス / イヤリング",
-            price=3300,
-            image="/images/product4.jpg"
-        ),
-        Product(
-            id="product5",
-            name="雨空を彩る紫陽花",
-            category="水色 / イヤーカフ / ピアス / イヤリング",
-            price=2500,
-            image="/images/product5.jpg"
-        ),
-        Product(
-            id="product6",
-            name="季節を運ぶ桜リング-雪月花の冬桜-",
-            category="水色 / リング",
-            price=2200,
-            image="/images/product6.jpg"
-        ),
-    ]
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else SEED_PRODUCTS_PATH
+    db = SessionLocal()
+    try:
+        report = import_ndjson_file(db, path)
+    finally:
+        db.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
 
-    db.add_all(products)
-    db.commit()
-    return {"message": f"{len(products)} 件の商品を登録しました"}
+
+if __name__ == "__main__":
+    main()
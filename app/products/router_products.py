@@ -1,42 +1,162 @@
 # app/products/router_products.py
-from fastapi import APIRouter, Depends, HTTPException
+from bisect import bisect_right
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db, ReadSessionLocal
 from app.models import Product
-from pydantic import BaseModel
-from typing import List
+from app.products.catalog_cache import product_json
+from app.products.facet_index import facet_index
+from app.products.importer import IMPORT_CHUNK_SIZE, ProductImport, insert_products, products_changed, split_inserted
+from app.query_diagnostics import query_budget
+from app.schemas import ProductCreate, ProductPage
+from app.serialization import compose, json_response
+from typing import List, Optional
 from fastapi import Body
 
 
 router = APIRouter(tags=["products"])
 
-class ProductCreate(BaseModel):
-    id: str
-    name: str
-    category: str
-    price: int
-    image: str
-
 @router.post("/products/register_bulk")
 def register_products_bulk(
     products: List[ProductCreate] = Body(...)
     , db: Session = Depends(get_db)
 ):
-    registered = []
-    for product in products:
-        print("登録対象:", product.dict()) 
-        if db.query(Product).filter(Product.id == product.id).first():
-            continue
-        try:
-            db_product = Product(**product.dict())
-            db.add(db_product)
-            registered.append(product.id)
-        except Exception as e:
-            print("登録エラー:", e)
-
+    # 既存IDの確認は1件ずつではなく、INSERT ... ON CONFLICT DO NOTHING に任せる
+    rows = [product.model_dump() for product in products]
+    inserted = insert_products(db, rows)
     db.commit()
+
+    new_rows, skipped_ids = split_inserted(rows, inserted)
+    if new_rows:
+        products_changed(new_rows)
     return {
-        "message": f"{len(registered)} 件の商品を登録しました",
-        "registered_ids": registered
+        "message": f"{len(new_rows)} 件の商品を登録しました",
+        "registered_ids": [row["id"] for row in new_rows],
+        "skipped_ids": skipped_ids,
     }
 
+
+# NDJSON（1行1商品）のストリーミング一括登録
+@router.post("/products/import")
+async def import_products(
+    request: Request,
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    importer = ProductImport(db, chunk_size)
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            importer.add_line(line)
+            if importer.chunk_ready:
+                await run_in_threadpool(importer.flush)
+    if buffer:
+        importer.add_line(buffer)
+    await run_in_threadpool(importer.flush)
+    return importer.report()
+
+
+# 商品一覧（キーセットページング）
+MAX_PAGE_SIZE = 100
+EXPORT_BATCH_SIZE = 500
+
+
+def _filtered_products(db: Session, category: Optional[str], min_price: Optional[int], max_price: Optional[int]):
+    query = db.query(Product)
+    if category is not None:
+        query = query.filter(Product.category == category)
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    return query
+
+
+@router.get("/products", response_model=ProductPage)
+@query_budget(1)
+def list_products(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_read_db),
+):
+    query = _filtered_products(db, category, min_price, max_price)
+    if cursor is not None:
+        query = query.filter(Product.id > cursor)
+
+    # 1件多く取って次ページの有無を判定する
+    rows = query.order_by(Product.id).limit(limit + 1).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    return json_response(compose({
+        "items": [product_json.encode(p) for p in rows],
+        "next_cursor": rows[-1].id if has_next else None,
+    }))
+
+
+def _stream_products(format: str, category: Optional[str], min_price: Optional[int], max_price: Optional[int]):
+    # レスポンス送信中も使うので、依存性のセッションとは別に開く
+    db = ReadSessionLocal()
+    try:
+        query = _filtered_products(db, category, min_price, max_price)
+        rows = query.order_by(Product.id).yield_per(EXPORT_BATCH_SIZE)
+        if format == "ndjson":
+            for product in rows:
+                yield product_json.encode(product, remember=False) + b"\n"
+                db.expunge(product)
+        else:
+            yield b"["
+            first = True
+            for product in rows:
+                chunk = product_json.encode(product, remember=False)
+                yield chunk if first else b"," + chunk
+                first = False
+                db.expunge(product)
+            yield b"]"
+    finally:
+        db.close()
+
+
+@router.get("/products/export")
+def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    category: Optional[str] = None,
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+):
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(_stream_products(format, category, min_price, max_price), media_type=media_type)
+
+
+# カテゴリのファセット検索（AND / OR と件数を一度に返す）
+# 該当商品はIDの昇順で、/products と同じく cursor（前ページの next_cursor）から続きを返す
+@router.get("/products/facets")
+@query_budget(2)
+def search_facets(
+    all_facets: List[str] = Query([], alias="all"),
+    any_facets: List[str] = Query([], alias="any"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+):
+    facet_index.ensure_built(db)
+    product_ids, counts = facet_index.search(all_facets, any_facets)
+
+    start = bisect_right(product_ids, cursor) if cursor is not None else 0
+    page = product_ids[start:start + limit]
+    has_next = start + limit < len(product_ids)
+    items = []
+    if page:
+        items = [product_json.encode(p) for p in db.query(Product).filter(Product.id.in_(page)).order_by(Product.id)]
+    return json_response(compose({
+        "total": len(product_ids),
+        "items": items,
+        "next_cursor": page[-1] if has_next else None,
+        "facets": counts,
+    }))
@@ -0,0 +1,241 @@
+# app/query_diagnostics.py
+"""SQLの診断モード（QUERY_DIAGNOSTICS=1 のときだけ有効）
+
+- リクエスト中の全SQLを、正規化した文・時間・呼び出し元つきで記録する
+- 同じ形のSQLが何度も実行されたリクエストを N+1 の疑いとしてログに出す
+- 遅いSQLは EXPLAIN (SQLiteは EXPLAIN QUERY PLAN) の結果もログに出す
+- @query_budget(n) を付けたエンドポイントがn件を超えたら警告する
+  （QUERY_BUDGET_STRICT=1 なら QueryBudgetExceeded を送出するので、テストを失敗させられる）
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, NamedTuple, Optional
+
+import greenlet
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+QUERY_DIAGNOSTICS = os.getenv("QUERY_DIAGNOSTICS", "0") == "1"
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "50"))
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "0") == "1"
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# 呼び出し元として扱わない（計測側の）ファイル
+_INTERNAL_FILES = {os.path.join(APP_DIR, name) for name in ("query_diagnostics.py", "metrics.py", "database.py")}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class CapturedQuery(NamedTuple):
+    shape: str
+    statement: str
+    seconds: float
+    call_site: Optional[str]
+
+
+def normalize_sql(statement: str) -> str:
+    """値・パラメータの違いを無視した「文の形」にする（IN (?, ?, ?) や複数行VALUESも1つにまとめる）"""
+    sql = _STRING.sub("?", statement)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PARAM.sub("?", sql)
+    sql = _SPACES.sub(" ", sql).strip()
+    sql = _IN_LIST.sub("(?...)", sql)
+    return _VALUES_LIST.sub(r"\1, ...", sql)
+
+
+def _frames():
+    # aiosqlite などの非同期ドライバでは、SQLは子greenletで実行されるので親greenletのスタックも辿る
+    frame = sys._getframe(2)
+    current = greenlet.getcurrent()
+    while True:
+        while frame is not None:
+            yield frame
+            frame = frame.f_back
+        current = current.parent
+        if current is None:
+            return
+        frame = current.gr_frame
+
+
+def call_site() -> Optional[str]:
+    """SQLを発行したアプリ側のコード（一番内側の app/ 配下のフレーム）"""
+    for frame in _frames():
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename not in _INTERNAL_FILES:
+            return f"{os.path.relpath(filename, os.path.dirname(APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}"
+    return None
+
+
+class QueryLog:
+    def __init__(self):
+        self.queries: List[CapturedQuery] = []
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    @property
+    def seconds(self) -> float:
+        return sum(q.seconds for q in self.queries)
+
+    def n_plus_one(self, threshold: int = QUERY_N_PLUS_ONE_THRESHOLD) -> List[dict]:
+        """同じ形のSQLが threshold 回以上実行されたもの"""
+        counts = Counter(q.shape for q in self.queries)
+        sites = defaultdict(Counter)
+        for q in self.queries:
+            sites[q.shape][q.call_site] += 1
+        return [
+            {"shape": shape, "count": count, "call_sites": dict(sites[shape])}
+            for shape, count in counts.most_common()
+            if count >= threshold
+        ]
+
+    def report(self) -> dict:
+        return {
+            "queries": len(self.queries),
+            "db_ms": round(self.seconds * 1000, 3),
+            "statements": [
+                {"shape": q.shape, "ms": round(q.seconds * 1000, 3), "call_site": q.call_site}
+                for q in self.queries
+            ],
+            "n_plus_one": self.n_plus_one(),
+        }
+
+
+current_query_log: ContextVar[Optional[QueryLog]] = ContextVar("current_query_log", default=None)
+
+
+@contextmanager
+def capture_queries():
+    """ブロック内（同じコンテキスト）で実行されたSQLを記録する
+
+        with capture_queries() as log:
+            ...
+        assert len(log) <= 3, log.report()
+    """
+    log = QueryLog()
+    token = current_query_log.set(log)
+    try:
+        yield log
+    finally:
+        current_query_log.reset(token)
+
+
+def query_budget(max_queries: int):
+    """エンドポイントに許容するSQL件数を宣言する（ルートのデコレータの下に付ける）"""
+    def decorator(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorator
+
+
+def _explain(conn, statement: str, parameters) -> Optional[list]:
+    words = statement.split(None, 1)
+    if not words or words[0].upper() not in ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # SQLAlchemyを通さずに同じ接続で実行する（フックが再帰しないように）
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [row[-1] if conn.dialect.name == "sqlite" else row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def instrument_engine_diagnostics(engine, slow_ms: float = QUERY_SLOW_MS):
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("diagnostics_started", []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["diagnostics_started"].pop()
+        log = current_query_log.get()
+        site = call_site()
+        if log is not None:
+            log.queries.append(CapturedQuery(normalize_sql(statement), statement, seconds, site))
+        if seconds * 1000 >= slow_ms and not executemany:
+            try:
+                plan = _explain(conn, statement, parameters)
+            except Exception as e:
+                plan = [f"EXPLAIN に失敗しました: {e}"]
+            logger.warning(
+                f"遅いSQL ({seconds * 1000:.1f}ms, {site}): {normalize_sql(statement)}"
+                + ("\n  " + "\n  ".join(map(str, plan)) if plan else "")
+            )
+
+    @event.listens_for(target, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("diagnostics_started"):
+            conn.info["diagnostics_started"].pop()
+
+    return engine
+
+
+class QueryDiagnosticsMiddleware:
+    """リクエストごとのSQLを記録し、N+1の疑い・件数の上限超えを報告するASGIミドルウェア"""
+
+    def __init__(self, app, strict: bool = QUERY_BUDGET_STRICT, n_plus_one_threshold: int = QUERY_N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.strict = strict
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = current_query_log.set(log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # ヘッダー送信時点までのSQL件数（ストリーミングでは途中までの値）
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(len(log)).encode()))
+                headers.append((b"x-db-time-ms", f"{log.seconds * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_log.reset(token)
+        self._check(scope, log)
+
+    def _check(self, scope, log: QueryLog):
+        route = scope.get("route")
+        name = f'{scope["method"]} {getattr(route, "path", scope["path"])}'
+        for suspect in log.n_plus_one(self.n_plus_one_threshold):
+            logger.warning(
+                f"N+1の疑い ({name}): {suspect['count']}回 {suspect['shape']} 呼び出し元={suspect['call_sites']}"
+            )
+
+        budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        if budget is not None and len(log) > budget:
+            message = f"SQL件数が上限を超えました ({name}): {len(log)} > {budget}\n" + "\n".join(
+                f"  {q.call_site}: {q.shape}" for q in log.queries
+            )
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
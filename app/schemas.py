@@ -1,6 +1,6 @@
 # app/schemas.py
 from pydantic import BaseModel, EmailStr, Field
-from typing import List
+from typing import Any, List, Literal, Optional
 from datetime import date
 
 
@@ -38,6 +38,51 @@ class GiftCreate(BaseModel):
     image_url: str
 
 
+# ギフトのレスポンス（ORMの行から作る）
+class GiftResponse(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    price: Optional[float] = None
+    material: Optional[List[str]] = None
+    size: Optional[List[str]] = None
+    notes: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    product_url: Optional[str] = None
+    image_url: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+# 商品登録用スキーマ
+class ProductCreate(BaseModel):
+    id: str
+    name: str
+    category: str
+    price: int
+    image: str
+
+
+# 商品のレスポンス（ORMの行から作る）
+class ProductResponse(BaseModel):
+    id: str
+    name: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[int] = None
+    image: Optional[str] = None
+    tags: Optional[Any] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str] = None
+
+
 class CustomerUpdate(BaseModel):
     username: str
     birthdate: date
@@ -51,7 +96,7 @@ class UserResponse(BaseModel):
     address: str
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 
 class UserUpdate(BaseModel):
@@ -61,8 +106,23 @@ class UserUpdate(BaseModel):
     address: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class PurchaseRequest(BaseModel):
     payment_method: str
     address: str
 
 
+
+
+# カートの一括操作（PATCH /purchase/cart）
+class CartOperation(BaseModel):
+    op: Literal["add", "set", "remove"]
+    itemId: str
+    quantity: int = Field(0, ge=0)
+
+
+class CartPatch(BaseModel):
+    operations: List[CartOperation] = Field(..., min_length=1, max_length=100)
@@ -0,0 +1,105 @@
+# app/serialization.py
+import os
+import threading
+from collections import OrderedDict
+from operator import attrgetter, itemgetter
+from typing import Any, Hashable, Iterable, Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+ROW_JSON_CACHE_SIZE = int(os.getenv("ROW_JSON_CACHE_SIZE", "10000"))
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def dumps(data: Any) -> bytes:
+    # fastapi.responses.ORJSONResponse と同じオプション
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class RawJSON(bytes):
+    """エンコード済みのJSON（compose でそのまま埋め込む）"""
+
+
+def compose(value: Any) -> bytes:
+    """dict / list の中の RawJSON は再エンコードせずに埋め込んでJSONにする"""
+    if isinstance(value, RawJSON):
+        return value
+    if isinstance(value, dict):
+        return b"{" + b",".join(dumps(str(key)) + b":" + compose(item) for key, item in value.items()) + b"}"
+    if isinstance(value, (list, tuple)):
+        return b"[" + b",".join(compose(item) for item in value) + b"]"
+    return dumps(value)
+
+
+def json_response(body: bytes, **kwargs) -> Response:
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, **kwargs)
+
+
+# 行ごとのJSONのバイト列（件数上限つきLRU）
+class RowJSONCache:
+    """主キー → (列の値, バイト列) を覚えておき、列の値が前回と同じ行（同じバージョン）は再エンコードしない
+
+    行の値は毎回DBから読むので、更新された行は値の比較で自動的にエンコードし直される。
+    出力するのはレスポンスモデル（schema）のフィールドで、すべてモデルの列であること。
+    """
+
+    def __init__(self, model, schema: Type[BaseModel], maxsize: int = ROW_JSON_CACHE_SIZE):
+        self.schema = schema
+        self.maxsize = maxsize
+        self.fields = list(schema.model_fields)
+        columns = {column.key for column in model.__mapper__.column_attrs}
+        missing = [name for name in self.fields if name not in columns]
+        if missing:
+            raise ValueError(f"{schema.__name__} のフィールドが {model.__name__} の列にありません: {missing}")
+        key = model.__mapper__.get_property_by_column(model.__mapper__.primary_key[0]).key
+        if key not in self.fields:
+            raise ValueError(f"{schema.__name__} に主キー {key} がありません")
+        self._key_index = self.fields.index(key)
+        # 読み込み済みの値は __dict__ から直接読む（属性アクセスより速い）。期限切れの列があれば属性経由で読み直す
+        self._loaded_values = itemgetter(*self.fields)
+        self._attribute_values = attrgetter(*self.fields)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _values(self, row) -> tuple:
+        try:
+            return self._loaded_values(row.__dict__)
+        except KeyError:
+            return self._attribute_values(row)
+
+    def encode(self, row, remember: bool = True) -> RawJSON:
+        """remember=False なら既存のエントリは使うが新しくは覚えない（全件エクスポートでLRUを押し流さないため）"""
+        values = self._values(row)
+        key = values[self._key_index]
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == values:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        body = RawJSON(dumps(dict(zip(self.fields, values))))
+        if remember:
+            with self._lock:
+                self._data[key] = (values, body)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return body
+
+    def encode_many(self, rows: Iterable, remember: bool = True) -> RawJSON:
+        return RawJSON(b"[" + b",".join(self.encode(row, remember) for row in rows) + b"]")
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,160 @@
+# app/threaded_session.py
+"""AsyncSession と同じ書き方のまま、同期 Session の処理をスレッドプールで実行する（SQLite用）
+
+aiosqlite は SQL 1本ごとに専用スレッドとの受け渡しとグリーンレットの切り替えが入り、
+同期ドライバ＋スレッドプールより遅い（benchmarks.async_sessions）。
+DATABASE_URL が SQLite のときは、async def のルートにこのセッションを渡す。
+
+結果は AsyncSession.execute と同じくスレッド側で全行読み切ってから返す。
+
+接続プールの待ちはスレッドをふさぐ（接続を持ったセッションが次のSQLを流すスレッドが無くなる）ので、
+プールから接続を借りる前にイベントループ側で枠（プールの上限と同じ数）を取る。
+枠を持つのは接続を借りている間（最初のSQLから commit / rollback / close まで）だけなので、
+同じリクエストで2つ目のセッションを開いても、1つ目が接続を返していれば待ち合わない
+（get_current_user_async はユーザーを読んだらすぐ commit する）。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+
+# DBに触れないので同期 Session のものをそのまま使う属性（それ以外は AttributeError）
+PASSTHROUGH_ATTRIBUTES = frozenset({
+    "add", "add_all", "expunge", "expunge_all", "bind", "get_bind", "info",
+    "in_transaction", "is_active", "new", "dirty", "deleted", "identity_map",
+})
+
+
+class ThreadedConnection:
+    def __init__(self, sync_connection):
+        self.sync_connection = sync_connection
+
+    async def exec_driver_sql(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_connection.exec_driver_sql, *args, **kwargs)
+
+
+class ThreadedSession:
+    def __init__(self, sync_session: Session, slots: Optional[asyncio.Semaphore] = None):
+        self.sync_session = sync_session
+        self._slots = slots
+        self._holding_slot = False
+
+    def __getattr__(self, name):
+        # 包んでいないメソッドを同期 Session に素通しすると、イベントループ上でSQLが走ってしまう
+        if name in PASSTHROUGH_ATTRIBUTES:
+            return getattr(self.sync_session, name)
+        raise AttributeError(f"ThreadedSession は {name} に対応していません")
+
+    async def _checkout(self):
+        if self._slots is not None and not self._holding_slot:
+            await self._slots.acquire()
+            self._holding_slot = True
+
+    def _checkin(self):
+        # commit / rollback / close の後は同期 Session が接続をプールへ返している
+        if self._holding_slot:
+            self._holding_slot = False
+            self._slots.release()
+
+    async def _run(self, fn, *args, **kwargs):
+        await self._checkout()
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+    def _execute(self, statement, params, kwargs):
+        result = self.sync_session.execute(statement, params, **kwargs)
+        # UPDATE など行を返さない結果は rowcount だけ使うのでそのまま返す
+        return result.freeze()() if getattr(result, "returns_rows", True) else result
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await self._run(self._execute, statement, params, kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalar()
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalars()
+
+    async def get(self, *args, **kwargs):
+        return await self._run(self.sync_session.get, *args, **kwargs)
+
+    async def merge(self, instance, load: bool = True, **kwargs):
+        if not load:
+            # load=False はSQLを出さない
+            return self.sync_session.merge(instance, load=False, **kwargs)
+        return await self._run(self.sync_session.merge, instance, **kwargs)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """AsyncSession.run_sync と同じ。複数のSQLを1回のスレッド往復で実行する"""
+        return await self._run(fn, self.sync_session, *args, **kwargs)
+
+    async def refresh(self, *args, **kwargs):
+        return await self._run(self.sync_session.refresh, *args, **kwargs)
+
+    async def delete(self, instance):
+        return await self._run(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None):
+        return await self._run(self.sync_session.flush, objects)
+
+    async def commit(self):
+        try:
+            return await self._run(self.sync_session.commit)
+        finally:
+            self._checkin()
+
+    async def rollback(self):
+        try:
+            return await self._run(self.sync_session.rollback)
+        finally:
+            self._checkin()
+
+    async def close(self):
+        # 接続をプールへ返すだけ（SQLite の ROLLBACK はすぐ終わる）なので、スレッドを往復しない
+        try:
+            self.sync_session.close()
+        finally:
+            self._checkin()
+
+    async def connection(self, **kwargs):
+        return ThreadedConnection(await self._run(self.sync_session.connection, **kwargs))
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        transaction = await self._run(self.sync_session.begin_nested)
+        try:
+            yield transaction
+        except BaseException:
+            if transaction.is_active:
+                await run_in_threadpool(transaction.rollback)
+            raise
+        if transaction.is_active:
+            await run_in_threadpool(transaction.commit)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+def pool_capacity(engine) -> Optional[int]:
+    """QueuePool の同時接続数の上限（上限なし・QueuePool 以外は None）"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+        return None
+    return pool.size() + pool._max_overflow
+
+
+class threaded_sessionmaker:
+    """async_sessionmaker の代わり（AsyncSessionLocal() と同じく `async with factory() as db:` で使う）"""
+
+    def __init__(self, bind, **kwargs):
+        self.sync_sessionmaker = sessionmaker(bind=bind, **kwargs)
+        capacity = pool_capacity(bind)
+        self._slots = asyncio.Semaphore(capacity) if capacity else None
+
+    def __call__(self) -> ThreadedSession:
+        return ThreadedSession(self.sync_sessionmaker(), self._slots)
@@ -0,0 +1,2 @@
+# benchmarks/
+# 性能確認用のスクリプト群（python -m benchmarks.<name> で実行、結果はJSONで出力）
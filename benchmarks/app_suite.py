@@ -0,0 +1,221 @@
+# benchmarks/app_suite.py
+"""app.main の ASGI アプリをプロセス内で叩く負荷テスト（一時SQLite・合成データ）
+
+    python -m benchmarks.app_suite
+    python -m benchmarks.app_suite --scenarios browse add_to_cart --requests 2000 --output result.json
+    python -m benchmarks.app_suite --compare baseline.json
+
+結果はJSONで出力する（--compare で前回の結果とスループット・p99を比較）。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.stats import summarize
+
+SCENARIOS = ["signup", "login", "browse", "add_to_cart", "purchase", "recommend"]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+class Suite:
+    def __init__(self, client, dataset, concurrency: int):
+        self.client = client
+        self.dataset = dataset
+        self.concurrency = concurrency
+        self.tokens = {}
+        self._free_users: asyncio.Queue = asyncio.Queue()
+        self._signup_seq = itertools.count()
+        self._user_cycle = itertools.cycle(range(len(dataset.user_emails)))
+
+    async def login(self, email: str) -> dict:
+        response = await self.client.post("/auth/login", json={"email": email, "password": self.dataset.password})
+        response.raise_for_status()
+        return {"Authorization": "Bearer " + response.json()["token"]}
+
+    async def prepare_tokens(self, count: int):
+        emails = self.dataset.user_emails[:count]
+        headers = await asyncio.gather(*(self.login(email) for email in emails))
+        self.tokens = dict(zip(range(len(emails)), headers))
+        for n in self.tokens:
+            self._free_users.put_nowait(n)
+
+    def _headers(self, n: int) -> dict:
+        return self.tokens[n % len(self.tokens)]
+
+    # 各シナリオは1回分のリクエストを送り、計測対象のレスポンスを返す
+    async def signup(self, n: int):
+        seq = next(self._signup_seq)
+        return await self.client.post("/auth/signup", json={
+            "username": f"signup{seq}", "birthdate": "1995-05-05", "email": f"signup{seq}@example.com",
+            "address": "東京都", "password": "signup-password",
+        })
+
+    async def login_once(self, n: int):
+        email = self.dataset.user_emails[next(self._user_cycle)]
+        return await self.client.post("/auth/login", json={"email": email, "password": self.dataset.password})
+
+    async def browse(self, n: int):
+        kind = n % 3
+        if kind == 0:
+            return await self.client.get("/purchase/products")
+        if kind == 1:
+            return await self.client.get(f"/purchase/products/{random.choice(self.dataset.product_ids)}")
+        return await self.client.get("/products", params={"limit": 20})
+
+    async def add_to_cart(self, n: int):
+        return await self.client.post("/purchase/cart", headers=self._headers(n), json={
+            "itemId": random.choice(self.dataset.product_ids), "quantity": 1,
+        })
+
+    async def purchase(self, n: int):
+        # 同じユーザーが同時に購入しないよう、空いているユーザーを借りて使う
+        user = await self._free_users.get()
+        try:
+            headers = self.tokens[user]
+            await self.client.post("/purchase/cart", headers=headers, json={
+                "itemId": random.choice(self.dataset.product_ids), "quantity": 1,
+            })
+            return await self.client.post("/purchase/purchase", headers=headers, json={
+                "payment_method": "credit", "address": "東京都",
+            })
+        finally:
+            self._free_users.put_nowait(user)
+
+    async def recommend(self, n: int):
+        return await self.client.post("/gift/recommend", json={"tags": random.choice(self.dataset.tag_queries)})
+
+    async def run(self, name: str, requests: int) -> dict:
+        call = self.login_once if name == "login" else getattr(self, name)
+        latencies = []
+        statuses = Counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(n: int):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await call(n)
+                    statuses[str(response.status_code)] += 1
+                except Exception as e:
+                    statuses[type(e).__name__] += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(requests)))
+        result = summarize(latencies, time.perf_counter() - started)
+        result["statuses"] = dict(statuses)
+        result["errors"] = sum(count for status, count in statuses.items() if not status.startswith("2"))
+        return result
+
+
+async def run_suite(args, dataset) -> dict:
+    import httpx
+
+    from app.lifecycle import startup_state
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        # ウォームアップが終わってから計測する
+        await startup_state.wait_ready()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            suite = Suite(client, dataset, args.concurrency)
+            if {"add_to_cart", "purchase"} & set(args.scenarios):
+                await suite.prepare_tokens(min(len(dataset.user_emails), max(args.concurrency, 1)))
+            results = {}
+            for name in args.scenarios:
+                requests = args.auth_requests if name in ("signup", "login") else args.requests
+                results[name] = await suite.run(name, requests)
+            return results
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """シナリオごとのスループット比・p99比（>1 ならスループット向上／p99悪化）"""
+    diff = {}
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        diff[name] = {
+            "throughput_ratio": round(result["throughput_per_second"] / before["throughput_per_second"], 3)
+            if before["throughput_per_second"] else None,
+            "p99_ratio": round(result["p99_ms"] / before["p99_ms"], 3) if before["p99_ms"] else None,
+        }
+    return {"baseline_commit": baseline.get("commit"), "scenarios": diff}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=1000, help="1シナリオあたりのリクエスト数")
+    parser.add_argument("--auth-requests", type=int, default=100, help="signup/login のリクエスト数（bcryptが重いため別指定）")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--gifts", type=int, default=300)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="結果JSONの保存先")
+    parser.add_argument("--compare", help="比較する過去の結果JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.database は import 時に DATABASE_URL を読むので、アプリを import する前に設定する
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["DATABASE_URL"] = url
+        os.environ.setdefault("OUTBOX_WORKER_ENABLED", "0")
+        # プロセス内のクライアントは接続元が1つなので、ログインの回数制限で login/signup が 429 にならないようにする
+        os.environ.setdefault("AUTH_RATE_LIMIT_ENABLED", "0")
+
+        from benchmarks.datagen import generate
+
+        random.seed(args.seed)
+        dataset = generate(url, args.users, args.products, args.gifts, args.orders, args.seed)
+        scenarios = asyncio.run(run_suite(args, dataset))
+
+    result = {
+        "benchmark": "app_suite",
+        "commit": _git_commit(),
+        "config": {
+            "requests": args.requests,
+            "auth_requests": args.auth_requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "products": args.products,
+            "gifts": args.gifts,
+            "orders": args.orders,
+            "seed": args.seed,
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("SQLITE_", "WRITE_", "DB_POOL", "HASH_POOL", "ADMISSION_", "AUTH_RATE"))},
+        },
+        "scenarios": scenarios,
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            result["comparison"] = compare(result, json.load(f))
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/auth_sessions.py
+"""長いセッション（既定 8 時間）の間、アクセストークンを取り直し続けるときのCPU時間を比べる
+
+- relogin: 期限（ACCESS_TOKEN_EXPIRE_MINUTES）が切れるたびに POST /auth/login（毎回 bcrypt）
+- refresh: 最初だけ POST /auth/login、その後は POST /auth/refresh（SHA-256 で引くだけ）
+
+CPU時間は、このプロセスの time.process_time() と、ハッシュ用プロセスプールで bcrypt にかかった時間の合計。
+bcrypt の時間はワーカー内の経過時間なので、ワーカーが同じコアを取り合わないよう既定で HASH_POOL_WORKERS=1 にする。
+各セッションの最後に、取り直したアクセストークンで GET /auth/me が通ることを確かめる。
+
+    python -m benchmarks.auth_sessions
+    python -m benchmarks.auth_sessions --users 50 --hours 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.app_suite import _git_commit
+from benchmarks.stats import summarize
+
+STRATEGIES = ["relogin", "refresh"]
+
+
+async def _session(client, email: str, password: str, renewals: int, strategy: str, latencies: list):
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    tokens = response.json()
+    for _ in range(renewals):
+        started = time.perf_counter()
+        if strategy == "relogin":
+            response = await client.post("/auth/login", json={"email": email, "password": password})
+        else:
+            response = await client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        tokens = response.json()
+    me = await client.get("/auth/me", headers={"Authorization": "Bearer " + tokens["token"]})
+    me.raise_for_status()
+
+
+async def _run_strategy(client, dataset, args, renewals: int, strategy: str) -> dict:
+    from app.auth.hash_pool import hash_pool
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(email: str):
+        async with semaphore:
+            await _session(client, email, dataset.password, renewals, strategy, latencies)
+
+    before = hash_pool.stats()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(email) for email in dataset.user_emails[:args.users]))
+    elapsed = time.perf_counter() - started
+    app_cpu = time.process_time() - cpu_started
+    after = hash_pool.stats()
+
+    bcrypt_cpu = after["hash_seconds_total"] - before["hash_seconds_total"]
+    result = {
+        "renewal_latency": summarize(latencies, elapsed),
+        "bcrypt_calls": after["completed"] - before["completed"],
+        "bcrypt_seconds": round(bcrypt_cpu, 3),
+        "app_cpu_seconds": round(app_cpu, 3),
+        "cpu_seconds": round(app_cpu + bcrypt_cpu, 3),
+    }
+    result["cpu_ms_per_session"] = round(result["cpu_seconds"] * 1000 / args.users, 2)
+    return result
+
+
+async def run(args, dataset) -> dict:
+    import httpx
+
+    from app.auth.utils import ACCESS_TOKEN_EXPIRE_MINUTES
+    from app.lifecycle import startup_state
+    from app.main import app
+
+    renewals = int(args.hours * 60 // ACCESS_TOKEN_EXPIRE_MINUTES)
+    async with app.router.lifespan_context(app):
+        await startup_state.wait_ready()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            results = {"renewals_per_session": renewals}
+            for strategy in args.strategies:
+                results[strategy] = await _run_strategy(client, dataset, args, renewals, strategy)
+            return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES)
+    parser.add_argument("--users", type=int, default=20, help="セッション数（1ユーザー1セッション）")
+    parser.add_argument("--hours", type=float, default=8, help="1セッションの長さ")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["DATABASE_URL"] = url
+        os.environ.setdefault("OUTBOX_WORKER_ENABLED", "0")
+        # 全リクエストが同じ接続元なので、ログインの回数制限で 429 にならないようにする
+        os.environ.setdefault("AUTH_RATE_LIMIT_ENABLED", "0")
+        os.environ.setdefault("HASH_POOL_WORKERS", "1")
+
+        from benchmarks.datagen import generate
+
+        random.seed(args.seed)
+        dataset = generate(url, args.users, products=10, gifts=10, orders=0, seed=args.seed)
+        sessions = asyncio.run(run(args, dataset))
+
+    result = {
+        "benchmark": "auth_sessions",
+        "commit": _git_commit(),
+        "config": {
+            "users": args.users,
+            "hours": args.hours,
+            "concurrency": args.concurrency,
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("ACCESS_TOKEN", "REFRESH_TOKEN", "HASH_POOL"))},
+        },
+        **sessions,
+    }
+    if "relogin" in sessions and "refresh" in sessions and sessions["refresh"]["cpu_seconds"]:
+        result["cpu_ratio_relogin_to_refresh"] = round(sessions["relogin"]["cpu_seconds"] / sessions["refresh"]["cpu_seconds"], 1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/datagen.py
+"""ベンチマーク用の合成データ（ユーザー・商品・ギフト・注文）を作る
+
+    python -m benchmarks.datagen sqlite:///./bench.db --users 1000 --orders 10000
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from typing import List, NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.analytics.rollups import rebuild_rollups
+from app.auth.utils import get_password_hash
+from app.database import make_engine
+
+BENCH_PASSWORD = "bench-password"
+CATEGORIES = ["ネックレス/ハート", "ネックレス/スター", "ピアス/フープ", "ピアス/スタッド", "リング/シルバー", "ブレスレット/チェーン"]
+TAGS = ["誕生日", "記念日", "母の日", "クリスマス", "かわいい", "上品", "シンプル", "ピンク", "ブルー", "シルバー",
+        "ゴールド", "ハート", "星", "花", "春", "夏", "秋", "冬", "友達", "恋人", "家族", "プチギフト"]
+
+
+class Dataset(NamedTuple):
+    user_emails: List[str]
+    product_ids: List[str]
+    tag_queries: List[List[str]]
+    password: str = BENCH_PASSWORD
+
+
+def generate(url: str, users: int = 1000, products: int = 500, gifts: int = 300, orders: int = 5000,
+             seed: int = 1) -> Dataset:
+    """url のDBにテーブルを作り、合成データを入れる（既存のテーブルは作り直す）"""
+    random.seed(seed)
+    engine = make_engine(url, sqlite_profile=False)
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+
+    # bcrypt は遅いので全員同じパスワードのハッシュを使い回す
+    hashed = get_password_hash(BENCH_PASSWORD)
+    user_rows = [
+        {"id": i, "username": f"bench{i}", "email": f"bench{i}@example.com", "hashed_password": hashed,
+         "birthdate": datetime(1990, 1, 1) + timedelta(days=i % 9000), "address": "東京都"}
+        for i in range(1, users + 1)
+    ]
+    product_rows = [
+        {"id": f"bench-p{i}", "name": f"商品{i}", "category": random.choice(CATEGORIES),
+         "description": "ベンチマーク用の商品", "price": random.randrange(1000, 20000, 100),
+         "image": f"/images/bench-p{i}.png", "tags": random.sample(TAGS, 3)}
+        for i in range(products)
+    ]
+    gift_rows = [
+        {"id": f"bench-g{i}", "name": f"ギフト{i}", "description": "ベンチマーク用のギフト",
+         "price": float(random.randrange(1000, 20000, 100)), "material": ["シルバー"], "size": ["フリー"],
+         "notes": [], "tags": random.sample(TAGS, random.randint(2, 6)), "product_url": "", "image_url": ""}
+        for i in range(gifts)
+    ]
+
+    start = datetime.utcnow() - timedelta(days=365)
+    order_rows = []
+    for _ in range(orders):
+        items = [
+            {"id": p["id"], "name": p["name"], "price": p["price"], "quantity": random.randint(1, 3)}
+            for p in random.sample(product_rows, random.randint(1, 3))
+        ] if product_rows else []
+        order_rows.append({
+            "user_id": random.randint(1, users) if users else None,
+            "items": items,
+            "total_price": sum(i["price"] * i["quantity"] for i in items) + 185,
+            "payment_method": random.choice(["credit", "bank", "cod"]),
+            "address": "東京都",
+            "created_at": start + timedelta(seconds=random.randrange(365 * 86400)),
+        })
+
+    with engine.begin() as conn:
+        for table, rows in (
+            (models.User.__table__, user_rows),
+            (models.Product.__table__, product_rows),
+            (models.Gift.__table__, gift_rows),
+            (models.Order.__table__, order_rows),
+        ):
+            if rows:
+                conn.execute(table.insert(), rows)
+    # 注文は直接入れたので、売上の集計テーブルも作り直しておく
+    with Session(engine) as db:
+        rebuild_rollups(db)
+    engine.dispose()
+
+    tag_queries = [random.sample(TAGS, random.randint(1, 4)) for _ in range(200)]
+    return Dataset([u["email"] for u in user_rows], [p["id"] for p in product_rows], tag_queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("database_url")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--gifts", type=int, default=300)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    dataset = generate(args.database_url, args.users, args.products, args.gifts, args.orders, args.seed)
+    print(json.dumps({
+        "users": len(dataset.user_emails),
+        "products": len(dataset.product_ids),
+        "password": dataset.password,
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
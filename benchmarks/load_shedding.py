@@ -0,0 +1,213 @@
+# benchmarks/load_shedding.py
+"""閲覧・ログインを大量に流している間の購入（checkout）の処理時間を、アドミッション制御の有無で比べる
+
+uvicorn を別プロセスで起動し（ADMISSION_CONTROL_ENABLED=0 / 1 で1回ずつ）、それぞれで
+
+- quiet: 購入だけを流したとき
+- flood: 別プロセスから閲覧（一覧・詳細・検索・おすすめ）とログインを大量に同時に流しているとき
+
+の購入の処理時間を測る。ログインの大量送信は1つの接続元（X-Forwarded-For: 198.51.100.1）からとして送る。
+最後に /metrics の admission_* / auth_rate_limited_* を出力する。
+
+    python -m benchmarks.load_shedding
+    python -m benchmarks.load_shedding --flood-concurrency 400 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.app_suite import Suite, _git_commit
+from benchmarks.stats import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FLOOD_CLIENT_IP = "198.51.100.1"
+CHECKOUT_CLIENT_IP = "203.0.113.1"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _client(base_url: str, client_ip: str):
+    import httpx
+
+    return httpx.AsyncClient(
+        base_url=base_url, timeout=None, headers={"X-Forwarded-For": client_ip},
+        limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+    )
+
+
+async def _flood(base_url: str, dataset, concurrency: int, duration: float) -> dict:
+    statuses = Counter()
+    deadline = time.perf_counter() + duration
+
+    async with _client(base_url, FLOOD_CLIENT_IP) as client:
+        flood = Suite(client, dataset, concurrency)
+
+        async def loop(n: int):
+            # 4本に1本はログイン、残りは閲覧・おすすめ（断られてもすぐ次を送る）
+            while time.perf_counter() < deadline:
+                if n % 4 == 0:
+                    call = flood.login_once
+                elif n % 4 == 3:
+                    call = flood.recommend
+                else:
+                    call = flood.browse
+                try:
+                    response = await call(n)
+                    statuses[str(response.status_code)] += 1
+                except Exception as e:
+                    statuses[type(e).__name__] += 1
+                n += 4
+
+        await asyncio.gather(*(loop(n) for n in range(concurrency)))
+    return {"requests": sum(statuses.values()), "statuses": dict(statuses)}
+
+
+def _flood_process(base_url: str, dataset, concurrency: int, duration: float, results):
+    results.put(asyncio.run(_flood(base_url, dataset, concurrency, duration)))
+
+
+async def _checkout(suite: Suite, concurrency: int, duration: float) -> dict:
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + duration
+
+    async def loop(n: int):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await suite.purchase(n)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                continue
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(n) for n in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["statuses"] = dict(statuses)
+    return result
+
+
+async def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60):
+    import httpx
+
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn が終了しました")
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn が準備完了になりませんでした")
+
+
+async def _scrape_admission(base_url: str) -> list:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        text = (await client.get("/metrics")).text
+    return [line for line in text.splitlines() if line.startswith(("admission_", "auth_rate_limited"))]
+
+
+async def _run_server_phases(base_url: str, server: subprocess.Popen, dataset, args) -> dict:
+    await _wait_ready(base_url, server)
+    async with _client(base_url, CHECKOUT_CLIENT_IP) as client:
+        suite = Suite(client, dataset, args.checkout_concurrency)
+        await suite.prepare_tokens(args.checkout_concurrency)
+        result = {"quiet": await _checkout(suite, args.checkout_concurrency, args.duration)}
+
+        # 負荷を流す側は別プロセス（同じイベントループで動かすと、クライアントの処理が購入の待ち時間に混ざる）
+        context = multiprocessing.get_context("spawn")
+        flood_results = context.Queue()
+        flood = context.Process(
+            target=_flood_process, args=(base_url, dataset, args.flood_concurrency, args.duration + 1, flood_results),
+        )
+        flood.start()
+        await asyncio.sleep(1)  # 負荷が立ち上がってから測る
+        result["flood"] = await _checkout(suite, args.checkout_concurrency, args.duration)
+        result["flood"]["flood_requests"] = await asyncio.get_running_loop().run_in_executor(None, flood_results.get)
+        flood.join()
+    result["metrics"] = await _scrape_admission(base_url)
+    return result
+
+
+def _run_server(url: str, dataset, args, enabled: bool) -> dict:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": url,
+        "OUTBOX_WORKER_ENABLED": "0",
+        "ADMISSION_CONTROL_ENABLED": "1" if enabled else "0",
+    }
+    # render.yaml と同じく --proxy-headers で X-Forwarded-For を接続元として扱う
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning",
+         "--proxy-headers", "--forwarded-allow-ips", "127.0.0.1"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        return asyncio.run(_run_server_phases(f"http://127.0.0.1:{port}", server, dataset, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="1フェーズで購入を流す秒数")
+    parser.add_argument("--checkout-concurrency", type=int, default=4)
+    parser.add_argument("--flood-concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--gifts", type=int, default=300)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["DATABASE_URL"] = url
+
+        from benchmarks.datagen import generate
+
+        random.seed(args.seed)
+        dataset = generate(url, args.users, args.products, args.gifts, args.orders, args.seed)
+        servers = {
+            "admission_off": _run_server(url, dataset, args, enabled=False),
+            "admission_on": _run_server(url, dataset, args, enabled=True),
+        }
+
+    result = {
+        "benchmark": "load_shedding",
+        "commit": _git_commit(),
+        "config": {
+            "duration": args.duration,
+            "checkout_concurrency": args.checkout_concurrency,
+            "flood_concurrency": args.flood_concurrency,
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("ADMISSION_", "AUTH_RATE", "HASH_POOL"))},
+        },
+        **servers,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/order_history.py
+"""大量の注文を入れたSQLiteで GET /purchase/orders 相当のクエリのレイテンシを測る（インデックスあり／なし）
+
+    python -m benchmarks.order_history
+    python -m benchmarks.order_history --orders 5000000 --users 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import models
+from app.auth.order_history import list_orders
+from app.database import make_async_engine, make_engine
+from benchmarks.stats import summarize
+
+INDEX_NAME = "ix_orders_user_id_created_at"
+
+
+def _seed(path: str, orders: int, users: int, heavy_user_orders: int, seed: int):
+    engine = make_engine(f"sqlite:///{path}", sqlite_profile=False)
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+
+    random.seed(seed)
+    items = json.dumps([{"id": "product1", "name": "商品", "price": 3300, "quantity": 1}] * 3, ensure_ascii=False)
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+    conn.executemany(
+        "INSERT INTO users (id, username, email, hashed_password) VALUES (?, ?, ?, 'x')",
+        ((i, f"bench{i}", f"bench{i}@example.com") for i in range(1, users + 1)),
+    )
+
+    def rows():
+        for n in range(orders):
+            # ユーザー1は注文の多い利用者として深いページまで辿る
+            user_id = 1 if n < heavy_user_orders else random.randint(2, users)
+            created_at = start + timedelta(seconds=n * 7)
+            # SQLAlchemy の DateTime(SQLite) と同じ文字列形式で入れる
+            yield (user_id, items, 9985, "credit", "東京都", created_at.strftime("%Y-%m-%d %H:%M:%S.%f"))
+
+    conn.executemany(
+        "INSERT INTO orders (user_id, items, total_price, payment_method, address, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        rows(),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def _measure(Session, user_ids, pages: int, limit: int, details: bool) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for user_id in user_ids:
+        cursor = None
+        async with Session() as db:
+            for _ in range(pages):
+                t = time.perf_counter()
+                page = await list_orders(db, user_id, cursor, limit, details)
+                latencies.append(time.perf_counter() - t)
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def _run_scenarios(url: str, args) -> dict:
+    engine = make_async_engine(url, sqlite_profile=False)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    random.seed(args.seed)
+    users = random.sample(range(2, args.users + 1), min(args.samples, args.users - 1))
+    result = {
+        "first_page": await _measure(Session, users, 1, args.limit, False),
+        "first_page_details": await _measure(Session, users, 1, args.limit, True),
+        "heavy_user_deep_pages": await _measure(Session, [1], args.deep_pages, args.limit, False),
+    }
+    async with engine.connect() as conn:
+        plan = (await conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM orders WHERE user_id = 1 ORDER BY created_at DESC, id DESC LIMIT 21"
+        ))).all()
+    result["query_plan"] = [row[-1] for row in plan]
+    await engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--heavy-user-orders", type=int, default=20_000)
+    parser.add_argument("--samples", type=int, default=200, help="先頭ページを測るユーザー数")
+    parser.add_argument("--deep-pages", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "orders.db")
+        started = time.perf_counter()
+        _seed(path, args.orders, args.users, args.heavy_user_orders, args.seed)
+        result = {
+            "benchmark": "order_history",
+            "orders": args.orders,
+            "users": args.users,
+            "seed_seconds": round(time.perf_counter() - started, 2),
+        }
+        url = f"sqlite:///{path}"
+        result["without_index"] = asyncio.run(_run_scenarios(url, args))
+
+        conn = sqlite3.connect(path)
+        conn.execute(f"CREATE INDEX {INDEX_NAME} ON orders (user_id, created_at DESC, id DESC)")
+        conn.execute("ANALYZE")
+        conn.close()
+        result["with_index"] = asyncio.run(_run_scenarios(url, args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
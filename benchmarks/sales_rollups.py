@@ -0,0 +1,117 @@
+# benchmarks/sales_rollups.py
+"""売れ筋・日別売上を orders のJSONから毎回集計する場合と、集計テーブルから読む場合を比べる
+
+    python -m benchmarks.sales_rollups
+    python -m benchmarks.sales_rollups --orders 2000000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.analytics.rollups import rebuild_rollups
+from app.analytics.router_analytics import daily_revenue, top_products
+from app.database import make_engine
+from app.models import Order
+from benchmarks.stats import summarize
+
+
+def _seed(path: str, orders: int, products: int, days: int, seed: int):
+    engine = make_engine(f"sqlite:///{path}", sqlite_profile=False)
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+
+    random.seed(seed)
+    start = datetime(2024, 1, 1)
+    seconds = days * 86400
+
+    def rows():
+        for _ in range(orders):
+            items = [
+                {"id": f"p{random.randrange(products)}", "name": "商品", "price": 3300, "quantity": random.randint(1, 3)}
+                for _ in range(random.randint(1, 4))
+            ]
+            total = sum(i["price"] * i["quantity"] for i in items) + 185
+            created_at = start + timedelta(seconds=random.randrange(seconds))
+            yield (1, json.dumps(items, ensure_ascii=False), total, random.choice(("credit", "bank", "cod")),
+                   "東京都", created_at.strftime("%Y-%m-%d %H:%M:%S.%f"))
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO orders (user_id, items, total_price, payment_method, address, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        rows(),
+    )
+    conn.commit()
+    conn.close()
+
+
+# 集計テーブルを使わない場合の「今週の売れ筋」
+def _adhoc_top_products(db, start: date, end: date, limit: int):
+    units = Counter()
+    rows = db.query(Order.items).filter(
+        Order.created_at >= datetime.combine(start, datetime.min.time()),
+        Order.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    )
+    for (items,) in rows:
+        for item in items:
+            units[item["id"]] += item["quantity"]
+    return units.most_common(limit)
+
+
+def _time(fn, repeat: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=500_000)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _seed(path, args.orders, args.products, args.days, args.seed)
+        engine = make_engine(f"sqlite:///{path}", sqlite_profile=False)
+        Session = sessionmaker(engine, autoflush=False)
+
+        with Session() as db:
+            started = time.perf_counter()
+            backfill = rebuild_rollups(db)
+            backfill["seconds"] = round(time.perf_counter() - started, 2)
+
+        end = date(2024, 1, 1) + timedelta(days=args.days - 1)
+        week = (end - timedelta(days=6), end)
+        year = (end - timedelta(days=min(args.days, 366) - 1), end)
+        with Session() as db:
+            result = {
+                "benchmark": "sales_rollups",
+                "orders": args.orders,
+                "backfill": backfill,
+                "top_products_week_adhoc": _time(lambda: _adhoc_top_products(db, *week, 10), args.repeat),
+                "top_products_week_rollup": _time(
+                    lambda: top_products(*week, limit=10, order_by="units", db=db), args.repeat),
+                "daily_revenue_year_rollup": _time(lambda: daily_revenue(*year, db=db), args.repeat),
+            }
+        engine.dispose()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/serialization.py
+"""ORMの行をJSONにする方法ごとの、1レスポンスあたりの時間を比べる（DBは使わない）
+
+- jsonable_encoder: これまでの形（ORMオブジェクトを返し、FastAPIが jsonable_encoder → json.dumps）
+- response_model  : Pydanticのレスポンスモデルで検証 → ORJSONResponse
+- row_cache_cold  : RowJSONCache で毎回エンコード（キャッシュなし相当）
+- row_cache_warm  : RowJSONCache で、変わっていない行はエンコード済みのバイト列を使う
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --rows 1000 --repeat 200
+"""
+import argparse
+import json
+import random
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.models import Gift, Product
+from app.schemas import GiftResponse, ProductResponse
+from app.serialization import RowJSONCache
+from benchmarks.stats import summarize
+
+
+def _gifts(count: int) -> List[Gift]:
+    tags = ["誕生日", "記念日", "花", "アクセサリー", "ピアス", "青", "夏", "プレゼント"]
+    return [
+        Gift(
+            id=f"gift{i}", name=f"ギフト{i}", description="天色のピアス / イヤリング", price=3300.0,
+            material=["真鍮", "レジン"], size=["約2cm"], notes=["一点物です"], tags=random.sample(tags, 4),
+            product_url=f"https://example.com/gift{i}", image_url=f"/images/gift{i}.jpg",
+        )
+        for i in range(count)
+    ]
+
+
+def _products(count: int) -> List[Product]:
+    return [
+        Product(id=f"product{i}", name=f"商品{i}", category="アクセサリー/ピアス", description="水色 / ピアス",
+                price=3300 + i, image=f"/images/product{i}.jpg", tags=["青", "夏"])
+        for i in range(count)
+    ]
+
+
+def _time(fn, repeat: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def _compare(model, schema, rows, repeat: int) -> dict:
+    adapter = TypeAdapter(List[schema])
+    warm = RowJSONCache(model, schema, maxsize=len(rows))
+    warm.encode_many(rows)
+    # 出力が同じであることを確認してから測る
+    expected = json.loads(JSONResponse(jsonable_encoder(rows)).body)
+    assert json.loads(warm.encode_many(rows)) == expected
+
+    return {
+        "jsonable_encoder": _time(lambda: JSONResponse(jsonable_encoder(rows)).body, repeat),
+        "response_model": _time(
+            lambda: ORJSONResponse(adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")).body,
+            repeat,
+        ),
+        "row_cache_cold": _time(lambda: RowJSONCache(model, schema).encode_many(rows), repeat),
+        "row_cache_warm": _time(lambda: warm.encode_many(rows), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    result = {
+        "benchmark": "serialization",
+        "rows": args.rows,
+        "gifts": _compare(Gift, GiftResponse, _gifts(args.rows), args.repeat),
+        "products": _compare(Product, ProductResponse, _products(args.rows), args.repeat),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
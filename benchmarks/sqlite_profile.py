@@ -0,0 +1,124 @@
+# benchmarks/sqlite_profile.py
+"""SQLiteの性能プロファイル（WAL＋読み取り専用プール＋書き込み1接続）の有無で、読み書き混在時のレイテンシを比べる
+
+アプリと同じく ThreadedSession（同期ドライバ＋スレッドプール）で、カートの読み出しと追加を混ぜて流す。
+read / write / all（全リクエスト）それぞれの p50・p99 を出す。
+
+プロファイルは読み取りを速くする代わりに書き込みを遅くする（既定で無効）。
+書き込みは1接続に並ぶので、同時に多く来ると待ち時間がそのまま伸びる。
+既定の 90/10・同時64 での計測（1コア、2回）:
+    read p50   62〜67ms → 4〜5ms
+    write p50  213〜291ms → 717〜813ms
+    all p99    719〜893ms → 776〜929ms（書き込み待ちで決まり、良くならない）
+書き込みが多い、または書き込みや全体のテールレイテンシが重要なら有効にしないこと。
+
+    python -m benchmarks.sqlite_profile
+    python -m benchmarks.sqlite_profile --requests 20000 --write-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from app import models
+from app.auth.cart_items import add_cart_item, get_or_create_cart_id, load_cart_items
+from app.database import make_engine, make_read_engine
+from app.threaded_session import threaded_sessionmaker
+from benchmarks.stats import summarize
+
+
+def _seed(url: str, users: int, products: int):
+    engine = make_engine(url, sqlite_profile=False)
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(models.Product.__table__.insert(), [
+            {"id": f"bench-p{i}", "name": f"商品{i}", "category": "ベンチ", "price": 1000 + i, "image": ""}
+            for i in range(products)
+        ])
+        conn.execute(models.User.__table__.insert(), [
+            {"id": i + 1, "username": f"bench{i}", "email": f"bench{i}@example.com", "hashed_password": "x"}
+            for i in range(users)
+        ])
+    engine.dispose()
+
+
+async def run(url: str, profile: bool, args) -> dict:
+    _seed(url, args.users, args.products)
+    write_engine = make_engine(url, sqlite_profile=profile)
+    read_engine = make_read_engine(url, sqlite_profile=profile) or write_engine
+    WriteSession = threaded_sessionmaker(write_engine, autoflush=False, expire_on_commit=False)
+    ReadSession = threaded_sessionmaker(read_engine, autoflush=False, expire_on_commit=False)
+
+    products = [models.Product(id=f"bench-p{i}", name=f"商品{i}", price=1000 + i) for i in range(args.products)]
+    reads, writes = [], []
+    errors = {"read": 0, "write": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    # router_cart.get_cart 相当
+    async def read(user_id: int):
+        async with ReadSession() as db:
+            await db.run_sync(load_cart_items, user_id)
+
+    # router_cart.add_to_cart 相当
+    async def write(user_id: int):
+        async with WriteSession() as db:
+            cart_id = await get_or_create_cart_id(db, user_id)
+            await add_cart_item(db, cart_id, random.choice(products), 1)
+            await db.commit()
+
+    async def one(is_write: bool):
+        user_id = random.randint(1, args.users)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await (write(user_id) if is_write else read(user_id))
+            except Exception:
+                errors["write" if is_write else "read"] += 1
+                return
+            (writes if is_write else reads).append(time.perf_counter() - started)
+
+    random.seed(args.seed)
+    plan = [random.random() < args.write_ratio for _ in range(args.requests)]
+    started = time.perf_counter()
+    await asyncio.gather(*(one(is_write) for is_write in plan))
+    elapsed = time.perf_counter() - started
+
+    write_engine.dispose()
+    if read_engine is not write_engine:
+        read_engine.dispose()
+    return {
+        "read": summarize(reads, elapsed),
+        "write": summarize(writes, elapsed),
+        "all": summarize(reads + writes, elapsed),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    result = {
+        "benchmark": "sqlite_profile",
+        "requests": args.requests,
+        "write_ratio": args.write_ratio,
+        "concurrency": args.concurrency,
+    }
+    for name, profile in (("default", False), ("profile", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            result[name] = asyncio.run(run(url, profile, args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
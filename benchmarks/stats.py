@@ -0,0 +1,25 @@
+# benchmarks/stats.py
+from typing import List
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    """レイテンシ(秒)のリストから、スループットとp50/p95/p99(ミリ秒)を求める"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_per_second": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
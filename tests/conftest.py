@@ -0,0 +1,22 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# app.database は import 時に DATABASE_URL を読むので、アプリを import する前に一時DBへ向ける
+_tmp = tempfile.mkdtemp(prefix="amaironohi-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.setdefault("OUTBOX_WORKER_ENABLED", "0")
+os.environ.setdefault("STARTUP_WARMUP", "0")
+
+import pytest  # noqa: E402
+
+from app import models  # noqa: E402,F401
+from app.database import Base, engine  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_schema():
+    # テストごとに空のテーブルから始める
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
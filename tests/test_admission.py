@@ -0,0 +1,55 @@
+# tests/test_admission.py
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, AdmissionMiddleware, TokenBucketLimiter, client_address
+
+
+def _client(trusted_proxy_hops: int) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/auth/login")
+    def login():
+        return {"ok": True}
+
+    # 補充なしで2回まで
+    limiter = TokenBucketLimiter(rate=0.0, burst=2)
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=AdmissionController(enabled=True),
+        limiter=limiter,
+        trusted_proxy_hops=trusted_proxy_hops,
+    )
+    return TestClient(app)
+
+
+def _login(client: TestClient, forwarded_for: str) -> int:
+    return client.post("/auth/login", headers={"X-Forwarded-For": forwarded_for}).status_code
+
+
+def test_spoofed_forwarded_for_does_not_reset_the_bucket():
+    client = _client(trusted_proxy_hops=1)
+    # クライアントが左側を毎回書き換えても、プロキシが右端に付けた接続元は同じ
+    statuses = [_login(client, f"10.0.0.{n}, 203.0.113.7") for n in range(5)]
+    assert statuses == [200, 200, 429, 429, 429]
+
+    # 別の接続元は別のバケット
+    assert _login(client, "10.0.0.1, 203.0.113.8") == 200
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    client = _client(trusted_proxy_hops=0)
+    statuses = [_login(client, f"198.51.100.{n}") for n in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_client_address_picks_the_hop_added_by_the_nearest_trusted_proxy():
+    scope = {
+        "client": ("10.1.2.3", 4567),
+        "headers": [(b"x-forwarded-for", b"1.1.1.1, 2.2.2.2"), (b"x-forwarded-for", b"3.3.3.3")],
+    }
+    assert client_address(scope, 0) == "10.1.2.3"
+    assert client_address(scope, 1) == "3.3.3.3"
+    assert client_address(scope, 2) == "2.2.2.2"
+    # ヘッダーの値がプロキシの段数より少なければ接続元
+    assert client_address(scope, 4) == "10.1.2.3"
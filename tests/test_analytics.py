@@ -0,0 +1,81 @@
+# tests/test_analytics.py
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.analytics.rollups import rebuild_rollups
+from app.auth import utils
+from app.auth.token_cache import user_cache
+from app.database import SessionLocal
+from app.main import app
+from app.models import DailyRevenue, Order, PaymentMethodDaily, ProductDailySales, User
+
+
+@pytest.fixture
+def users(monkeypatch):
+    monkeypatch.setattr(utils, "ADMIN_EMAILS", {"admin@example.com"})
+    user_cache.clear()
+    with SessionLocal() as db:
+        db.add_all([
+            User(id=1, username="admin", email="Admin@example.com", hashed_password="x"),
+            User(id=2, username="user", email="user@example.com", hashed_password="x"),
+        ])
+        db.commit()
+    yield
+    user_cache.clear()
+
+
+def _order(day: int, hour: int, product_id: str, quantity: int, payment_method: str = "card") -> Order:
+    return Order(
+        user_id=2,
+        items=[{"id": product_id, "name": product_id, "price": 1000, "quantity": quantity}],
+        total_price=1000 * quantity,
+        payment_method=payment_method,
+        address="x",
+        created_at=datetime(2026, 10, day, hour),
+    )
+
+
+def test_analytics_requires_admin(users):
+    with TestClient(app) as client:
+        assert client.get("/analytics/revenue/daily").status_code == 401
+
+        user_token = utils.create_access_token(2)
+        response = client.get("/analytics/revenue/daily", headers={"Authorization": f"Bearer {user_token}"})
+        assert response.status_code == 403
+
+        admin_token = utils.create_access_token(1)
+        response = client.get("/analytics/payment-methods", headers={"Authorization": f"Bearer {admin_token}"})
+        assert response.status_code == 200
+
+
+def test_rebuild_rollups_commits_one_batch_per_day(users):
+    with SessionLocal() as db:
+        db.add_all([
+            _order(1, 9, "p1", 1),
+            _order(1, 23, "p1", 2, "bank"),
+            _order(3, 0, "p2", 1),
+        ])
+        # 注文のない日に残っている古い集計は消える
+        db.add(DailyRevenue(day=date(2026, 10, 5), order_count=9, units=9, revenue=9000))
+        db.commit()
+
+        report = rebuild_rollups(db)
+        assert report == {"orders": 3, "days": 2, "product_days": 2, "payment_method_days": 3, "batches": 5}
+
+        daily = {row.day: (row.order_count, row.units, row.revenue) for row in db.query(DailyRevenue)}
+        assert daily == {date(2026, 10, 1): (2, 3, 3000), date(2026, 10, 3): (1, 1, 1000)}
+        products = {(row.day, row.product_id): row.units for row in db.query(ProductDailySales)}
+        assert products == {(date(2026, 10, 1), "p1"): 3, (date(2026, 10, 3), "p2"): 1}
+        assert db.query(PaymentMethodDaily).count() == 3
+
+        # 何度実行しても同じ結果になる
+        assert rebuild_rollups(db, days_per_batch=7)["batches"] == 1
+        daily_again = {row.day: (row.order_count, row.units, row.revenue) for row in db.query(DailyRevenue)}
+        assert daily_again == {date(2026, 10, 1): (2, 3, 3000), date(2026, 10, 3): (1, 1, 1000)}
+
+
+def test_rebuild_rollups_without_orders():
+    with SessionLocal() as db:
+        assert rebuild_rollups(db)["batches"] == 0
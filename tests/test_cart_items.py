@@ -0,0 +1,136 @@
+# tests/test_cart_items.py
+import asyncio
+import importlib.util
+import json
+from pathlib import Path
+
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app.auth.cart_items import add_cart_item, get_cart_items, get_or_create_cart_id, set_cart_item
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import CartItem, Product, User
+
+MIGRATION = Path(__file__).resolve().parents[1] / "alembic" / "versions" / "d81b3f0c5e27_move_cart_items_to_table.py"
+
+
+def _seed():
+    with SessionLocal() as db:
+        db.add_all([
+            User(id=1, username="u1", email="u1@example.com", hashed_password="x"),
+            Product(id="p1", name="商品 p1", category="アクセサリー/ピアス", price=3300, image=""),
+            Product(id="p2", name="商品 p2", category="アクセサリー/ピアス", price=1100, image=""),
+        ])
+        db.commit()
+
+
+async def _cart_id() -> int:
+    async with AsyncSessionLocal() as db:
+        cart_id = await get_or_create_cart_id(db, 1)
+        await db.commit()
+        return cart_id
+
+
+async def _apply(op, cart_id: int, product_id: str, quantity: int):
+    async with AsyncSessionLocal() as db:
+        await op(db, cart_id, await db.get(Product, product_id), quantity)
+        await db.commit()
+
+
+def _lines():
+    with SessionLocal() as db:
+        return [(line.product_id, line.quantity) for line in db.query(CartItem).order_by(CartItem.id)]
+
+
+def test_concurrent_adds_of_one_product_upsert_a_single_line():
+    _seed()
+
+    async def scenario():
+        cart_id = await _cart_id()
+        # 別々のセッションから同時に追加しても、1行に数量が合算される
+        await asyncio.gather(*(_apply(add_cart_item, cart_id, "p1", n) for n in range(1, 6)))
+        await _apply(add_cart_item, cart_id, "p2", 1)
+        # カートの作成も ON CONFLICT なので、2回目は同じカートを返す
+        assert await _cart_id() == cart_id
+        return cart_id
+
+    asyncio.run(scenario())
+    assert _lines() == [("p1", 15), ("p2", 1)]
+
+
+def test_set_replaces_the_quantity_and_zero_removes_the_line():
+    _seed()
+
+    async def scenario():
+        cart_id = await _cart_id()
+        await _apply(add_cart_item, cart_id, "p1", 2)
+        await _apply(set_cart_item, cart_id, "p1", 7)
+        await _apply(set_cart_item, cart_id, "p2", 1)
+        await _apply(set_cart_item, cart_id, "p2", 0)
+        async with AsyncSessionLocal() as db:
+            return await get_cart_items(db, cart_id)
+
+    assert asyncio.run(scenario()) == [{"id": "p1", "name": "商品 p1", "price": 3300, "quantity": 7}]
+
+
+def _load_migration():
+    spec = importlib.util.spec_from_file_location("move_cart_items_to_table", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_migration_merges_duplicate_json_cart_lines(tmp_path):
+    migration = _load_migration()
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'migration.db'}")
+    metadata = sa.MetaData()
+    sa.Table("products", metadata, sa.Column("id", sa.String, primary_key=True))
+    carts = sa.Table(
+        "carts", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("items", sa.JSON),
+    )
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        conn.execute(sa.insert(metadata.tables["products"]), [{"id": "p1"}, {"id": "p2"}])
+        conn.execute(sa.insert(carts), [
+            {"id": 1, "user_id": 1, "items": [
+                {"id": "p1", "name": "商品 p1", "price": 3300, "quantity": 1},
+                {"id": "p2", "name": "商品 p2", "price": 1100, "quantity": 2},
+                {"id": "p1", "name": "商品 p1", "price": 3300, "quantity": 3},
+                {"name": "IDなし", "quantity": 1},
+            ]},
+            {"id": 2, "user_id": 2, "items": None},
+            {"id": 3, "user_id": 3, "items": [{"id": "p2", "name": "商品 p2", "price": 1100}]},
+        ])
+
+        with Operations.context(MigrationContext.configure(conn)):
+            migration.upgrade()
+        rows = conn.execute(sa.text(
+            "SELECT cart_id, product_id, name, price, quantity FROM cart_items ORDER BY cart_id, product_id"
+        )).all()
+        assert [tuple(row) for row in rows] == [
+            (1, "p1", "商品 p1", 3300, 4),
+            (1, "p2", "商品 p2", 1100, 2),
+            (3, "p2", "商品 p2", 1100, 0),
+        ]
+        assert "items" not in {column["name"] for column in sa.inspect(conn).get_columns("carts")}
+
+        with Operations.context(MigrationContext.configure(conn)):
+            migration.downgrade()
+        items = dict(conn.execute(sa.text("SELECT id, items FROM carts ORDER BY id")).all())
+        assert sa.inspect(conn).has_table("cart_items") is False
+
+    # 戻すと1商品1行のJSONになる
+    assert {cart_id: json.loads(value) for cart_id, value in items.items()} == {
+        1: [
+            {"id": "p1", "name": "商品 p1", "price": 3300, "quantity": 4},
+            {"id": "p2", "name": "商品 p2", "price": 1100, "quantity": 2},
+        ],
+        2: [],
+        3: [{"id": "p2", "name": "商品 p2", "price": 1100, "quantity": 0}],
+    }
+    engine.dispose()
@@ -0,0 +1,85 @@
+# tests/test_cart_patch.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth.router_cart import patch_cart
+from app.database import AsyncSessionLocal, SessionLocal, engine
+from app.models import Product, User
+from app.query_diagnostics import capture_queries, instrument_engine_diagnostics
+from app.schemas import CartPatch
+
+_instrumented = False
+
+
+@pytest.fixture
+def diagnostics():
+    # QUERY_DIAGNOSTICS=1 でなくても capture_queries で記録できるようにする（1回だけ）
+    global _instrumented
+    if not _instrumented:
+        instrument_engine_diagnostics(engine)
+        _instrumented = True
+
+
+@pytest.fixture
+def user(diagnostics):
+    with SessionLocal() as db:
+        db.add(User(id=1, username="u1", email="u1@example.com", hashed_password="x"))
+        db.add_all([
+            Product(id=f"p{n}", name=f"商品 p{n}", category="アクセサリー/ピアス", price=1000 * n, image="")
+            for n in range(1, 6)
+        ])
+        db.commit()
+        db.expunge_all()
+        return db.get(User, 1)
+
+
+def _patch(user, operations):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            with capture_queries() as log:
+                try:
+                    return await patch_cart(CartPatch(operations=operations), db, user), log
+                except HTTPException as e:
+                    return e, log
+
+    return asyncio.run(run())
+
+
+def _product_selects(log) -> list:
+    return [query.shape for query in log.queries if query.shape.startswith("SELECT") and "FROM products" in query.shape]
+
+
+def test_patch_validates_all_products_with_one_in_query(user):
+    operations = [
+        {"op": "add", "itemId": "p1", "quantity": 1},
+        {"op": "add", "itemId": "p2", "quantity": 2},
+        {"op": "set", "itemId": "p3", "quantity": 3},
+        {"op": "add", "itemId": "p1", "quantity": 1},
+        {"op": "remove", "itemId": "p4"},
+    ]
+    result, log = _patch(user, operations)
+    assert result == {"items": [
+        {"id": "p1", "name": "商品 p1", "price": 1000, "quantity": 2},
+        {"id": "p2", "name": "商品 p2", "price": 2000, "quantity": 2},
+        {"id": "p3", "name": "商品 p3", "price": 3000, "quantity": 3},
+    ]}
+
+    selects = _product_selects(log)
+    assert len(selects) == 1, log.report()
+    assert "IN (?...)" in selects[0]
+
+
+def test_patch_reports_every_missing_product_from_the_same_query(user):
+    operations = [
+        {"op": "add", "itemId": "p1", "quantity": 1},
+        {"op": "add", "itemId": "nope2", "quantity": 1},
+        {"op": "set", "itemId": "nope1", "quantity": 1},
+    ]
+    error, log = _patch(user, operations)
+    assert error.status_code == 404
+    assert error.detail == "商品が見つかりません: nope1, nope2"
+    # 検証の1本だけで、カートには触れない
+    assert len(log) == 1, log.report()
+    assert len(_product_selects(log)) == 1
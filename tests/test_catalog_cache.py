@@ -0,0 +1,107 @@
+# tests/test_catalog_cache.py
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.main import app
+from app.models import Product
+from app.products import catalog_cache as catalog_module
+from app.products.catalog_cache import CatalogCache, catalog_cache
+from app.products.importer import products_changed
+
+
+def _product(product_id: str) -> dict:
+    return {"id": product_id, "name": f"商品 {product_id}", "category": "アクセサリー/ピアス", "price": 3300, "image": ""}
+
+
+def _insert(*product_ids: str):
+    with SessionLocal() as db:
+        db.add_all([Product(**_product(product_id)) for product_id in product_ids])
+        db.commit()
+
+
+def _listed_ids(cache: CatalogCache) -> list:
+    with SessionLocal() as db:
+        cache.get_list(db)
+        return sorted(cache._current().items)
+
+
+@pytest.fixture(autouse=True)
+def empty_catalog_cache():
+    # テストごとにDBを作り直すので、プロセス内のキャッシュも空にする
+    catalog_cache.invalidate()
+    yield
+    catalog_cache.invalidate()
+
+
+def test_cache_is_reloaded_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(catalog_module.time, "monotonic", lambda: now[0])
+    cache = CatalogCache(ttl=60)
+    _insert("p1")
+    assert _listed_ids(cache) == ["p1"]
+
+    # 別プロセスの登録は invalidate() が届かないので、期限までは古いまま
+    _insert("p2")
+    now[0] += 59
+    assert _listed_ids(cache) == ["p1"]
+    now[0] += 1
+    assert not cache.loaded
+    assert _listed_ids(cache) == ["p1", "p2"]
+
+
+def test_products_changed_invalidates_the_catalog():
+    _insert("p1")
+    assert _listed_ids(catalog_cache) == ["p1"]
+    generation = catalog_cache.generation
+
+    _insert("p2")
+    assert _listed_ids(catalog_cache) == ["p1"]
+    products_changed([_product("p2")])
+    assert catalog_cache.generation == generation + 1
+    assert not catalog_cache.loaded
+    assert _listed_ids(catalog_cache) == ["p1", "p2"]
+
+
+def test_load_started_before_invalidate_is_not_stored():
+    cache = CatalogCache(ttl=0)
+    _insert("p1")
+    with SessionLocal() as db:
+        generation = cache.generation
+        rows = db.query(Product).all()
+        cache.invalidate()
+        # 読み込み中に無効化されたら、その結果は返すが保存しない
+        assert "p1" in cache._store(generation, rows).items
+    assert not cache.loaded
+
+
+def test_etag_revalidation_returns_304():
+    _insert("p1", "p2")
+    with TestClient(app) as client:
+        headers = {"Accept-Encoding": "identity"}
+        response = client.get("/purchase/products", headers=headers)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"] == "public, no-cache"
+
+        for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            response = client.get("/purchase/products", headers={**headers, "If-None-Match": if_none_match})
+            assert response.status_code == 304, if_none_match
+            assert response.content == b""
+            assert response.headers["etag"] == etag
+
+        assert client.get("/purchase/products", headers={**headers, "If-None-Match": '"other"'}).status_code == 200
+
+        # 商品ごとの ETag は一覧と別
+        item = client.get("/purchase/products/p1", headers=headers)
+        assert item.status_code == 200 and item.headers["etag"] != etag
+        response = client.get("/purchase/products/p1", headers={**headers, "If-None-Match": item.headers["etag"]})
+        assert response.status_code == 304
+
+        # 商品が増えたら ETag が変わる
+        _insert("p3")
+        products_changed([_product("p3")])
+        response = client.get("/purchase/products", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert [product["id"] for product in response.json()] == ["p1", "p2", "p3"]
@@ -0,0 +1,134 @@
+# tests/test_checkout.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth import checkout
+from app.auth.cart_items import add_cart_item, get_or_create_cart_id
+from app.auth.checkout import SHIPPING_FEE, checkout_cart
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import Cart, CartItem, DailyRevenue, EmailOutbox, Order, Product, User
+
+
+@pytest.fixture
+def user():
+    with SessionLocal() as db:
+        db.add(User(id=1, username="u1", email="u1@example.com", hashed_password="x"))
+        db.add_all([
+            Product(id="p1", name="商品 p1", category="アクセサリー/ピアス", price=3300, image=""),
+            Product(id="p2", name="商品 p2", category="アクセサリー/ピアス", price=1100, image=""),
+        ])
+        db.commit()
+        db.expunge_all()
+        return db.get(User, 1)
+
+
+def _fill_cart(*lines):
+    async def fill():
+        async with AsyncSessionLocal() as db:
+            cart_id = await get_or_create_cart_id(db, 1)
+            for product_id, quantity in lines:
+                await add_cart_item(db, cart_id, await db.get(Product, product_id), quantity)
+            await db.commit()
+
+    asyncio.run(fill())
+
+
+def _checkout(user, db_hook=None):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            if db_hook is not None:
+                db_hook(db)
+            try:
+                return await checkout_cart(db, user, "card", "東京")
+            except HTTPException as e:
+                return e
+
+    return asyncio.run(run())
+
+
+def _cart_lines():
+    with SessionLocal() as db:
+        return [(line.product_id, line.quantity) for line in db.query(CartItem).order_by(CartItem.id)]
+
+
+def test_order_is_priced_from_current_products(user):
+    _fill_cart(("p1", 2), ("p2", 1))
+    with SessionLocal() as db:
+        # カートに入れた後の値上げ・名前の変更は注文に反映する
+        db.query(Product).filter(Product.id == "p1").update({Product.price: 4000, Product.name: "新 p1"})
+        db.commit()
+
+    order = _checkout(user)
+    assert order.items == [
+        {"id": "p1", "name": "新 p1", "price": 4000, "quantity": 2},
+        {"id": "p2", "name": "商品 p2", "price": 1100, "quantity": 1},
+    ]
+    assert order.total_price == 4000 * 2 + 1100 + SHIPPING_FEE
+
+    with SessionLocal() as db:
+        assert db.query(Order).count() == 1
+        assert db.query(Cart).one().version == 1
+        assert db.query(EmailOutbox).count() == 1
+        assert db.query(DailyRevenue).one().revenue == order.total_price
+    assert _cart_lines() == []
+
+
+def test_lost_version_claim_returns_409_and_keeps_the_cart(user):
+    _fill_cart(("p1", 1))
+
+    def race(db):
+        # カートを読んだ直後に、別の購入リクエストが先に version を進める
+        execute = db.execute
+
+        async def execute_then_bump(statement, *args, **kwargs):
+            result = await execute(statement, *args, **kwargs)
+            if db.execute is execute_then_bump:
+                db.execute = execute
+                with SessionLocal() as other:
+                    other.query(Cart).update({Cart.version: Cart.version + 1})
+                    other.commit()
+            return result
+
+        db.execute = execute_then_bump
+
+    error = _checkout(user, race)
+    assert isinstance(error, HTTPException) and error.status_code == 409
+    with SessionLocal() as db:
+        assert db.query(Order).count() == 0
+        assert db.query(EmailOutbox).count() == 0
+        assert db.query(Cart).one().version == 1
+    assert _cart_lines() == [("p1", 1)]
+
+
+def test_only_the_lines_read_are_deleted(user, monkeypatch):
+    _fill_cart(("p1", 1), ("p2", 3))
+    get_cart_lines = checkout.get_cart_lines
+
+    async def first_line_only(db, cart_id):
+        # 確保した後に追加された明細（ここでは p2）は読まれていない
+        return (await get_cart_lines(db, cart_id))[:1]
+
+    monkeypatch.setattr(checkout, "get_cart_lines", first_line_only)
+    order = _checkout(user)
+    assert [item["id"] for item in order.items] == ["p1"]
+    # 注文に含めなかった明細は次の注文に残る
+    assert _cart_lines() == [("p2", 3)]
+
+
+def test_unavailable_product_and_empty_cart_are_rejected(user):
+    assert _checkout(user).status_code == 400
+
+    _fill_cart(("p1", 1), ("p2", 1))
+    with SessionLocal() as db:
+        db.query(Product).filter(Product.id == "p2").delete()
+        db.commit()
+    error = _checkout(user)
+    assert error.status_code == 409
+    assert "p2" in error.detail
+    # 失敗した注文は version の確保ごと取り消される
+    with SessionLocal() as db:
+        assert db.query(Cart).one().version == 0
+        assert db.query(Order).count() == 0
+    assert _cart_lines() == [("p1", 1), ("p2", 1)]
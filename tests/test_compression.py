@@ -0,0 +1,137 @@
+# tests/test_compression.py
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, CompressionStats, ENCODINGS, choose_encoding
+from app.database import SessionLocal
+from app.main import app
+from app.models import Product
+from app.products.catalog_cache import catalog_cache
+
+LARGE = json.dumps([{"id": n, "name": "ピアス"} for n in range(100)]).encode()
+
+
+def _client(stats: CompressionStats) -> TestClient:
+    test_app = FastAPI()
+
+    @test_app.get("/small")
+    def small():
+        return Response(b'{"ok": true}', media_type="application/json")
+
+    @test_app.get("/large")
+    def large():
+        return Response(LARGE, media_type="application/json", headers={"ETag": '"abc"', "Vary": "Origin"})
+
+    @test_app.get("/precompressed")
+    def precompressed():
+        return Response(gzip.compress(LARGE), media_type="application/json", headers={"Content-Encoding": "gzip", "ETag": '"abc-gzip"'})
+
+    @test_app.get("/image")
+    def image():
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    @test_app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b'{"a": 1}\n', b'{"b": 2}\n']), media_type="application/x-ndjson")
+
+    test_app.add_middleware(CompressionMiddleware, min_size=1024, stats=stats)
+    return TestClient(test_app)
+
+
+def test_choose_encoding():
+    assert choose_encoding(None) is None
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("*") == ENCODINGS[0]
+    assert choose_encoding("br;q=0.5, gzip;q=0.8") == "gzip"
+    assert choose_encoding("identity") is None
+
+
+def test_bodies_under_the_threshold_are_sent_as_is():
+    stats = CompressionStats()
+    response = _client(stats).get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == {"ok": True}
+    assert stats.skipped_small == 1
+
+
+def test_large_bodies_are_compressed_with_a_weak_etag():
+    stats = CompressionStats()
+    client = _client(stats)
+    for encoding in ENCODINGS:
+        response = client.get("/large", headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["etag"] == 'W/"abc"'
+        assert response.headers["vary"] == "Origin, Accept-Encoding"
+        assert int(response.headers["content-length"]) < len(LARGE)
+        assert response.content == LARGE
+
+    # 圧縮しないときは元の強いETagのまま
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+    assert {encoding for encoding, mode in stats.snapshot()} == set(ENCODINGS)
+
+
+def test_existing_content_encoding_and_binary_types_pass_through():
+    stats = CompressionStats()
+    client = _client(stats)
+    response = client.get("/precompressed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"abc-gzip"'
+    assert response.content == LARGE  # 二重に圧縮されていない
+
+    response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert stats.snapshot() == {}
+
+
+def test_streaming_responses_are_always_compressed():
+    stats = CompressionStats()
+    response = _client(stats).get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == '{"a": 1}\n{"b": 2}\n'
+
+
+@pytest.fixture
+def catalog():
+    with SessionLocal() as db:
+        db.add_all([
+            Product(id=f"p{n:03d}", name=f"商品 {n}", category="アクセサリー/ピアス", price=3300, image="")
+            for n in range(50)
+        ])
+        db.commit()
+    catalog_cache.invalidate()
+    yield
+    catalog_cache.invalidate()
+
+
+def test_cached_catalog_has_an_etag_per_encoding(catalog):
+    with TestClient(app) as client:
+        identity = client.get("/purchase/products", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in identity.headers
+        etags = {None: identity.headers["etag"]}
+
+        for encoding in ENCODINGS:
+            response = client.get("/purchase/products", headers={"Accept-Encoding": encoding})
+            assert response.headers["content-encoding"] == encoding
+            assert response.headers["vary"] == "Accept-Encoding"
+            assert response.json() == identity.json()
+            etags[encoding] = response.headers["etag"]
+            assert etags[encoding] == f'{etags[None][:-1]}-{encoding}"'
+
+            # 同じ方式なら304、別の方式のETagでは本文を返す
+            revalidated = client.get("/purchase/products", headers={"Accept-Encoding": encoding, "If-None-Match": etags[encoding]})
+            assert revalidated.status_code == 304
+            assert revalidated.headers["etag"] == etags[encoding]
+            other = client.get("/purchase/products", headers={"Accept-Encoding": encoding, "If-None-Match": etags[None]})
+            assert other.status_code == 200
+
+        assert len(set(etags.values())) == len(etags)
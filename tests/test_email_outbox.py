@@ -0,0 +1,143 @@
+# tests/test_email_outbox.py
+import smtplib
+from datetime import datetime, timedelta
+
+from app.auth.email_outbox import OutboxWorker, backoff_delay
+from app.database import SessionLocal
+from app.models import EmailOutbox
+
+
+class FakeSMTP:
+    def __init__(self, fail_sends: int = 0):
+        self.fail_sends = fail_sends
+        self.sent = []
+        self.noops = 0
+        self.closed = False
+
+    def noop(self):
+        self.noops += 1
+        return (250, b"OK")
+
+    def send_message(self, message):
+        if self.fail_sends:
+            self.fail_sends -= 1
+            raise smtplib.SMTPServerDisconnected("connection unexpectedly closed")
+        self.sent.append(message["To"])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSMTPFactory:
+    """1回目に開いた接続だけ送信に失敗させる"""
+
+    def __init__(self, first_connection_failures: int = 1):
+        self.first_connection_failures = first_connection_failures
+        self.sessions = []
+
+    def __call__(self):
+        session = FakeSMTP(self.first_connection_failures if not self.sessions else 0)
+        self.sessions.append(session)
+        return session
+
+
+def _enqueue(to_email: str) -> int:
+    with SessionLocal() as db:
+        mail = EmailOutbox(to_email=to_email, subject="件名", body="本文", next_attempt_at=datetime.utcnow() - timedelta(seconds=1))
+        db.add(mail)
+        db.commit()
+        return mail.id
+
+
+def _get(mail_id: int) -> EmailOutbox:
+    with SessionLocal() as db:
+        return db.get(EmailOutbox, mail_id)
+
+
+def _make_due(mail_id: int):
+    with SessionLocal() as db:
+        db.get(EmailOutbox, mail_id).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+
+def test_transient_failure_is_retried_with_backoff_then_delivered():
+    mail_id = _enqueue("buyer@example.com")
+    factory = FakeSMTPFactory(first_connection_failures=1)
+    worker = OutboxWorker(session_factory=SessionLocal, smtp_factory=factory)
+
+    started = datetime.utcnow()
+    assert worker.drain_once() == 1
+    mail = _get(mail_id)
+    assert mail.status == "pending"
+    assert mail.attempts == 1
+    assert "unexpectedly closed" in mail.last_error
+    assert mail.next_attempt_at >= started + backoff_delay(1)
+    # 失敗した接続は捨てる
+    assert factory.sessions[0].closed
+
+    # バックオフの期限前には送らない
+    assert worker.drain_once() == 0
+
+    _make_due(mail_id)
+    assert worker.drain_once() == 1
+    mail = _get(mail_id)
+    assert mail.status == "sent"
+    assert mail.attempts == 2
+    assert mail.sent_at is not None
+    assert mail.last_error is None
+    assert len(factory.sessions) == 2
+    assert factory.sessions[1].sent == ["buyer@example.com"]
+
+
+def test_smtp_session_is_reused_across_batches():
+    factory = FakeSMTPFactory(first_connection_failures=0)
+    worker = OutboxWorker(session_factory=SessionLocal, smtp_factory=factory)
+
+    _enqueue("a@example.com")
+    _enqueue("b@example.com")
+    assert worker.drain_once() == 2
+    _enqueue("c@example.com")
+    assert worker.drain_once() == 1
+
+    assert len(factory.sessions) == 1
+    assert factory.sessions[0].sent == ["a@example.com", "b@example.com", "c@example.com"]
+    # 使い回す前に NOOP で生きているか確かめている
+    assert factory.sessions[0].noops >= 2
+
+
+def test_claim_increments_attempts_and_rejects_stale_copy():
+    mail_id = _enqueue("buyer@example.com")
+    worker = OutboxWorker(session_factory=SessionLocal, smtp_factory=FakeSMTPFactory(0))
+    now = datetime.utcnow()
+
+    with SessionLocal() as first, SessionLocal() as second:
+        mine = first.get(EmailOutbox, mail_id)
+        theirs = second.get(EmailOutbox, mail_id)
+        assert worker._claim(first, mine, now)
+        # 別のワーカーが同じ行を読んでいても、attempts が変わっているので取れない
+        assert not worker._claim(second, theirs, now)
+
+    mail = _get(mail_id)
+    assert mail.status == "sending"
+    assert mail.attempts == 1
+    assert mail.next_attempt_at > now
+
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr("app.auth.email_outbox.OUTBOX_MAX_ATTEMPTS", 2)
+    mail_id = _enqueue("buyer@example.com")
+    # 毎回新しい接続で、毎回失敗する
+    worker = OutboxWorker(session_factory=SessionLocal, smtp_factory=lambda: FakeSMTP(fail_sends=1))
+
+    worker.drain_once()
+    _make_due(mail_id)
+    worker.drain_once()
+
+    mail = _get(mail_id)
+    assert mail.status == "failed"
+    assert mail.attempts == 2
+    _make_due(mail_id)
+    assert worker.drain_once() == 0
@@ -0,0 +1,65 @@
+# tests/test_facet_index.py
+from app.database import SessionLocal
+from app.models import Product
+from app.products import facet_index as facet_module
+from app.products.catalog_cache import CatalogCache
+from app.products.facet_index import FacetIndex
+
+
+def _insert(*rows):
+    with SessionLocal() as db:
+        db.add_all([Product(id=product_id, name=product_id, category=category, price=1000, image="") for product_id, category in rows])
+        db.commit()
+
+
+def _search(index: FacetIndex, *facets: str):
+    with SessionLocal() as db:
+        index.ensure_built(db)
+    return index.search(list(facets), [])
+
+
+def test_generation_change_rebuilds_the_index():
+    catalog = CatalogCache(ttl=0)
+    index = FacetIndex(catalog)
+    _insert(("p1", "水色 / ピアス"))
+    assert _search(index, "ピアス") == (["p1"], {"水色": 1, "ピアス": 1})
+
+    # 別の経路の書き込みは、カタログキャッシュを無効にするまで見えない
+    _insert(("p2", "ピアス"))
+    assert _search(index, "ピアス")[0] == ["p1"]
+    catalog.invalidate()
+    assert _search(index, "ピアス")[0] == ["p1", "p2"]
+
+
+def test_index_expires_with_the_catalog_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(facet_module.time, "monotonic", lambda: now[0])
+    index = FacetIndex(CatalogCache(ttl=60))
+    _insert(("p1", "ピアス"))
+    assert _search(index, "ピアス")[0] == ["p1"]
+
+    # 別プロセスの登録（invalidate が届かない）
+    _insert(("p2", "ピアス"))
+    now[0] += 59
+    assert _search(index, "ピアス")[0] == ["p1"]
+    now[0] += 1
+    assert _search(index, "ピアス")[0] == ["p1", "p2"]
+
+
+def test_add_keeps_the_index_current_without_a_rebuild():
+    catalog = CatalogCache(ttl=0)
+    index = FacetIndex(catalog)
+    _insert(("p1", "ピアス"))
+    _search(index, "ピアス")
+
+    _insert(("p2", "イヤリング"))
+    index.add([("p2", "イヤリング")], catalog.invalidate())
+    assert not index.stale
+
+    # 間に別の変更があれば、add しても作り直す
+    _insert(("p3", "イヤリング"))
+    catalog.invalidate()
+    _insert(("p4", "イヤリング"))
+    index.add([("p4", "イヤリング")], catalog.invalidate())
+    assert index.stale
+    assert _search(index, "イヤリング")[0] == ["p2", "p3", "p4"]
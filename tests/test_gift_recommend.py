@@ -0,0 +1,158 @@
+# tests/test_gift_recommend.py
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth.utils import calculate_match_score
+from app.database import SessionLocal
+from app.gift.scoring import GiftTagMatrix
+from app.gift.tag_index import GiftTagIndex, gift_tag_index
+from app.main import app
+from app.models import Gift
+
+# 部分一致が起きやすいように、少ない文字からタグを作る
+ALPHABET = "あいうえおab"
+
+
+def scan_recommend(gifts, query_tags, limit=2):
+    """旧 recommend_gift（全ギフトを calculate_match_score で走査）と同じ順序"""
+    scored = [(gift_id, calculate_match_score(tags, query_tags)) for gift_id, tags in gifts if tags]
+    if not scored or all(score == 0 for _, score in scored):
+        fallback = sorted(gifts, key=lambda gift: abs(len(gift[1]) - len(query_tags)))
+        return [gift_id for gift_id, _ in fallback[:limit]]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return [gift_id for gift_id, _ in scored[:limit]]
+
+
+def _tag(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0 if rng.random() < 0.02 else 1, 4)))
+
+
+def _gifts(rng: random.Random, count: int):
+    return [(f"g{n}", [_tag(rng) for _ in range(rng.randint(0, 4))]) for n in range(count)]
+
+
+def _index(gifts) -> GiftTagIndex:
+    index = GiftTagIndex()
+    for gift_id, tags in gifts:
+        index.add(gift_id, tags)
+    return index
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_index_matches_the_full_scan_on_random_gifts(seed):
+    rng = random.Random(seed)
+    gifts = _gifts(rng, rng.randint(1, 40))
+    index = _index(gifts)
+    for _ in range(50):
+        query = [_tag(rng) for _ in range(rng.randint(0, 4))]
+        limit = rng.randint(1, 5)
+        assert index.recommend(query, limit) == scan_recommend(gifts, query, limit), query
+
+
+def test_ties_keep_the_insertion_order():
+    gifts = [("g1", ["花"]), ("g2", ["花", "赤"]), ("g3", ["花"]), ("g4", ["青"])]
+    index = _index(gifts)
+    # g1 と g3 は同点なので先に登録した g1 が先
+    assert index.recommend(["花", "赤"], 3) == ["g2", "g1", "g3"] == scan_recommend(gifts, ["花", "赤"], 3)
+    # 一致が上限に足りなければ、スコア0のギフトを登録順で補う
+    assert index.recommend(["赤"], 3) == ["g2", "g1", "g3"] == scan_recommend(gifts, ["赤"], 3)
+
+
+def test_no_match_falls_back_to_the_closest_tag_count():
+    gifts = [("g1", ["a", "b", "a"]), ("g2", []), ("g3", ["b"]), ("g4", ["a", "b"])]
+    index = _index(gifts)
+    for query in (["x"], ["x", "y"], [], ["x", "y", "z", "w"]):
+        assert index.recommend(query) == scan_recommend(gifts, query), query
+    # 差が同じなら登録順（g1 と g3 は差1）
+    assert index.recommend(["x", "y"]) == ["g4", "g1"]
+
+
+def test_removed_and_replaced_gifts_match_the_scan():
+    rng = random.Random(99)
+    gifts = _gifts(rng, 30)
+    index = _index(gifts)
+    for gift_id in ("g3", "g10", "g29"):
+        index.remove(gift_id)
+    # 同じIDで追加し直すと、旧実装（DB順）でも末尾に並ぶ
+    index.add("g10", ["あい", "b"])
+    remaining = [gift for gift in gifts if gift[0] not in ("g3", "g10", "g29")] + [("g10", ["あい", "b"])]
+    for _ in range(50):
+        query = [_tag(rng) for _ in range(rng.randint(0, 3))]
+        assert index.recommend(query, 4) == scan_recommend(remaining, query, 4), query
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matrix_matches_the_scalar_scorer_on_random_gifts(seed):
+    rng = random.Random(seed)
+    gifts = _gifts(rng, rng.randint(1, 40))
+    queries = [[_tag(rng) for _ in range(rng.randint(0, 4))] for _ in range(60)]
+    limit = rng.randint(1, 5)
+    # chunk_size を小さくして、チャンクの境目もまたぐ
+    matrix = GiftTagMatrix(_index(gifts), chunk_size=7)
+    assert matrix.recommend_many(queries, limit) == [scan_recommend(gifts, query, limit) for query in queries]
+
+
+def test_matrix_over_the_cell_limit_scores_with_the_index():
+    rng = random.Random(7)
+    gifts = _gifts(rng, 30)
+    queries = [[_tag(rng) for _ in range(rng.randint(0, 3))] for _ in range(40)]
+    index = _index(gifts)
+    matrix = GiftTagMatrix(index, max_cells=10)
+    assert matrix.recommend_many(queries, 3) == [index.recommend(query, 3) for query in queries]
+    assert matrix.incidence is None
+
+
+def test_matrix_follows_index_updates():
+    index = _index([("g1", ["花"]), ("g2", ["赤"])])
+    matrix = GiftTagMatrix(index)
+    assert matrix.recommend_many([["赤"]], 1) == [["g2"]]
+    index.add("g3", ["赤", "赤い花"])
+    index.remove("g2")
+    assert matrix.recommend_many([["赤"], []], 1) == [["g3"], ["g1"]]
+
+
+@pytest.fixture
+def gift_rows():
+    with SessionLocal() as db:
+        db.add_all([
+            Gift(id="g1", name="花束", tags=["花", "赤"]),
+            Gift(id="g2", name="ピアス", tags=["アクセサリー", "赤"]),
+            Gift(id="g3", name="マグ", tags=["食器"]),
+        ])
+        db.commit()
+        gift_tag_index.build(db)
+    yield
+    gift_tag_index.built = False
+
+
+def _batch(client: TestClient, queries, **params):
+    return client.post("/gift/recommend/batch", json={"queries": [{"tags": tags} for tags in queries], **params})
+
+
+def test_batch_endpoint_returns_one_list_per_query(gift_rows):
+    with TestClient(app) as client:
+        response = _batch(client, [["赤"], ["食器"], ["花"], ["なし"]], top_k=1)
+        assert response.status_code == 200
+        assert [[gift["id"] for gift in gifts] for gifts in response.json()] == [["g1"], ["g3"], ["g1"], ["g3"]]
+
+        # top_k の既定は recommend と同じ2件
+        response = _batch(client, [["赤"]])
+        assert [gift["id"] for gift in response.json()[0]] == ["g1", "g2"]
+        single = client.post("/gift/recommend", json={"tags": ["赤"]}).json()
+        assert response.json()[0] == single
+
+
+def test_batch_endpoint_limits(gift_rows):
+    with TestClient(app) as client:
+        assert _batch(client, [["赤"]], top_k=0).status_code == 422
+        assert _batch(client, [["赤"]], top_k=51).status_code == 422
+        assert _batch(client, [["赤"]] * 10001).status_code == 422
+
+        response = _batch(client, [["赤"], ["食器"]] * 5000, top_k=50)
+        assert response.status_code == 200
+        results = response.json()
+        assert len(results) == 10000
+        assert [gift["id"] for gift in results[0]] == ["g1", "g2", "g3"]
+        assert [gift["id"] for gift in results[9999]] == ["g3", "g1", "g2"]
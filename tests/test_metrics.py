@@ -0,0 +1,98 @@
+# tests/test_metrics.py
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.metrics import MetricsMiddleware, MetricsRegistry, RequestStats, UNMATCHED_ROUTE, instrument_engine
+
+
+def _stats(queries: int, db_seconds: float = 0.0) -> RequestStats:
+    stats = RequestStats()
+    stats.queries = queries
+    stats.db_seconds = db_seconds
+    return stats
+
+
+def _samples(text_format: str) -> dict:
+    samples = {}
+    for line in text_format.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = value
+    return samples
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.observe_request("GET", "/products", 200, 0.003, _stats(1, 0.001))
+    registry.observe_request("GET", "/products", 200, 0.02, _stats(3))
+    registry.observe_request("GET", "/products", 304, 20.0, _stats(0))
+    registry.observe_query(0.001, in_request=True)
+    registry.observe_query(0.002, in_request=False)
+    registry.add_gauge_collector(lambda: [("cache_size", "LRU cache size.", {"cache": 'a"b\\c'}, 3)])
+    registry.add_gauge_collector(lambda: [("cache_size", "LRU cache size.", {"cache": "user"}, 1.5), ("ready", "Ready.", {}, True)])
+    registry.add_counter_collector(lambda: [("hits_total", "Hits.", {}, 7)])
+
+    output = registry.render()
+    assert output.endswith("\n")
+    samples = _samples(output)
+
+    labels = 'method="GET",route="/products"'
+    # バケットは累積で、+Inf は件数と同じ
+    assert samples[f'http_request_duration_seconds_bucket{{{labels},le="0.005"}}'] == "1"
+    assert samples[f'http_request_duration_seconds_bucket{{{labels},le="0.025"}}'] == "2"
+    assert samples[f'http_request_duration_seconds_bucket{{{labels},le="10.0"}}'] == "2"
+    assert samples[f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'] == "3"
+    assert samples[f"http_request_duration_seconds_count{{{labels}}}"] == "3"
+    assert samples[f'http_requests_total{{{labels},status="200"}}'] == "2"
+    assert samples[f'http_requests_total{{{labels},status="304"}}'] == "1"
+    assert samples[f'http_request_db_queries_bucket{{{labels},le="0"}}'] == "1"
+    assert samples[f"http_request_db_queries_sum{{{labels}}}"] == "4.0"
+    assert samples[f"http_request_db_seconds_total{{{labels}}}"] == "0.001"
+    assert samples["db_queries_total"] == "2"
+    assert samples["db_queries_outside_request_total"] == "1"
+
+    # 同じ名前のゲージは1つの HELP / TYPE の下にまとめる。ラベルの値はエスケープする
+    assert output.count("# TYPE cache_size gauge") == 1
+    assert samples['cache_size{cache="a\\"b\\\\c"}'] == "3"
+    assert samples['cache_size{cache="user"}'] == "1.5"
+    assert samples["ready"] == "1"
+    assert "# TYPE hits_total counter" in output and samples["hits_total"] == "7"
+
+    lines = output.splitlines()
+    assert lines.index('cache_size{cache="user"} 1.5') == lines.index("# TYPE cache_size gauge") + 2
+
+
+def test_middleware_labels_requests_by_route_template(tmp_path):
+    registry = MetricsRegistry()
+    engine = instrument_engine(create_engine(f"sqlite:///{tmp_path / 'metrics.db'}"))
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404)
+        with engine.connect() as conn:
+            for _ in range(item_id):
+                conn.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    client = TestClient(app, raise_server_exceptions=False)
+    for path in ("/items/1", "/items/2", "/items/0", "/missing/path", "/boom"):
+        client.get(path)
+
+    samples = _samples(registry.render())
+    # パスパラメータの値ではなくテンプレートでまとめる
+    item = 'method="GET",route="/items/{item_id}"'
+    assert samples[f'http_requests_total{{{item},status="200"}}'] == "2"
+    assert samples[f'http_requests_total{{{item},status="404"}}'] == "1"
+    assert samples[f"http_request_db_queries_sum{{{item}}}"] == "3.0"
+    assert samples[f'http_requests_total{{method="GET",route="{UNMATCHED_ROUTE}",status="404"}}'] == "1"
+    assert samples['http_requests_total{method="GET",route="/boom",status="500"}'] == "1"
+    assert not any("/items/1" in name for name in samples)
+    engine.dispose()
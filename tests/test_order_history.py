@@ -0,0 +1,91 @@
+# tests/test_order_history.py
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth.order_history import decode_cursor, encode_cursor
+from app.auth.token_cache import user_cache
+from app.auth.utils import create_access_token
+from app.database import SessionLocal
+from app.main import app
+from app.models import Order, User
+
+SAME_TIME = datetime(2026, 10, 2, 12, 0, 0)
+
+
+def _order(order_id: int, user_id: int, created_at: datetime) -> Order:
+    return Order(
+        id=order_id, user_id=user_id, created_at=created_at, total_price=1000 + order_id,
+        items=[{"id": "p1", "name": "商品 p1", "price": 1000, "quantity": 1}], payment_method="card", address="x",
+    )
+
+
+@pytest.fixture
+def headers():
+    user_cache.clear()
+    with SessionLocal() as db:
+        db.add_all([
+            User(id=1, username="u1", email="u1@example.com", hashed_password="x"),
+            User(id=2, username="u2", email="u2@example.com", hashed_password="x"),
+        ])
+        db.add_all([
+            _order(1, 1, datetime(2026, 10, 1, 9, 0, 0)),
+            # 同じ時刻の注文が3件（limit=2 のページの境目をまたぐ）
+            _order(2, 1, SAME_TIME),
+            _order(3, 1, SAME_TIME),
+            _order(4, 1, SAME_TIME),
+            _order(5, 1, datetime(2026, 10, 2, 12, 0, 0, 500)),
+            _order(6, 1, datetime(2026, 10, 3, 8, 30, 0)),
+            _order(7, 2, SAME_TIME),  # 他のユーザーの注文は出ない
+        ])
+        db.commit()
+    yield {"Authorization": f"Bearer {create_access_token(1)}"}
+    user_cache.clear()
+
+
+def _pages(client: TestClient, headers: dict, limit: int):
+    cursor = None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/purchase/orders", params=params, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        yield body
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return
+
+
+def test_pages_walk_every_order_once_across_equal_timestamps(headers):
+    with TestClient(app) as client:
+        pages = list(_pages(client, headers, limit=2))
+
+    assert [[order["id"] for order in page["orders"]] for page in pages] == [[6, 5], [4, 3], [2, 1]]
+    # 同じ時刻のページの境目では id で続きを決める
+    assert pages[1]["next_cursor"] == f"{SAME_TIME.isoformat()}_3"
+    assert pages[-1]["next_cursor"] is None
+    # 一覧では明細を読まない
+    assert "items" not in pages[0]["orders"][0]
+
+
+def test_page_size_that_ends_exactly_on_the_last_order(headers):
+    with TestClient(app) as client:
+        pages = list(_pages(client, headers, limit=3))
+    assert [[order["id"] for order in page["orders"]] for page in pages] == [[6, 5, 4], [3, 2, 1]]
+
+
+def test_details_and_invalid_cursor(headers):
+    with TestClient(app) as client:
+        response = client.get("/purchase/orders", params={"limit": 1, "details": True}, headers=headers)
+        assert response.json()["orders"][0]["items"] == [{"id": "p1", "name": "商品 p1", "price": 1000, "quantity": 1}]
+
+        for cursor in ("abc", "2026-10-02T12:00:00", "2026-10-02_x"):
+            response = client.get("/purchase/orders", params={"cursor": cursor}, headers=headers)
+            assert response.status_code == 400, cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 2, 12, 0, 0, 500)
+    assert encode_cursor(created_at, 42) == "2026-10-02T12:00:00.000500_42"
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
@@ -0,0 +1,49 @@
+# tests/test_products_import.py
+import json
+
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.main import app
+from app.models import Product
+from app.products.importer import import_ndjson_lines
+
+
+def _product(product_id: str) -> dict:
+    return {"id": product_id, "name": f"商品 {product_id}", "category": "アクセサリー/ピアス", "price": 3300, "image": ""}
+
+
+def test_invalid_utf8_line_is_reported_and_other_lines_are_imported():
+    lines = [
+        json.dumps(_product("p1"), ensure_ascii=False).encode("utf-8"),
+        b'{"id": "p2", "name": "\xff\xfe"}',
+        json.dumps(_product("p3"), ensure_ascii=False).encode("utf-8"),
+    ]
+    with SessionLocal() as db:
+        report = import_ndjson_lines(db, lines)
+        assert report["inserted_ids"] == ["p1", "p3"]
+        assert report["invalid"] == 1
+        assert report["errors"][0]["line"] == 2
+        assert "UTF-8" in report["errors"][0]["error"]
+        assert db.query(Product).count() == 2
+
+
+def test_import_skips_duplicate_ids_within_a_chunk():
+    lines = [json.dumps(_product(product_id), ensure_ascii=False) for product_id in ("p1", "p1", "p2")]
+    with SessionLocal() as db:
+        report = import_ndjson_lines(db, lines)
+    assert report["inserted_ids"] == ["p1", "p2"]
+    assert report["skipped_ids"] == ["p1"]
+
+
+def test_register_bulk_reports_duplicate_id_once():
+    with TestClient(app) as client:
+        response = client.post("/products/register_bulk", json=[_product("p1"), _product("p1"), _product("p2")])
+        assert response.status_code == 200
+        assert response.json()["registered_ids"] == ["p1", "p2"]
+        assert response.json()["skipped_ids"] == ["p1"]
+
+        # 既存のIDもスキップとして返す
+        response = client.post("/products/register_bulk", json=[_product("p2"), _product("p3")])
+        assert response.json()["registered_ids"] == ["p3"]
+        assert response.json()["skipped_ids"] == ["p2"]
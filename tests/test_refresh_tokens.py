@@ -0,0 +1,154 @@
+# tests/test_refresh_tokens.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.auth import refresh_tokens, routes, utils
+from app.auth.hash_pool import hash_pool
+from app.auth.refresh_tokens import hash_token, issue_refresh_token, purge_expired, rotate_refresh_token
+from app.database import AsyncSessionLocal, SessionLocal
+from app.main import app
+from app.models import RefreshToken, User
+
+
+@pytest.fixture
+def user_id():
+    with SessionLocal() as db:
+        db.add(User(id=1, username="u1", email="u1@example.com", hashed_password="x"))
+        db.commit()
+    return 1
+
+
+def _issue(user_id: int) -> str:
+    async def issue():
+        async with AsyncSessionLocal() as db:
+            token = issue_refresh_token(db, user_id)
+            await db.commit()
+            return token
+
+    return asyncio.run(issue())
+
+
+def _rotate(token: str):
+    async def rotate():
+        async with AsyncSessionLocal() as db:
+            return await rotate_refresh_token(db, token)
+
+    return asyncio.run(rotate())
+
+
+def _rotate_status(token: str) -> int:
+    try:
+        _rotate(token)
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+
+def _family_rows(token: str):
+    with SessionLocal() as db:
+        family_id = db.query(RefreshToken.family_id).filter(RefreshToken.token_hash == hash_token(token)).scalar()
+        return db.query(RefreshToken).filter(RefreshToken.family_id == family_id).order_by(RefreshToken.id).all()
+
+
+def test_rotation_issues_one_successor_in_the_same_family(user_id):
+    first = _issue(user_id)
+    returned_user_id, second = _rotate(first)
+    assert returned_user_id == user_id
+    assert second != first
+
+    rows = _family_rows(first)
+    assert [row.token_hash for row in rows] == [hash_token(first), hash_token(second)]
+    assert rows[0].used_at is not None and rows[1].used_at is None
+
+    _, third = _rotate(second)
+    assert len(_family_rows(first)) == 3
+    assert third not in (first, second)
+
+
+def test_retry_within_grace_window_is_rejected_without_a_new_token(user_id):
+    first = _issue(user_id)
+    _, second = _rotate(first)
+
+    assert _rotate_status(first) == 409
+    # 後継は増えず、family も生きている
+    assert len(_family_rows(first)) == 2
+    assert _rotate_status(second) == 200
+
+
+def test_reuse_after_grace_window_revokes_the_family(user_id, monkeypatch):
+    first = _issue(user_id)
+    _, second = _rotate(first)
+
+    monkeypatch.setattr(refresh_tokens, "REFRESH_TOKEN_REUSE_GRACE_SECONDS", 0)
+    assert _rotate_status(first) == 401
+    assert all(row.revoked_at is not None for row in _family_rows(first))
+    # 正規の利用者が持っている後継も使えなくなる
+    assert _rotate_status(second) == 401
+
+
+def test_logout_revokes_the_family(user_id):
+    other_device = _issue(user_id)
+    first = _issue(user_id)
+    _, second = _rotate(first)
+
+    with TestClient(app) as client:
+        response = client.post("/auth/logout", json={"refresh_token": second})
+        assert response.status_code == 200
+        response = client.post("/auth/refresh", json={"refresh_token": second})
+        assert response.status_code == 401
+
+        # 他の端末（別の family）はログアウトされない
+        response = client.post("/auth/refresh", json={"refresh_token": other_device})
+        assert response.status_code == 200
+        assert response.json()["refresh_token"]
+
+
+def test_refresh_does_not_verify_the_password(user_id, monkeypatch):
+    def forbidden(*args, **kwargs):
+        raise AssertionError("/auth/refresh でパスワードを検証している")
+
+    # bcrypt は /auth/login だけで使う
+    monkeypatch.setattr(utils, "verify_password", forbidden)
+    monkeypatch.setattr(routes, "verify_password", forbidden)
+    monkeypatch.setattr(hash_pool, "verify", forbidden)
+    token = _issue(user_id)
+
+    with TestClient(app) as client:
+        response = client.post("/auth/refresh", json={"refresh_token": token})
+        assert response.status_code == 200
+        response = client.post("/auth/refresh", json={"refresh_token": response.json()["refresh_token"]})
+        assert response.status_code == 200
+
+
+def test_expired_token_is_rejected_and_purged(user_id):
+    token = _issue(user_id)
+    with SessionLocal() as db:
+        db.query(RefreshToken).update({RefreshToken.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+
+    assert _rotate_status(token) == 401
+    with SessionLocal() as db:
+        assert purge_expired(db) == 1
+        assert db.query(RefreshToken).count() == 0
+
+
+def test_concurrent_rotation_of_one_token_issues_one_successor(user_id):
+    first = _issue(user_id)
+
+    async def rotate():
+        async with AsyncSessionLocal() as db:
+            try:
+                await rotate_refresh_token(db, first)
+            except HTTPException as e:
+                return e.status_code
+            return 200
+
+    async def both():
+        return await asyncio.gather(rotate(), rotate())
+
+    assert sorted(asyncio.run(both())) == [200, 409]
+    assert len(_family_rows(first)) == 2
@@ -0,0 +1,87 @@
+# tests/test_serialization.py
+import json
+
+import pytest
+
+from app.database import SessionLocal
+from app.models import Product
+from app.schemas import ProductResponse
+from app.serialization import RawJSON, RowJSONCache, compose
+
+
+def _product(product_id: str, price: int = 3300) -> Product:
+    return Product(id=product_id, name=f"商品 {product_id}", category="アクセサリー/ピアス", price=price, image="")
+
+
+def _expected(product: Product) -> dict:
+    return ProductResponse.model_validate(product).model_dump(mode="json")
+
+
+def test_unchanged_rows_reuse_the_encoded_bytes():
+    cache = RowJSONCache(Product, ProductResponse)
+    product = _product("p1")
+    first = cache.encode(product)
+    assert isinstance(first, RawJSON)
+    assert json.loads(first) == _expected(product)
+
+    # 同じ値の別インスタンス（次のリクエストで読み直した行）でも同じバイト列を返す
+    assert cache.encode(_product("p1")) is first
+    assert cache.stats() == {"size": 1, "maxsize": cache.maxsize, "hits": 1, "misses": 1}
+
+    # 値が変わった行はエンコードし直す
+    changed = cache.encode(_product("p1", price=4000))
+    assert changed is not first and json.loads(changed)["price"] == 4000
+    assert cache.encode(_product("p1", price=4000)) is changed
+
+
+def test_lru_limit_invalidate_and_remember_false():
+    cache = RowJSONCache(Product, ProductResponse, maxsize=2)
+    for product_id in ("p1", "p2", "p3"):
+        cache.encode(_product(product_id))
+    assert cache.stats()["size"] == 2
+    misses = cache.stats()["misses"]
+    cache.encode(_product("p1"))  # 押し出されていた
+    assert cache.stats()["misses"] == misses + 1
+
+    cache.invalidate("p1")
+    cache.encode(_product("p9"), remember=False)
+    assert cache.stats()["size"] == 1
+
+
+def test_rows_loaded_from_the_database_match_the_schema():
+    with SessionLocal() as db:
+        db.add_all([_product("p1"), _product("p2", price=1100)])
+        db.commit()
+        cache = RowJSONCache(Product, ProductResponse)
+        rows = db.query(Product).order_by(Product.id).all()
+        assert json.loads(cache.encode_many(rows)) == [_expected(row) for row in rows]
+
+        # コミットで期限切れになった列は属性経由で読み直す
+        rows[0].price = 5000
+        db.commit()
+        assert json.loads(cache.encode(rows[0]))["price"] == 5000
+
+
+def test_schema_fields_must_be_model_columns():
+    class Extra(ProductResponse):
+        stock: int = 0
+
+    with pytest.raises(ValueError):
+        RowJSONCache(Product, Extra)
+
+
+def test_compose_embeds_raw_json_without_reencoding():
+    cache = RowJSONCache(Product, ProductResponse)
+    encoded = cache.encode(_product("p1"))
+    body = compose({"total": 1, "items": [encoded], "next_cursor": None, "facets": {"ピアス": 1}, 2: (True, 1.5)})
+    assert encoded in body
+    assert json.loads(body) == {
+        "total": 1,
+        "items": [_expected(_product("p1"))],
+        "next_cursor": None,
+        "facets": {"ピアス": 1},
+        "2": [True, 1.5],
+    }
+    # RawJSON はそのまま返す
+    assert compose(encoded) is encoded
+    assert compose([]) == b"[]" and compose({}) == b"{}"
@@ -0,0 +1,96 @@
+# tests/test_threaded_session.py
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.auth.cart_items import add_cart_item, get_cart_items, get_or_create_cart_id, load_cart_items
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import Base, Product, User
+from app.threaded_session import ThreadedSession, threaded_sessionmaker
+
+
+def _seed_user_and_product():
+    with SessionLocal() as db:
+        db.add_all([
+            User(id=1, username="u1", email="u1@example.com", hashed_password="x"),
+            Product(id="p1", name="商品 p1", category="アクセサリー/ピアス", price=3300, image=""),
+        ])
+        db.commit()
+
+
+def test_sqlite_uses_threaded_session():
+    assert isinstance(AsyncSessionLocal(), ThreadedSession)
+
+
+def test_cart_helpers_run_on_threaded_session():
+    _seed_user_and_product()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            cart_id = await get_or_create_cart_id(db, 1)
+            await add_cart_item(db, cart_id, await db.get(Product, "p1"), 2)
+            await add_cart_item(db, cart_id, await db.get(Product, "p1"), 1)
+            await db.commit()
+        async with AsyncSessionLocal() as db:
+            return await get_cart_items(db, cart_id), await db.run_sync(load_cart_items, 1)
+
+    items, loaded = asyncio.run(scenario())
+    assert items == loaded == [{"id": "p1", "name": "商品 p1", "price": 3300, "quantity": 3}]
+
+
+def test_sessions_beyond_pool_size_wait_instead_of_blocking_threads(tmp_path):
+    # プール（1＋overflow 0）より多いセッションを同時に開いても、プール待ちでスレッドが詰まらない
+    small = create_engine(f"sqlite:///{tmp_path / 'small.db'}", pool_size=1, max_overflow=0, pool_timeout=2)
+    Base.metadata.create_all(small)
+    factory = threaded_sessionmaker(small, expire_on_commit=False)
+
+    async def one(n: int):
+        async with factory() as db:
+            await db.execute(select(User.id).where(User.id == n))
+            await asyncio.sleep(0)
+            return (await db.execute(select(User.id).where(User.id == n))).scalar()
+
+    async def scenario():
+        return await asyncio.gather(*(one(n) for n in range(60)))
+
+    assert asyncio.run(scenario()) == [None] * 60
+    small.dispose()
+
+
+def _small_factory(tmp_path, pool_size: int):
+    small = create_engine(f"sqlite:///{tmp_path / 'small.db'}", pool_size=pool_size, max_overflow=0, pool_timeout=2)
+    Base.metadata.create_all(small)
+    with small.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": n, "username": f"u{n}", "email": f"u{n}@example.com", "hashed_password": "x"} for n in range(1, 31)
+        ])
+    return small, threaded_sessionmaker(small, expire_on_commit=False)
+
+
+def test_two_sessions_in_one_request_do_not_wait_on_each_other(tmp_path):
+    # 認証つきの書き込みルートと同じ形: ユーザーを読む（読んだら commit）セッションと、書き込み用のセッションを同時に開く
+    for pool_size, requests in ((1, 1), (2, 30)):
+        (tmp_path / str(pool_size)).mkdir()
+        small, factory = _small_factory(tmp_path / str(pool_size), pool_size)
+
+        async def request(user_id: int):
+            async with factory() as read_db, factory() as write_db:
+                user = await read_db.get(User, user_id)
+                await read_db.commit()
+                await write_db.run_sync(lambda db: db.query(User).filter(User.id == user.id).update({"address": "x"}))
+                await write_db.commit()
+                return user.id
+
+        async def scenario():
+            return await asyncio.wait_for(asyncio.gather(*(request(n % 30 + 1) for n in range(requests))), 10)
+
+        assert asyncio.run(scenario()) == [n % 30 + 1 for n in range(requests)]
+        small.dispose()
+
+
+def test_unwrapped_session_methods_fail_loudly():
+    # 包んでいないメソッドは同期 Session に素通しせず（イベントループ上でSQLを流さず）エラーにする
+    with pytest.raises(AttributeError):
+        AsyncSessionLocal().query
+    assert AsyncSessionLocal().add.__self__ is not None
@@ -0,0 +1,82 @@
+# tests/test_token_cache.py
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import token_cache
+from app.auth.token_cache import LRUTTLCache, claims_cache, user_cache
+from app.auth.utils import create_access_token, decode_token_cached
+from app.database import SessionLocal
+from app.main import app
+from app.models import User
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(token_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_entry_expires_at_the_earlier_of_ttl_and_exp(clock):
+    cache = LRUTTLCache(maxsize=10, ttl=300)
+    cache.set("short", 1, expires_at=clock[0] + 10)
+    cache.set("long", 2, expires_at=clock[0] + 3600)
+    cache.set("no-exp", 3)
+
+    clock[0] += 9.9
+    assert cache.get("short") == 1
+    clock[0] += 0.1
+    assert cache.get("short") is None
+
+    clock[0] += 289
+    assert cache.get("long") == 2 and cache.get("no-exp") == 3
+    clock[0] += 1
+    assert cache.get("long") is None and cache.get("no-exp") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUTTLCache(maxsize=2, ttl=300)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_cached_claims_expire_with_the_token():
+    claims_cache.clear()
+    token = create_access_token(1, timedelta(seconds=30))
+    payload = decode_token_cached(token)
+    # TTL（既定300秒）より exp が先なので exp で失効する
+    assert claims_cache._data[token][1] == payload["exp"]
+    assert decode_token_cached(token) is payload
+    claims_cache.clear()
+
+
+@pytest.fixture
+def user():
+    user_cache.clear()
+    with SessionLocal() as db:
+        db.add(User(id=1, username="before", email="u1@example.com", hashed_password="x",
+                    birthdate=datetime(1990, 1, 1), address="東京"))
+        db.commit()
+    yield {"Authorization": f"Bearer {create_access_token(1)}"}
+    user_cache.clear()
+
+
+def test_put_me_evicts_the_cached_user(user):
+    with TestClient(app) as client:
+        assert client.get("/auth/me", headers=user).json()["username"] == "before"
+        assert user_cache.get(1).username == "before"
+
+        update = {"username": "after", "birthdate": "1990-01-01", "email": "u1@example.com", "address": "大阪"}
+        response = client.put("/auth/me", json=update, headers=user)
+        assert response.status_code == 200
+        assert user_cache.get(1) is None
+
+        assert client.get("/auth/me", headers=user).json()["username"] == "after"
+        assert user_cache.get(1).address == "大阪"
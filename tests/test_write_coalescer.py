@@ -0,0 +1,79 @@
+# tests/test_write_coalescer.py
+import asyncio
+
+import httpx
+import pytest
+
+from app.admission import admission_controller
+from app.auth.token_cache import user_cache
+from app.auth.utils import create_access_token
+from app.auth.write_coalescer import write_coalescer
+from app.database import SessionLocal, engine
+from app.main import app
+from app.models import CartItem, Order, Product, User
+from app.threaded_session import pool_capacity
+
+USERS = 3 * pool_capacity(engine)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    # 同時実行数の制限で503にならないようにする（ここで見たいのは接続プール）
+    monkeypatch.setattr(admission_controller, "enabled", False)
+    user_cache.clear()
+    with SessionLocal() as db:
+        db.add(Product(id="p1", name="商品 p1", category="アクセサリー/ピアス", price=3300, image=""))
+        db.add_all([
+            User(id=n, username=f"u{n}", email=f"u{n}@example.com", hashed_password="x")
+            for n in range(1, USERS + 1)
+        ])
+        db.commit()
+    yield [create_access_token(n) for n in range(1, USERS + 1)]
+    user_cache.clear()
+
+
+def test_concurrent_writes_beyond_pool_capacity_do_not_hang(users):
+    async def scenario():
+        write_coalescer.start()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def write(method: str, url: str, token: str, body: dict) -> int:
+                    response = await client.request(method, url, json=body, headers={"Authorization": f"Bearer {token}"})
+                    return response.status_code
+
+                added = await asyncio.wait_for(asyncio.gather(*(
+                    write("POST", "/purchase/cart", token, {"itemId": "p1", "quantity": 2}) for token in users
+                )), timeout=30)
+                purchased = await asyncio.wait_for(asyncio.gather(*(
+                    write("POST", "/purchase/purchase", token, {"payment_method": "card", "address": "x"}) for token in users
+                )), timeout=30)
+            return added, purchased, write_coalescer.stats()
+        finally:
+            await write_coalescer.stop()
+
+    added, purchased, stats = asyncio.run(scenario())
+    assert added == [200] * USERS
+    assert purchased == [200] * USERS
+    assert stats["ops"] == 2 * USERS
+    assert stats["failed_ops"] == stats["failed_commits"] == 0
+
+    with SessionLocal() as db:
+        assert db.query(Order).count() == USERS
+        assert sorted(order.user_id for order in db.query(Order)) == list(range(1, USERS + 1))
+        assert db.query(CartItem).count() == 0
+
+
+def test_writes_commit_inline_when_the_writer_is_stopped(users):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"Authorization": f"Bearer {users[0]}"}
+            added = await client.post("/purchase/cart", json={"itemId": "missing", "quantity": 1}, headers=headers)
+            assert added.status_code == 404
+            added = await client.post("/purchase/cart", json={"itemId": "p1", "quantity": 1}, headers=headers)
+            assert added.status_code == 200
+            return (await client.get("/purchase/cart", headers=headers)).json()
+
+    assert not write_coalescer.running
+    assert asyncio.run(scenario()) == {"items": [{"id": "p1", "name": "商品 p1", "price": 3300, "quantity": 1}]}